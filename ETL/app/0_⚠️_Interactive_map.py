@@ -1,7 +1,9 @@
 import pydeck
 import pandas as pd
+import geopandas as gpd
 import streamlit as st
 import base64
+import os
 
 st.markdown("""
 <style>
@@ -80,24 +82,43 @@ def depth_to_color(depth):
     return [255, max(0, 255 - int(depth * 10)), 0]
 
 # Load datasets
-df_erupting_unrest = pd.read_csv("ETL/app/data/erupting_unrest.csv")
+df_erupting_unrest = pd.read_parquet("ETL/app/data/erupting_unrest.parquet", engine="pyarrow")
 date_volcanoes = df_erupting_unrest['date'].unique()
 df_erupting = df_erupting_unrest[df_erupting_unrest['source']=='erupting']
 df_unrest = df_erupting_unrest[df_erupting_unrest['source']=='unrest']
-df_total_affected = pd.read_csv("ETL/app/data/total_affected.csv")
-df_historical_db = pd.read_csv("ETL/app/data/historical_db.csv")
-df_volcanoes = pd.read_csv("ETL/app/data/volcanoes_db.csv")
-df_earthquakes = pd.read_csv("ETL/app/data/earthquakes_db.csv")
-df_earthquakes["color"] = df_earthquakes["depth"].apply(depth_to_color)
-df_earthquakes["radius"] = df_earthquakes["magnitude"] * 60000
-date_earthquakes = df_earthquakes['date'].unique()
+df_total_affected = pd.read_parquet("ETL/app/data/total_affected.parquet", engine="pyarrow")
+# Only the columns the map uses, the catalog's text columns are never decoded
+df_historical_db = pd.read_parquet("ETL/app/data/historical_db.parquet", engine="pyarrow",
+                                   columns=["Volcano Name", "Population VPI5", "Population VPI 10", "Population VPI30", "Population VPI100"])
+df_volcanoes = pd.read_parquet("ETL/app/data/volcanoes_core.parquet", engine="pyarrow",
+                               columns=["Volcano_Name", "Longitude", "Latitude"])
+# Grid clusters of both layers at every level of detail, precomputed by the ETL (build_map_clusters)
+df_map_clusters = pd.read_parquet("ETL/app/data/map_clusters.parquet", engine="pyarrow")
+
+# Earthquakes within 10 / 30 / 100 km of every volcano, recent window vs baseline (seismicity_near_volcanoes)
+df_seismicity = pd.read_parquet("ETL/app/data/volcano_seismicity.parquet", engine="pyarrow")
+
+# Space-time clusters of the archived earthquakes (detect_earthquake_swarms)
+df_swarms = gpd.read_parquet("ETL/app/data/earthquake_swarms.parquet")
+
+# Rolling earthquake archive, one partition per day (date=YYYY-MM-DD)
+EARTHQUAKE_ARCHIVE = "ETL/app/data/earthquakes_archive"
+earthquake_dates = sorted(name.split("=", 1)[1] for name in os.listdir(EARTHQUAKE_ARCHIVE) if name.startswith("date="))
+
+
+@st.cache_data
+def load_earthquakes(start, end):
+    """Archived earthquakes between two days (included), the partitions of other days are not read."""
+    df = pd.read_parquet(EARTHQUAKE_ARCHIVE, engine="pyarrow", filters=[("date", ">=", start), ("date", "<=", end)])
+    df["date"] = df["date"].astype(str)
+    return df
 
 # Display in Streamlit
 st.markdown("---")
 st.markdown("##### 📅 Database Information")
 st.caption(f"""
 <div>
-    <p><strong>🌍 Earthquake Database</strong> - Last updated: <strong>{pd.to_datetime(max(df_earthquakes['date'])).strftime('%d %B %Y')}</strong> (USGS Earthquake Hazards Program) </p>
+    <p><strong>🌍 Earthquake Database</strong> - Last updated: <strong>{pd.to_datetime(earthquake_dates[-1]).strftime('%d %B %Y')}</strong> (USGS Earthquake Hazards Program) </p>
 </div>
 <div>
     <p><strong>🌋 Volcano Database</strong> - Last updated: <strong>{pd.to_datetime(max(df_erupting_unrest['date'])).strftime('%d %B %Y')}</strong> (Smithsonian / USGS Daily Volcanic Activity Report) </p>
@@ -151,12 +172,39 @@ with st.form("map"):
         "Show only erupting & unrest volcanoes": ["volcanoes_erupting", "volcanoes_unrest"],
         "Show all holocene volcanoes": ["volcano"],
         "Show only recent earthquakes": ["earthquake"],
+        "Show earthquake swarms": ["swarm"],
         "Show all layers": ["all_layers"]
     }
-    layer_selected = st.selectbox('Select layers to display', list(layer_options.keys()), index=4)
+    layer_selected = st.selectbox('Select layers to display', list(layer_options.keys()), index=5)
+    # Clusters keep the number of records sent to the browser bounded, the
+    # individual points are only worth drawing once zoomed in
+    detail_options = {
+        "World clusters": {"level": 0, "zoom": 1.5},
+        "Regional clusters": {"level": 1, "zoom": 3},
+        "Local clusters": {"level": 2, "zoom": 5},
+        "Individual volcanoes and earthquakes": {"level": None, "zoom": 1.5},
+    }
+    detail_selected = st.selectbox('Level of detail', list(detail_options.keys()), index=0)
+    first_day = pd.to_datetime(earthquake_dates[0]).date()
+    last_day = pd.to_datetime(earthquake_dates[-1]).date()
+    earthquake_window = st.date_input('Earthquakes between', value=(last_day, last_day),
+                                      min_value=first_day, max_value=last_day)
 
     st.form_submit_button('Update map')
 
+# A range being picked comes back with its first day only
+earthquake_start = earthquake_window[0].isoformat()
+earthquake_end = earthquake_window[-1].isoformat()
+df_earthquakes = load_earthquakes(earthquake_start, earthquake_end)
+df_earthquakes["color"] = df_earthquakes["depth"].apply(depth_to_color)
+df_earthquakes["radius"] = df_earthquakes["magnitude"] * 60000
+date_earthquakes = df_earthquakes['date'].unique()
+if earthquake_start == earthquake_end:
+    earthquake_window_label = pd.to_datetime(earthquake_start).strftime('%d %B %Y')
+else:
+    earthquake_window_label = (f"{pd.to_datetime(earthquake_start).strftime('%d %B')} - "
+                               f"{pd.to_datetime(earthquake_end).strftime('%d %B %Y')}")
+
 filtered_volcanoes_erupting = df_erupting
 filtered_volcanoes_unrest = df_unrest
 filtered_volcanoes = df_volcanoes
@@ -232,6 +280,35 @@ filtered_earthquakes["tooltip_html"] = (
     "<br><b>Depth:</b> " + filtered_earthquakes["depth"].round(1).astype(str)
 )
 
+# Swarms active at some point of the selected days
+filtered_swarms = df_swarms[(df_swarms["end"].dt.strftime("%Y-%m-%d") >= earthquake_start) &
+                            (df_swarms["start"].dt.strftime("%Y-%m-%d") <= earthquake_end)]
+swarm_polygons = pd.DataFrame({
+    "polygon": [[list(coords) for coords in hull.exterior.coords] for hull in filtered_swarms.geometry],
+    "tooltip_html": (
+        "<b>Swarm:</b> " + filtered_swarms["n_events"].astype(str) + " earthquakes" +
+        "<br><b>From:</b> " + filtered_swarms["start"].dt.strftime("%d %b %Y %H:%M") +
+        "<br><b>To:</b> " + filtered_swarms["end"].dt.strftime("%d %b %Y %H:%M") +
+        "<br><b>Magnitude:</b> " + filtered_swarms["magnitude_min"].round(1).astype(str) +
+        " - " + filtered_swarms["magnitude_max"].round(1).astype(str) +
+        "<br><b>🌋:</b> " + filtered_swarms["Volcano_Name"] +
+        " (" + filtered_swarms["volcano_distance_km"].round(1).astype(str) + " km)"
+    ).to_numpy(),
+})
+
+db_swarms = pydeck.Layer(
+    "PolygonLayer",
+    data=swarm_polygons,
+    id="earthquake_swarms",
+    pickable=True,
+    auto_highlight=True,
+    get_polygon="polygon",
+    get_fill_color=[255, 209, 102, 90],
+    get_line_color=[255, 209, 102, 255],
+    line_width_min_pixels=2,
+    stroked=True,
+)
+
 db_earthquakes = pydeck.Layer(
     "ScatterplotLayer",
     data=filtered_earthquakes,
@@ -247,25 +324,131 @@ db_earthquakes = pydeck.Layer(
 )
 
 
+STATUS_COLORS = {"erupting": RED, "unrest": ORANGE, "dormant": WHITE}
+
+
+def make_cluster_layers(level, layer_ids, start, end):
+    """
+    Volcano and earthquake clusters of one level of detail, drawn as circles sized by
+    their count (in pixels, so they stay readable at every zoom) with the count on top.
+
+    Args:
+        level (int): level of df_map_clusters
+        layer_ids (list): selected layer ids, as in layer_options
+        start (str): first day of the earthquakes shown, 'YYYY-MM-DD'
+        end (str): last day of the earthquakes shown, included
+
+    Returns:
+        list: pydeck layers
+    """
+    clusters = df_map_clusters[df_map_clusters["level"] == level]
+    volcano_clusters = clusters[clusters["layer"] == "volcano"].copy()
+    # Earthquake clusters are stored per day, merge the cells of the selected days
+    earthquake_clusters = clusters[(clusters["layer"] == "earthquake") & clusters["date"].between(start, end)]
+    earthquake_clusters = (earthquake_clusters
+                           .assign(lon_sum=earthquake_clusters["Longitude"] * earthquake_clusters["count"],
+                                   lat_sum=earthquake_clusters["Latitude"] * earthquake_clusters["count"])
+                           .groupby(["cell_x", "cell_y"])
+                           .agg(count=("count", "sum"), lon_sum=("lon_sum", "sum"), lat_sum=("lat_sum", "sum"),
+                                max_magnitude=("max_magnitude", "max"))
+                           .reset_index())
+    earthquake_clusters["Longitude"] = earthquake_clusters["lon_sum"] / earthquake_clusters["count"]
+    earthquake_clusters["Latitude"] = earthquake_clusters["lat_sum"] / earthquake_clusters["count"]
+
+    show_volcanoes = "volcano" in layer_ids or "all_layers" in layer_ids
+    show_active = show_volcanoes or "volcanoes_erupting" in layer_ids
+    show_earthquakes = "earthquake" in layer_ids or "all_layers" in layer_ids
+    if not show_volcanoes:
+        # Erupting & unrest only: count the active volcanoes of every cluster
+        volcano_clusters["count"] = volcano_clusters["n_erupting"] + volcano_clusters["n_unrest"]
+        volcano_clusters = volcano_clusters[volcano_clusters["count"] > 0]
+    elif layer_ids == ["volcano"]:
+        volcano_clusters["status"] = "dormant"
+
+    # status is categorical, mapped as plain values (the colors are lists)
+    volcano_clusters["color"] = volcano_clusters["status"].astype(object).map(STATUS_COLORS)
+    volcano_clusters["radius"] = 6 + 3 * volcano_clusters["count"] ** 0.5
+    volcano_clusters["label"] = volcano_clusters["count"].astype(str)
+    volcano_clusters["tooltip_html"] = (
+        "<b>🌋:</b> " + volcano_clusters["count"].astype(str) + " volcanoes" +
+        "<br><b>Erupting:</b> " + volcano_clusters["n_erupting"].astype(str) +
+        "<br><b>Unrest:</b> " + volcano_clusters["n_unrest"].astype(str)
+    )
+    earthquake_clusters["color"] = earthquake_clusters["max_magnitude"].apply(
+        lambda magnitude: [255, max(0, 255 - int(magnitude * 35)), 0, 160])
+    earthquake_clusters["radius"] = 4 + 2 * earthquake_clusters["count"] ** 0.5
+    earthquake_clusters["tooltip_html"] = (
+        "<b>ﮩ٨ـﮩﮩ٨ـ </b> " + earthquake_clusters["count"].astype(str) + " earthquakes" +
+        "<br><b>Magnitude (max):</b> " + earthquake_clusters["max_magnitude"].round(1).astype(str)
+    )
+
+    cluster_layers = []
+    if show_earthquakes:
+        cluster_layers.append(pydeck.Layer(
+            "ScatterplotLayer",
+            data=earthquake_clusters[["Longitude", "Latitude", "color", "radius", "tooltip_html"]],
+            id="earthquake_clusters",
+            pickable=True,
+            get_position=["Longitude", "Latitude"],
+            get_fill_color="color",
+            get_radius="radius",
+            radius_units="pixels",
+        ))
+    if show_active:
+        volcano_clusters = volcano_clusters[["Longitude", "Latitude", "color", "radius", "label", "tooltip_html"]]
+        cluster_layers.append(pydeck.Layer(
+            "ScatterplotLayer",
+            data=volcano_clusters,
+            id="volcano_clusters",
+            pickable=True,
+            auto_highlight=True,
+            get_position=["Longitude", "Latitude"],
+            get_fill_color="color",
+            get_line_color=[44, 53, 60, 255],
+            get_radius="radius",
+            radius_units="pixels",
+            stroked=True,
+            line_width_min_pixels=1,
+        ))
+        cluster_layers.append(pydeck.Layer(
+            "TextLayer",
+            data=volcano_clusters,
+            id="volcano_cluster_counts",
+            get_position=["Longitude", "Latitude"],
+            get_text="label",
+            get_color=[44, 53, 60, 255],
+            get_size=12,
+        ))
+    return cluster_layers
+
+
 layers_to_show = []
 selected_layer_ids = layer_options[layer_selected]
+detail_level = detail_options[detail_selected]["level"]
 
-if selected_layer_ids == ["volcano"]:
+if detail_level is not None:
+    layers_to_show = make_cluster_layers(detail_level, selected_layer_ids, earthquake_start, earthquake_end)
+    if selected_layer_ids == ["all_layers"]:
+        layers_to_show.append(db_swarms)
+elif selected_layer_ids == ["volcano"]:
     layers_to_show.append(db_volcanoes)
-if selected_layer_ids == ["volcanoes_erupting", "volcanoes_unrest"]:
+elif selected_layer_ids == ["volcanoes_erupting", "volcanoes_unrest"]:
     layers_to_show.append(db_volcanoes_erupting)
     layers_to_show.append(db_volcanoes_unrest)
-if selected_layer_ids == ["volcano","volcanoes_erupting", "volcanoes_unrest"]:
+elif selected_layer_ids == ["volcano","volcanoes_erupting", "volcanoes_unrest"]:
     layers_to_show.append(db_volcanoes)
     layers_to_show.append(db_volcanoes_erupting)
     layers_to_show.append(db_volcanoes_unrest)
-if selected_layer_ids == ["earthquake"]:
+elif selected_layer_ids == ["earthquake"]:
     layers_to_show.append(db_earthquakes)
-if selected_layer_ids == ["all_layers"]:
+elif selected_layer_ids == ["all_layers"]:
     layers_to_show.append(db_volcanoes)
     layers_to_show.append(db_volcanoes_erupting)
     layers_to_show.append(db_volcanoes_unrest)
     layers_to_show.append(db_earthquakes)
+    layers_to_show.append(db_swarms)
+if selected_layer_ids == ["swarm"]:
+    layers_to_show.append(db_swarms)
 
 center_lat = 0
 center_lon = 0
@@ -273,7 +456,7 @@ center_lon = 0
 view_state = pydeck.ViewState(
     latitude=center_lat,
     longitude=center_lon,
-    zoom=1.5,
+    zoom=detail_options[detail_selected]["zoom"],
 )
 
 chart = pydeck.Deck(
@@ -319,7 +502,7 @@ if not df_erupting.empty:
     with col_d:
         st.markdown(f"""
            <div class="metric-card">
-               <div class="metric-label">Earthquakes ({pd.to_datetime(max(df_earthquakes['date'])).strftime('%d %B %Y')}) <br> </div>
+               <div class="metric-label">Earthquakes ({earthquake_window_label}) <br> </div>
                <div class="metric-value">{len(df_earthquakes):,}</div>
            </div>
            """, unsafe_allow_html=True)
@@ -340,6 +523,25 @@ if not df_erupting.empty:
            </div>
            """, unsafe_allow_html=True)
 
+if not df_seismicity.empty:
+    st.markdown("### 🌋 ﮩ٨ـ Seismicity near volcanoes")
+    radii = sorted(df_seismicity["radius_km"].unique())
+    radius_selected = st.radio("Radius (km)", radii, index=len(radii) // 2, horizontal=True,
+                               format_func=lambda radius: f"{radius:g}")
+    st.caption("Earthquakes of the latest archived day within the radius, compared with the daily rate "
+               "of the previous archived days")
+    st.dataframe(
+        df_seismicity[df_seismicity["radius_km"] == radius_selected]
+        .sort_values(["n_recent", "max_magnitude"], ascending=False)
+        [["Volcano_Name", "n_recent", "max_magnitude", "depth_median", "baseline_rate", "rate_change"]]
+        .rename(columns={"Volcano_Name": "Volcano", "n_recent": "Earthquakes", "max_magnitude": "Magnitude (max)",
+                         "depth_median": "Depth (median, km)", "baseline_rate": "Baseline (per day)",
+                         "rate_change": "Rate change (x)"})
+        .round(2),
+        hide_index=True,
+        use_container_width=True,
+    )
+
 st.markdown("---")  # Add a horizontal line separator
 st.markdown("### 📚 Data Sources")
 
@@ -1,7 +1,10 @@
+import os
 import pydeck
+import numpy as np
 import pandas as pd
 import streamlit as st
 import geopandas as gpd
+import plotly.express as px
 from shapely.geometry import Point
 import pickle
 
@@ -104,25 +107,56 @@ COLOR_BREWER_RED_SCALE = [
 st.set_page_config(layout="wide")
 st.title("Risk Management: Data & Statistics 🚨")
 
-df_erupting_unrest = pd.read_csv("ETL/app/data/erupting_unrest.csv")
+df_erupting_unrest = pd.read_parquet("ETL/app/data/erupting_unrest.parquet", engine="pyarrow")
 df_erupting = df_erupting_unrest[df_erupting_unrest['source']=='erupting']
 df_unrest = df_erupting_unrest[df_erupting_unrest['source']=='unrest']
-df_alert = pd.read_csv("ETL/app/data/alerts_volcanoes_latest.csv")
-pop = gpd.read_file("ETL/app/data/population_at_risk.csv")
+df_alert = pd.read_parquet("ETL/app/data/alerts_volcanoes_latest.parquet", engine="pyarrow")
+# Escalations / de-escalations of the latest report against the previous observation (alert_changes)
+df_alert_changes = pd.read_parquet("ETL/app/data/alert_changes.parquet", engine="pyarrow")
+
+@st.cache_data
+def load_alert_history(name):
+    # Run-length alert history sorted on Name, the filter only reads the row group of this volcano
+    return pd.read_parquet("ETL/app/data/alert_history.parquet", engine="pyarrow", filters=[("Name", "==", name)])
+# GeoParquet: points come back as geometries, no WKT parsing
+pop = gpd.read_parquet("ETL/app/data/population_at_risk.parquet", columns=['volcano_id', 'pop', 'geom'])
+
+@st.cache_data
+def load_population_profiles(path):
+    # {Volcano_Number: (sorted distances in km, cumulative population)}, read once per server process
+    if not os.path.exists(path):
+        return {}
+    profiles = pd.read_parquet(path, engine="pyarrow", columns=['volcano_number', 'distance_km', 'cumulative_pop'])
+    return {
+        volcano_number: (group['distance_km'].to_numpy(), group['cumulative_pop'].to_numpy())
+        for volcano_number, group in profiles.groupby('volcano_number')
+    }
+
+def population_within(profile, radius_km):
+    distances, cumulative_pop = profile
+    idx = np.searchsorted(distances, radius_km, side='right')  # binary search on sorted distances
+    return int(cumulative_pop[idx - 1]) if idx > 0 else 0
 
-def parse_point(geom_str):
-    coords = geom_str.replace("POINT (", "").replace(")", "").split()
-    x, y = float(coords[0]), float(coords[1])
-    return Point(x, y)
+population_profiles = load_population_profiles("ETL/app/data/population_profiles.parquet")
 
 with open("ETL/app/data/osm_highways_features.pkl", "rb") as f:
     roads = pickle.load(f)
 roads = pd.DataFrame(roads)
 
-connectivity_node = gpd.read_file("ETL/app/data/all_nodes.gpkg")
-all_emergency_services = gpd.read_file("ETL/app/data/all_emergency_services.gpkg")
-all_essential_services = gpd.read_file("ETL/app/data/all_essential_services.gpkg")
-all_amenities = gpd.read_file("ETL/app/data/all_amenities.gpkg")
+if os.path.exists("ETL/app/data/assembly_points.parquet"):
+    assembly_points = pd.read_parquet("ETL/app/data/assembly_points.parquet", engine="pyarrow")
+else:
+    assembly_points = pd.DataFrame(columns=['id', 'volcano_name', 'rank', 'score', 'pop', 'lng', 'lat', 'alpha', 'beta'])
+connectivity_node = gpd.read_parquet("ETL/app/data/all_nodes.parquet")
+all_emergency_services = gpd.read_parquet("ETL/app/data/all_emergency_services.parquet")
+all_essential_services = gpd.read_parquet("ETL/app/data/all_essential_services.parquet")
+all_amenities = gpd.read_parquet("ETL/app/data/all_amenities.parquet")
+if os.path.exists("ETL/app/data/hospital_isochrones.parquet"):
+    hospital_isochrones = gpd.read_parquet("ETL/app/data/hospital_isochrones.parquet")
+    hospital_accessibility = pd.read_parquet("ETL/app/data/hospital_accessibility.parquet", engine="pyarrow")
+else:
+    hospital_isochrones = gpd.GeoDataFrame(columns=['id', 'minutes', 'geometry'], geometry='geometry', crs="EPSG:4326")
+    hospital_accessibility = pd.DataFrame(columns=['id', 'volcano_name', 'minutes', 'pop_covered', 'pop_share'])
 
 volcanoes_erupting_list = df_erupting['Volcano_Name'].unique().tolist()
 volcanoes_unrest_list = df_unrest['Volcano_Name'].unique().tolist()
@@ -149,14 +183,13 @@ gdf_volcano_buffer = gdf_volcano_projected.geometry.buffer(buffer_distance)
 gdf_volcano_buffer = gpd.GeoDataFrame(geometry=gdf_volcano_buffer, crs="EPSG:3857").to_crs("EPSG:4326")
 
 df_pop = pop[pop['volcano_id'] == df_volcano.iloc[0,0]]
-df_pop.loc[:, 'geometry'] = df_pop['geom'].apply(parse_point)
-df_pop = gpd.GeoDataFrame(df_pop, geometry='geometry', crs="EPSG:4326")
 pop_df = pd.DataFrame({
     'latitude': df_pop.geometry.y,
     'longitude': df_pop.geometry.x,
     'population': pd.to_numeric(df_pop['pop'], errors='coerce'),
 })
 df_roads = roads[roads['volcano_name'] == volcano_selected]
+df_assembly_points = assembly_points[assembly_points['id'] == df_volcano.iloc[0,0]]
 df_connectivity_node = connectivity_node[connectivity_node['id'] == df_volcano.iloc[0,0]]
 df_connectivity_node['lng'] = df_connectivity_node.geometry.x
 df_connectivity_node['lat'] = df_connectivity_node.geometry.y
@@ -169,6 +202,8 @@ df_essential_services['lat'] = df_essential_services.geometry.y
 df_amenities = all_amenities[all_amenities['id'] == df_volcano.iloc[0,0]]
 df_amenities['lng'] = df_amenities.geometry.x
 df_amenities['lat'] = df_amenities.geometry.y
+df_hospital_isochrones = hospital_isochrones[hospital_isochrones['id'] == df_volcano.iloc[0,0]]
+df_hospital_accessibility = hospital_accessibility[hospital_accessibility['id'] == df_volcano.iloc[0,0]]
 
 col_alert_1, col_alert_2 = st.columns([3, 3])
 
@@ -248,6 +283,22 @@ if df_alert_volcano is not None:
 else:
     st.warning("No Aviation Alert Level available.")
 
+alert_history = load_alert_history(volcano_selected)
+alert_level_changes = df_alert_changes[df_alert_changes['change'].isin(['escalation', 'de-escalation'])]
+with st.expander(f"📈 Alert level history ({len(alert_history)} periods)", expanded=False):
+    if not alert_history.empty:
+        # A run covers its end day, bars end the next day
+        timeline = alert_history.assign(end=pd.to_datetime(alert_history['end_date']) + pd.Timedelta(days=1))
+        fig = px.timeline(timeline, x_start="start_date", x_end="end", y="observatory_level",
+                          color="observatory_level", hover_data=["aviation_level", "start_date", "end_date"])
+        fig.update_layout(showlegend=False, height=250, yaxis_title=None, xaxis_title=None,
+                          plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+        st.plotly_chart(fig, use_container_width=True)
+    if not alert_level_changes.empty:
+        st.markdown(f"**Alert level changes on {alert_level_changes['date'].iloc[0]}**")
+        st.dataframe(alert_level_changes[['Name', 'change', 'previous_observatory_level', 'observatory_level']],
+                     hide_index=True, use_container_width=True)
+
 st.markdown("")
 
 left, right = st.columns([1, 2])
@@ -264,13 +315,19 @@ with left:
         st.markdown(f"🌍 **Location:** {row['Latitude']}, {row['Longitude']}")
 
         # Display total population at risk
-        total_pop = pop_df["population"].sum()
+        profile = population_profiles.get(row['Volcano_Number'])
+        if profile is not None:
+            radius_km = st.slider("Radius around the volcano (km)", min_value=1, max_value=100, value=30)
+            total_pop = population_within(profile, radius_km)
+        else:
+            radius_km = 30
+            total_pop = int(pop_df["population"].sum())
         st.markdown(
             f"""
              <div class="metric-card" style="background: linear-gradient(135deg,
                  {'#ff0000' if total_pop < 500000 else '#ff8c00'},
                  {'#ff0' if total_pop >= 500000 else '#ff4500'});">
-                 <div class="metric-label">Total Population at Risk (30 km)</div>
+                 <div class="metric-label">Total Population at Risk ({radius_km} km)</div>
                  <div class="metric-value">{total_pop:,}</div>
              </div>
              """,
@@ -329,6 +386,25 @@ with right:
 
     st.pydeck_chart(r)
 
+profile = population_profiles.get(df_volcano['Volcano_Number'].iloc[0])
+if profile is not None:
+    distances, cumulative_pop = profile
+    fig = px.area(
+        x=distances,
+        y=cumulative_pop,
+        title='Cumulative population by distance to the volcano',
+        labels={'x': 'Distance (km)', 'y': 'Cumulative population'},
+        color_discrete_sequence=['#ff4500'],
+    )
+    fig.add_vline(x=radius_km, line_dash="dash", line_color="white")
+    fig.update_layout(
+        hovermode="x unified",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=400
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
 st.markdown("### 🗺️ Emergency map")
 
 col_a, col_b = st.columns([3, 3])
@@ -387,28 +463,48 @@ if not df_roads.empty:
 else:
     st.warning("No road data available.")
 
-if not df_connectivity_node.empty:
+if not df_assembly_points.empty:
 
     with col_b:
 
-        connectivity_layer = pydeck.Layer(
-            type="HeatmapLayer",
-            data=df_connectivity_node,
-            opacity=0.9,
+        df_assembly_points['color'] = df_assembly_points['rank'].apply(
+            lambda x: COLOR_BREWER_RED_SCALE[max(len(COLOR_BREWER_RED_SCALE) - int(x), 2)]  # Best ranks darkest
+        )
+        df_assembly_points['label'] = df_assembly_points['rank'].astype(int).astype(str)
+
+        assembly_layer = pydeck.Layer(
+            "ScatterplotLayer",
+            data=df_assembly_points,
             get_position=["lng", "lat"],
-            color_range=COLOR_BREWER_RED_SCALE,
-            threshold=0.7,
-            get_weight="score",
+            get_radius=400,
+            get_fill_color="color",
             pickable=True,
+            radius_min_pixels=6,
+            radius_max_pixels=20,
+            stroked=True,
+            get_line_color=[255, 255, 255],
+            line_width_min_pixels=1,
         )
 
-        r = pydeck.Deck(layers=[connectivity_layer], initial_view_state=view_state,
-                        map_style=pydeck.map_styles.CARTO_DARK_NO_LABELS,)
+        rank_layer = pydeck.Layer(
+            "TextLayer",
+            data=df_assembly_points,
+            get_position=["lng", "lat"],
+            get_text="label",
+            get_size=14,
+            get_color=[255, 255, 255],
+            get_pixel_offset=[0, -18],
+        )
+
+        r = pydeck.Deck(layers=[volcano_layer, assembly_layer, rank_layer], initial_view_state=view_state,
+                        map_style=pydeck.map_styles.CARTO_DARK_NO_LABELS,
+                        tooltip={"text": "Assembly point #{rank}\nScore: {score}\nPopulation: {pop}"})
 
         st.pydeck_chart(r)
 
+        alpha, beta = df_assembly_points['alpha'].iloc[0], df_assembly_points['beta'].iloc[0]
         st.markdown(
-            """
+            f"""
             <div style="margin-top: 15px; 
                         padding: 10px; 
                         background: linear-gradient(135deg, #2c353c, #3a454d); /* Dark gradient */
@@ -424,15 +520,38 @@ if not df_connectivity_node.empty:
                     <em>Where:</em><br>
                     • <strong>road_connectivity</strong> = Normalized betweenness centrality value of a road network node<br>
                     • <strong>density_population</strong> = Normalized population density value associated to a node<br>
-                    • <strong>α, β</strong> = weighting coefficients
+                    • <strong>α, β</strong> = weighting coefficients (α = {alpha}, β = {beta})<br>
+                    • The {len(df_assembly_points)} best-scored nodes are kept, spaced apart from each other
                 </p>
             </div>
             """,
             unsafe_allow_html=True,
         )
 
+elif not df_connectivity_node.empty:
+
+    # No assembly points for this volcano: fall back to the road connectivity heatmap
+    with col_b:
+
+        connectivity_layer = pydeck.Layer(
+            "HeatmapLayer",
+            data=df_connectivity_node[['lng', 'lat', 'score']],
+            opacity=0.9,
+            get_position=["lng", "lat"],
+            color_range=COLOR_BREWER_RED_SCALE,
+            threshold=0.7,
+            get_weight="score",
+            pickable=True,
+        )
+
+        r = pydeck.Deck(layers=[volcano_layer, connectivity_layer], initial_view_state=view_state,
+                        map_style=pydeck.map_styles.CARTO_DARK_NO_LABELS)
+
+        st.pydeck_chart(r)
+
 else:
-    st.warning("No road data available.")
+    with col_b:
+        st.warning("No assembly points available.")
 
 st.markdown("")
 
@@ -447,7 +566,7 @@ emergency_colors = {
 }
 
 if not df_emergency_services.empty:
-    df_emergency_services['color'] = df_emergency_services['amenity'].apply(
+    df_emergency_services['color'] = df_emergency_services['amenity'].astype(object).apply(
         lambda x: emergency_colors.get(x, [200, 200, 200])
     )
 
@@ -540,7 +659,7 @@ essential_colors = {
 }
 
 if not df_essential_services.empty:
-    df_essential_services['color'] = df_essential_services['amenity'].apply(
+    df_essential_services['color'] = df_essential_services['amenity'].astype(object).apply(
         lambda x: essential_colors.get(x, [200, 200, 200])
     )
 
@@ -617,7 +736,7 @@ amenity_colors = {
 }
 
 if not df_amenities.empty:
-    df_amenities['color'] = df_amenities['amenity'].apply(
+    df_amenities['color'] = df_amenities['amenity'].astype(object).apply(
         lambda x: amenity_colors.get(x, [200, 200, 200])
     )
 
@@ -682,6 +801,57 @@ else:
     with col_e:
         st.warning("⚠️ The OSM server returned no amenity")
 
+st.markdown("### 🏥 Hospital accessibility")
+
+isochrone_colors = {
+    5: [0, 255, 0, 90],      # Green
+    10: [255, 255, 0, 70],   # Yellow
+    20: [255, 140, 0, 50],   # Dark Orange
+}
+
+if not df_hospital_isochrones.empty:
+    col_f, col_g = st.columns([4, 2])
+
+    df_hospital_isochrones['color'] = df_hospital_isochrones['minutes'].apply(
+        lambda x: isochrone_colors.get(x, [200, 200, 200, 40])
+    )
+    # Widest band first so the shorter drive times stay on top
+    df_hospital_isochrones = df_hospital_isochrones.sort_values('minutes', ascending=False)
+
+    with col_f:
+        isochrone_layer = pydeck.Layer(
+            "PolygonLayer",
+            data=df_hospital_isochrones,
+            get_polygon="geometry.coordinates",
+            get_fill_color="color",
+            stroked=False,
+            pickable=True,
+        )
+
+        r = pydeck.Deck(
+            layers=[isochrone_layer, buffer_layer, volcano_layer],
+            initial_view_state=view_state,
+            map_style=pydeck.map_styles.CARTO_DARK,
+            tooltip={
+                "text": "{minutes} min from a hospital or ambulance station"
+            },
+        )
+        st.pydeck_chart(r)
+
+    with col_g:
+        for _, row in df_hospital_accessibility.sort_values('minutes').iterrows():
+            st.markdown(
+                f"""
+                <div class="metric-card">
+                    <div class="metric-label">Population within {int(row['minutes'])} min</div>
+                    <div class="metric-value">{row['pop_share']:.0%}</div>
+                    <div class="metric-label">{int(row['pop_covered']):,} people</div>
+                </div>
+                """,
+                unsafe_allow_html=True,
+            )
+else:
+    st.warning("⚠️ No hospital or ambulance station found to compute accessibility")
 
 st.markdown("---")  # Add a horizontal line separator
 st.markdown("### 📚 Data Sources")
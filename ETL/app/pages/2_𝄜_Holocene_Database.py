@@ -76,16 +76,29 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-df_volcanoes = pd.read_csv("ETL/app/data/volcanoes_db.csv")
+@st.cache_data
+def load_volcano_details(volcano_number):
+    """Reads the text and photo columns of one volcano, only the row group holding it is decoded."""
+    return pd.read_parquet("ETL/app/data/volcano_details.parquet", engine="pyarrow",
+                           filters=[("Volcano_Number", "==", volcano_number)])
+
+
+df_volcanoes = pd.read_parquet("ETL/app/data/volcanoes_core.parquet", engine="pyarrow")
 df_volcanoes = df_volcanoes.rename(columns={"x_coordinate": "longitude", "y_coordinate": "latitude"})
 volcanoes_list = sorted(df_volcanoes['Volcano_Name'].unique().tolist())
 
-df_historical_eruptions = pd.read_csv("ETL/app/data/historical_db.csv")
+df_historical_eruptions = pd.read_parquet("ETL/app/data/historical_db.parquet", engine="pyarrow")
 df_historical_eruptions = df_historical_eruptions.rename(columns={"x_coordinate": "longitude", "y_coordinate": "latitude"})
 
-df_historical_eruptions_GVP = pd.read_csv("ETL/app/data/historical_db_GVP.csv")
+df_historical_eruptions_GVP = pd.read_parquet("ETL/app/data/historical_db_GVP.parquet", engine="pyarrow")
 df_historical_eruptions_GVP = df_historical_eruptions_GVP.rename(columns={"x_coordinate": "longitude", "y_coordinate": "latitude"})
 
+# Both eruption tables are sorted on the volcano number, the index gives each volcano's rows
+# as offsets, along with its fatality summary and decade histogram (see build_eruption_index)
+df_eruption_index = pd.read_parquet("ETL/app/data/eruption_index.parquet", engine="pyarrow").set_index("Volcano_Number")
+df_eruption_decades = pd.read_parquet("ETL/app/data/eruption_decades.parquet", engine="pyarrow")
+df_seismicity = pd.read_parquet("ETL/app/data/volcano_seismicity.parquet", engine="pyarrow")
+
 with (st.form("volcanoes")):
     col1 = st.columns(1)
     volcano_selected = st.selectbox(
@@ -97,9 +110,18 @@ with (st.form("volcanoes")):
     st.form_submit_button('Search')
 
 df_volcano = df_volcanoes[df_volcanoes['Volcano_Name'] == volcano_selected]
-df_historical_eruptions_GVP_volcano = df_historical_eruptions_GVP[df_historical_eruptions_GVP['Volcano_Name'] == volcano_selected]
-df_historical_eruptions_volcano = df_historical_eruptions[df_historical_eruptions['Volcano Name'] == volcano_selected]
-print(df_historical_eruptions_volcano)
+if not df_volcano.empty:
+    df_volcano = df_volcano.merge(load_volcano_details(int(df_volcano['Volcano_Number'].iloc[0])),
+                                  on="Volcano_Number", how="left")
+volcano_number = int(df_volcano['Volcano_Number'].iloc[0]) if not df_volcano.empty else None
+if volcano_number in df_eruption_index.index:
+    eruption_index = df_eruption_index.loc[volcano_number]
+else:
+    eruption_index = pd.Series(0, index=df_eruption_index.columns)
+df_historical_eruptions_GVP_volcano = df_historical_eruptions_GVP.iloc[
+    eruption_index['gvp_offset']:eruption_index['gvp_offset'] + eruption_index['gvp_count']]
+df_historical_eruptions_volcano = df_historical_eruptions.iloc[
+    eruption_index['fatal_offset']:eruption_index['fatal_offset'] + eruption_index['fatal_count']]
 
 left, right = st.columns([1, 2])
 
@@ -120,6 +142,16 @@ with left:
         st.markdown(f"📏 **Elevation:** {row['Elevation']} m")
         st.markdown(f"🌍 **Location:** {row['Latitude']}, {row['Longitude']}")
 
+        seismicity = df_seismicity[df_seismicity['Volcano_Number'] == row['Volcano_Number']]
+        if seismicity.empty:
+            st.markdown("ﮩ٨ـ **Recent earthquakes:** none archived within "
+                        f"{df_seismicity['radius_km'].max():g} km")
+        for _, radius in seismicity.iterrows():
+            rate_change = f", x{radius['rate_change']:.1f} vs baseline" if pd.notna(radius['rate_change']) else ""
+            magnitude = f", max M{radius['max_magnitude']:.1f}" if pd.notna(radius['max_magnitude']) else ""
+            st.markdown(f"ﮩ٨ـ **Earthquakes within {radius['radius_km']:g} km:** "
+                        f"{radius['n_recent']}{magnitude}{rate_change}")
+
         # Add expandable section for geological summary
         with st.expander("📖 Geological Summary", expanded=True):
             st.markdown(row['Geological_Summary'])
@@ -148,35 +180,18 @@ if not df_historical_eruptions_GVP.empty:
            """, unsafe_allow_html=True)
 
     with col_b:
-        if df_historical_eruptions_volcano.empty:
-            total_records = "0"
-        else:
-            try:
-                total_records = f"{len(df_historical_eruptions_volcano)}"  # Format with thousands separator
-            except (ValueError, TypeError):
-                total_records = "0"
-
         st.markdown(f"""
            <div class="metric-card">
                <div class="metric-label">Total Records (Volcanic fatalities db) </div>
-               <div class="metric-value">{total_records}</div>
+               <div class="metric-value">{eruption_index['fatal_incidents']:,}</div>
            </div>
            """, unsafe_allow_html=True)
 
     with col_c:
-        if df_historical_eruptions_volcano.empty:
-            fatalities_display = "0"
-        else:
-            try:
-                fatalities_display = f"{df_historical_eruptions_volcano.iloc[0]['Number of fatalities']}"  # Format with thousands separator
-            except (ValueError, TypeError):
-                fatalities_display = "0"
-
-        # Then use in your HTML
         st.markdown(f"""
            <div class="metric-card">
-               <div class="metric-label">Total Records (Volcanic fatalities db) </div>
-               <div class="metric-value">{fatalities_display}</div>
+               <div class="metric-label">Fatalities (Volcanic fatalities db) </div>
+               <div class="metric-value">{eruption_index['fatalities']:,}</div>
            </div>
            """, unsafe_allow_html=True)
 
@@ -188,15 +203,9 @@ if not df_historical_eruptions_GVP.empty:
     if not df_historical_eruptions_GVP_volcano.empty:
         with tab1:
 
-            eruptions_recent = df_historical_eruptions_GVP_volcano[
-                df_historical_eruptions_GVP_volcano['StartDateYear'] >= 1950
-                ].copy()
-
-            eruptions_recent['Decade'] = (eruptions_recent['StartDateYear'] // 10) * 10
-            eruptions_by_decade = eruptions_recent.groupby('Decade').size().reset_index(name='eruption_count')
-
-            # Sort by decade
-            eruptions_by_decade = eruptions_by_decade.sort_values('Decade')
+            # Eruptions per decade since 1950, precomputed by the ETL and sorted by decade
+            eruptions_by_decade = df_eruption_decades.iloc[
+                eruption_index['decade_offset']:eruption_index['decade_offset'] + eruption_index['decade_count']]
 
             # Create the time series bar plot
             fig = px.bar(eruptions_by_decade,
@@ -3,6 +3,7 @@ from datetime import datetime
 from datetime import timedelta
 
 import pendulum
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from bs4 import BeautifulSoup
@@ -11,15 +12,32 @@ import os
 import regex
 from owslib.wfs import WebFeatureService
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import warnings
 import osmnx as ox
-import networkx as nx
+import pyproj
+from scipy.sparse import csr_array
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+import shapely
 from shapely import wkb
 import pickle
+import pyarrow as pa
+import pyarrow.parquet as pq
+import json
+import hashlib
+import time
+import resource
+import socket
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import shutil
 import subprocess
 from typing import Optional, Tuple
 
-from airflow.sdk import dag, task
+from airflow.sdk import dag, task, get_current_context
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator
 from airflow.models import Variable
@@ -35,24 +53,262 @@ from airflow.models import Variable
 )
 def process_data_smithsonian():
 
+    metrics_settings = {}
+
+    def emit_metrics(record):
+        """
+        Appends a metrics record to the JSON-lines file of the current run and, when
+        STATSD_HOST ("host:port") is set, sends it as StatsD timers / gauges over UDP.
+        Telemetry never fails the pipeline: errors are only printed.
+
+        Args:
+            record (dict): metrics record built by instrument
+        """
+        try:
+            if not metrics_settings:
+                metrics_settings['dir'] = Variable.get("METRICS_DIR", default_var='/home/gillet/Bureau/Volcanic_ETL/data/metrics')
+                metrics_settings['statsd'] = Variable.get("STATSD_HOST", default_var="")
+            try:
+                run_id = get_current_context()["run_id"]
+            except RuntimeError:  # called outside a task
+                run_id = datetime.now().strftime("%Y-%m-%d")
+
+            os.makedirs(metrics_settings['dir'], exist_ok=True)
+            metrics_path = os.path.join(metrics_settings['dir'], f"{regex.sub(r'[^\w.-]', '_', run_id)}.jsonl")
+            with open(metrics_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'run_id': run_id, **record}, default=str) + "\n")
+
+            if metrics_settings['statsd']:
+                host, port = metrics_settings['statsd'].rsplit(":", 1)
+                prefix = f"volcanic_etl.{record['stage']}"
+                lines = [f"{prefix}.wall_ms:{record['wall_s'] * 1000:.0f}|ms",
+                         f"{prefix}.peak_rss_mb:{record['peak_rss_mb']}|g"]
+                if record['rows_out'] is not None:
+                    lines.append(f"{prefix}.rows_out:{record['rows_out']}|g")
+                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                    sock.sendto("\n".join(lines).encode('utf-8'), (host, int(port)))
+        except Exception as e:
+            print(f"⚠️ Could not emit metrics for {record['stage']}: {e}")
+
+    def count_rows(result):
+        if result is None:
+            return 0
+        if isinstance(result, tuple):
+            return sum(count_rows(item) for item in result)
+        return len(result) if hasattr(result, '__len__') else None
+
+    @contextmanager
+    def instrument(stage, rows_in=None, **tags):
+        """
+        Measures a pipeline stage: wall time, rows in/out and peak RSS of the process.
+
+        Set record['rows_out'] inside the with block.
+
+        Args:
+            stage (str): dotted stage name (e.g. 'query_database.population_at_risk')
+            rows_in (int): rows entering the stage, when meaningful
+            **tags: extra fields stored with the record (table, volcano...)
+
+        Yields:
+            dict: the metrics record
+        """
+        record = {'stage': stage, 'rows_in': rows_in, 'rows_out': None, **tags}
+        start = time.perf_counter()
+        status = 'failed'
+        try:
+            yield record
+            status = 'ok'
+        finally:
+            record['status'] = status
+            record['wall_s'] = round(time.perf_counter() - start, 4)
+            record['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB on Linux
+            record['ts'] = datetime.now().isoformat(timespec='seconds')
+            emit_metrics(record)
+
+    def instrumented(stage):
+        """Decorator form of instrument, rows_out is taken from the return value."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with instrument(stage) as record:
+                    result = func(*args, **kwargs)
+                    record['rows_out'] = count_rows(result)
+                return result
+            return wrapper
+        return decorator
+
+    # PostgreSQL type of every schema type, coerce_table casts the values to the matching pandas dtype
+    column_types = {
+        'int': 'INTEGER',
+        'float': 'DOUBLE PRECISION',
+        'text': 'TEXT',
+        'category': 'TEXT',
+        'date': 'DATE',
+        'timestamp': 'TIMESTAMPTZ',
+    }
+
+    # Expression index on the volcano / event position, matching the ST_MakePoint of the transform queries
+    point_index = ('point', 'GIST', 'ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326)')
+
+    # Declared schema of every loaded dataset: column types and the indexes created with the tables.
+    # Columns a source adds that are not declared here keep the dtype mapping of ensure_table_exists.
+    table_schemas = {
+        'erupting': {
+            'columns': {'Name': 'text', 'Country': 'category', 'observatory_level': 'category',
+                        'aviation_level': 'category', 'date': 'date'},
+            'indexes': [('name', 'BTREE', '"Name"'), ('date', 'BTREE', 'date')],
+        },
+        'unrest': {
+            'columns': {'Name': 'text', 'Country': 'category', 'observatory_level': 'category',
+                        'aviation_level': 'category', 'date': 'date'},
+            'indexes': [('name', 'BTREE', '"Name"'), ('date', 'BTREE', 'date')],
+        },
+        'alerts': {
+            'columns': {'Name': 'text', 'observatory_level': 'category', 'aviation_level': 'category', 'date': 'date'},
+            'indexes': [('name', 'BTREE', '"Name"'), ('date', 'BTREE', 'date')],
+        },
+        # volcanoes_db and the filtered_*_volcanoes tables (catalog rows of the day, with its date)
+        'catalog': {
+            'columns': {'id': 'text', 'Volcano_Number': 'int', 'Volcano_Name': 'text', 'Volcanic_Landform': 'category',
+                        'Primary_Volcano_Type': 'category', 'Last_Eruption_Year': 'int', 'Country': 'category',
+                        'Region': 'category', 'Subregion': 'category', 'Geological_Summary': 'text',
+                        'Latitude': 'float', 'Longitude': 'float', 'Elevation': 'int', 'Tectonic_Setting': 'category',
+                        'Geologic_Epoch': 'category', 'Evidence_Category': 'category', 'Primary_Photo_Link': 'text',
+                        'Primary_Photo_Caption': 'text', 'Primary_Photo_Credit': 'text', 'Major_Rock_Type': 'category',
+                        'x_coordinate': 'float', 'y_coordinate': 'float', 'date': 'date'},
+            'indexes': [('volcano_number', 'BTREE', '"Volcano_Number"'), ('name', 'BTREE', 'LOWER("Volcano_Name")'),
+                        point_index],
+        },
+        'eruptions': {
+            'columns': {'id': 'text', 'Volcano_Number': 'int', 'Volcano_Name': 'text', 'Eruption_Number': 'int',
+                        'Activity_Type': 'category', 'ExplosivityIndexMax': 'float', 'ExplosivityIndexModifier': 'category',
+                        'ActivityArea': 'text', 'ActivityUnit': 'text', 'StartEvidenceMethod': 'category',
+                        'StartDateYearModifier': 'category', 'StartDateYear': 'int', 'StartDateYearUncertainty': 'float',
+                        'StartDateDayModifier': 'category', 'StartDateMonth': 'float', 'StartDateDay': 'float',
+                        'StartDateDayUncertainty': 'float', 'EndDateYearModifier': 'category', 'EndDateYear': 'float',
+                        'EndDateYearUncertainty': 'float', 'EndDateDayModifier': 'category', 'EndDateMonth': 'float',
+                        'EndDateDay': 'float', 'EndDateDayUncertainty': 'float',
+                        'x_coordinate': 'float', 'y_coordinate': 'float'},
+            'indexes': [('volcano_number', 'BTREE', '"Volcano_Number", "Eruption_Number"'), point_index],
+        },
+        'earthquakes': {
+            'columns': {'id': 'text', 'time': 'timestamp', 'magnitude': 'float', 'place': 'text', 'infos': 'text',
+                        'y_coordinate': 'float', 'x_coordinate': 'float', 'depth': 'float', 'date': 'date'},
+            'indexes': [('id', 'BTREE', 'id'), ('time', 'BTREE', '"time"'), point_index],
+        },
+        # Volcanic fatalities database (MOESM1 supplementary table), not extracted by this DAG
+        'MOESM1': {
+            'columns': {'(GVP) Volcano number': 'int', 'Volcano Name': 'text', 'Country': 'category',
+                        'Volcano Latitude': 'float', 'Volcano Longitude': 'float', 'Volcano Elevation': 'int',
+                        'Volcano Type': 'category', 'Population VPI5': 'float', 'Population VPI 10': 'float',
+                        'Population VPI30': 'float', 'Population VPI100': 'float',
+                        'Year (Eruption start year if date not specified)': 'int', 'Number of fatalities': 'int',
+                        'QL 1 distance (km)': 'float', 'QL2 (max. km)': 'float'},
+            'indexes': [('volcano_number', 'BTREE', '"(GVP) Volcano number"')],
+        },
+    }
+
+    def coerce_table(df, dataset):
+        """
+        Casts the declared columns of a dataset to their schema type, one vectorized
+        conversion per column.
+
+        Numbers are parsed with their thousands separators removed ("12,345"), dates and
+        timestamps with pd.to_datetime, and unparseable values become missing (pd.NA / NaT).
+        Declared columns absent from df and undeclared columns are left as they are.
+
+        Args:
+            df (pd.DataFrame): table as extracted
+            dataset (str): key of table_schemas
+
+        Returns:
+            pd.DataFrame: copy of df with nullable Int64, float64, datetime64, category and str columns
+        """
+        df = df.copy()
+        for column, column_type in table_schemas[dataset]['columns'].items():
+            if column not in df.columns:
+                continue
+            values = df[column]
+            if column_type in ('int', 'float'):
+                if not pd.api.types.is_numeric_dtype(values):
+                    values = values.astype(str).str.replace(",", "", regex=False).str.strip()
+                values = pd.to_numeric(values, errors="coerce")
+                df[column] = values.round().astype('Int64') if column_type == 'int' else values.astype('float64')
+            elif column_type == 'date':
+                df[column] = pd.to_datetime(values, errors="coerce").dt.normalize()
+            elif column_type == 'timestamp':
+                df[column] = pd.to_datetime(values, errors="coerce", utc=True)
+            elif column_type == 'category':
+                df[column] = values.where(values.isna(), values.astype(str)).astype('category')
+            else:
+                df[column] = values.where(values.isna(), values.astype(str))
+        return df
+
+    # Memory-lean dtypes of the app datasets, by column name. write_table stores them in the Parquet
+    # pandas metadata, so the pages read the same dtypes back. Text columns not listed here are kept
+    # as Arrow-backed strings.
+    dtype_policy = {
+        # Low-cardinality labels: the declared categories of the loaded tables and the app columns
+        'category': sorted({column for schema in table_schemas.values()
+                            for column, column_type in schema['columns'].items() if column_type == 'category'} |
+                           {'source', 'amenity', 'layer', 'status', 'change', 'Quality level', 'volcano_id',
+                            'previous_observatory_level', 'previous_aviation_level'}),
+        'float32': ['x_coordinate', 'y_coordinate', 'Longitude', 'Latitude', 'Volcano Latitude', 'Volcano Longitude',
+                    'lng', 'lat'],
+        'Int32': ['Volcano_Number', 'Eruption_Number', '(GVP) Volcano number', 'volcano_number', 'gid', 'swarm_id'],
+    }
+
+    def lean_dtypes(df, categories=()):
+        """
+        Applies dtype_policy to a dataset: categoricals for the low-cardinality labels, float32
+        coordinates, nullable Int32 ids when they fit in 32 bits and Arrow-backed strings for
+        the other text columns. The dtype of a column only depends on its name, never on the
+        values of a chunk.
+
+        Columns holding anything else than strings (geometries, WKB, mixed objects) are left as they are.
+
+        Args:
+            df (pd.DataFrame | gpd.GeoDataFrame): dataset
+            categories (list): other categorical columns of this dataset, e.g. the volcano 'id'
+                repeated over the rows of the per-volcano tables (unique in the catalogs)
+
+        Returns:
+            pd.DataFrame | gpd.GeoDataFrame: df with the lean dtypes
+        """
+        geometry_column = df.geometry.name if isinstance(df, gpd.GeoDataFrame) else None
+        int32 = np.iinfo(np.int32)
+        dtypes = {}
+        for column, values in df.items():
+            if column == geometry_column:
+                continue
+            if column in dtype_policy['float32'] and pd.api.types.is_float_dtype(values.dtype):
+                dtypes[column] = 'float32'
+            elif column in dtype_policy['Int32'] and pd.api.types.is_integer_dtype(values.dtype):
+                if values.dropna().between(int32.min, int32.max).all():
+                    dtypes[column] = 'Int32'
+            elif isinstance(values.dtype, pd.CategoricalDtype):
+                continue
+            elif pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+                if column in dtype_policy['category'] or column in categories:
+                    dtypes[column] = 'category'
+                else:
+                    dtypes[column] = pd.StringDtype('pyarrow', na_value=np.nan)
+        return df.astype(dtypes) if dtypes else df
+
     @task
     def extract_data_smithsonian():
 
-        def scrape_volcanic_db():
+        def fetch_daily_report(date_str, session=None):
             """
-            Scrapes volcano eruption and unrest data for a given date.
+            Downloads the Smithsonian daily report page of a date.
 
             Args:
                 date_str (str): Date in 'YYYY-MM-DD' format (e.g., '2025-09-15').
+                session (requests.Session): connection pool shared by the backfill requests (default: none)
 
             Returns:
-                tuple: (DataFrame of erupting volcanoes, DataFrame of unrest volcanoes)
+                str: page HTML
             """
-            # Build the target URL
-            date_obj = datetime.now()
-            date_obj = date_obj - timedelta(days=1)
-            #date_str = "2025-11-24"
-            date_str = date_obj.strftime("%Y-%m-%d")
             url = f"https://volcano.si.edu/reports_daily.cfm?activitydate={date_str}"
 
             # Headers to mimic a browser and avoid blocking
@@ -60,13 +316,31 @@ def process_data_smithsonian():
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
 
+            response = (session or requests).get(url, headers=headers, timeout=60)
+            response.raise_for_status()  # Raise HTTP errors if any
+            print(f"Accessed URL: {response.url}")
+            return response.text
+
+        @instrumented("extract.scrape_volcanic_db")
+        def scrape_volcanic_db(date_str=None, html=None):
+            """
+            Scrapes volcano eruption and unrest data for a given date.
+
+            Args:
+                date_str (str): Date in 'YYYY-MM-DD' format (e.g., '2025-09-15'), yesterday by default.
+                html (str): daily report page already fetched for that date (default: fetched here)
+
+            Returns:
+                tuple: (DataFrame of erupting volcanoes, DataFrame of unrest volcanoes)
+            """
+            if date_str is None:
+                date_str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
             try:
-                # Fetch the webpage
-                response = requests.get(url, headers=headers)
-                response.raise_for_status()  # Raise HTTP errors if any
-                print(f"Accessed URL: {response.url}")
+                if html is None:
+                    html = fetch_daily_report(date_str)
 
-                soup = BeautifulSoup(response.text, 'html.parser')
+                soup = BeautifulSoup(html, 'html.parser')
 
                 # Inner function to extract a specific section
                 def extract_section(section_title):
@@ -101,7 +375,7 @@ def process_data_smithsonian():
                     return pd.DataFrame(data, columns=headers)
 
                 # Dynamic section titles based on the input date
-                formatted_date = datetime.strptime(date_str, '%Y-%m-%-d').strftime('%d %B %Y')
+                formatted_date = datetime.strptime(date_str, '%Y-%m-%d').strftime('%-d %B %Y')
                 eruption_title = f"List of Volcanoes with Eruptive Activity on {formatted_date}"
                 unrest_title = f"List of Volcanoes with Unrest on {formatted_date}"
 
@@ -117,37 +391,28 @@ def process_data_smithsonian():
                 print(f"❌ An unexpected error occurred: {e}")
                 return None, None
 
-        def scrape_volcano_reports_alerts():
+        @instrumented("extract.scrape_volcano_reports_alerts")
+        def scrape_volcano_reports_alerts(date_str=None, html=None):
             """
             Scrapes the 'Volcano Reports' tab for a date and returns
             a DataFrame with volcano name, Observatory Alert Level, and Aviation Alert Level.
 
             Args:
-                date_str (str): 'YYYY-MM-DD' (e.g., '2025-09-14').
+                date_str (str): 'YYYY-MM-DD' (e.g., '2025-09-14'), yesterday by default.
+                html (str): daily report page already fetched for that date (default: fetched here)
 
             Returns:
                 pd.DataFrame with columns:
-                ['Volcano', 'Observatory Alert Level', 'Aviation Alert Level']
+                ['Name', 'observatory_level', 'aviation_level']
             """
-            # Build the target URL
-            date_obj = datetime.now()
-            date_obj = date_obj - timedelta(days=1)
-            #date_str = "2025-11-24"
-            date_str = date_obj.strftime("%Y-%m-%d")
-            url = f"https://volcano.si.edu/reports_daily.cfm?activitydate={date_str}"
-
-            # Headers to mimic a browser and avoid blocking
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+            if date_str is None:
+                date_str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
             try:
-                # Fetch the webpage
-                response = requests.get(url, headers=headers)
-                response.raise_for_status()  # Raise HTTP errors if any
-                print(f"Accessed URL: {response.url}")
+                if html is None:
+                    html = fetch_daily_report(date_str)
 
-                soup = BeautifulSoup(response.text, 'html.parser')
+                soup = BeautifulSoup(html, 'html.parser')
 
                 def extract_section(section_title):
                     section = soup.find('div', class_='SectionHeader-Variable',
@@ -200,7 +465,7 @@ def process_data_smithsonian():
                     df = pd.DataFrame(rows)
                     return df
 
-                formatted_date = datetime.strptime(date_str, '%Y-%m-%-d').strftime('%d %B %Y')
+                formatted_date = datetime.strptime(date_str, '%Y-%m-%d').strftime('%-d %B %Y')
                 alert_title = f"Reports for Volcanoes with Eruptive Activity on {formatted_date}"
                 alert_df = extract_section(alert_title)
 
@@ -208,10 +473,10 @@ def process_data_smithsonian():
 
             except requests.exceptions.RequestException as e:
                 print(f"❌ Error fetching the webpage: {e}")
-                return None, None
+                return None
             except Exception as e:
                 print(f"❌ An unexpected error occurred: {e}")
-                return None, None
+                return None
 
         def download_wfs_points_to_csv(wfs_url, typename):
             """
@@ -244,16 +509,21 @@ def process_data_smithsonian():
             except Exception as e:
                 print(f"Error: {str(e)}")
 
+        @instrumented("extract.scrape_earthquake_data")
         def scrape_earthquake_data():
             """
             Scrapes latest earthquake.
 
+            The feed window is the EARTHQUAKE_FEED Variable (all_day by default, all_week to
+            fill missed days, the archive deduplicates on the event id).
+
             Returns:
-                tuple: (DataFrame of erupting volcanoes, DataFrame of unrest volcanoes)
+                pd.DataFrame: one row per event with its USGS id, UTC time and day (date)
             """
 
             # USGS GeoJSON feed for all earthquakes in the past day
-            url = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson"
+            feed = Variable.get("EARTHQUAKE_FEED", default_var="all_day")
+            url = f"https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/{feed}.geojson"
 
             try:
                 # Fetch the webpage
@@ -271,103 +541,315 @@ def process_data_smithsonian():
                     place = feature["properties"]["place"]
                     infos = feature["properties"]["url"]
                     x_coordinate, y_coordinate, depth = coords[0], coords[1], coords[2]
-                    records.append({"magnitude": mag, "place": place, "infos": infos, "y_coordinate": y_coordinate,
+                    records.append({"id": feature["id"], "time": feature["properties"]["time"],
+                                    "magnitude": mag, "place": place, "infos": infos, "y_coordinate": y_coordinate,
                                     "x_coordinate": x_coordinate, "depth": depth})
 
                 # Create DataFrame
                 df = pd.DataFrame(records)
+                # Event time in milliseconds since epoch, the day of the event is its archive partition
+                df["time"] = pd.to_datetime(df["time"], unit="ms", utc=True)
+                df["date"] = df["time"].dt.strftime("%Y-%m-%d")
 
                 return df
 
             except requests.exceptions.RequestException as e:
                 print(f"❌ Error fetching the webpage: {e}")
-                return None, None
+                return None
             except Exception as e:
                 print(f"❌ An unexpected error occurred: {e}")
-                return None, None
-
-        def get_data(erupting_df = None, unrest_df = None, alerts_df = None, volcanoes_db = None, eruptions_db = None, earthquakes_db = None):
+                return None
 
-            def ensure_table_exists(hook, table_name, df, truncate_if_exists=True):
-                """Check if table exists, create if not."""
-                conn = hook.get_conn()
-                cursor = conn.cursor()
+        def ensure_table_exists(hook, table_name, df, truncate_if_exists=True, dataset=None):
+            """
+            Check if table exists, create if not.
 
-                # Check if table exists
+            With a dataset, the declared columns of table_schemas get their schema type and the
+            dataset indexes are created. A truncated table whose declared columns still have an
+            older type (e.g. TEXT) is converted, the other tables keep their column types.
+            """
+            conn = hook.get_conn()
+            cursor = conn.cursor()
+            declared = table_schemas[dataset]['columns'] if dataset else {}
+
+            # Check if table exists
+            cursor.execute(
+                sql.SQL("""
+                    SELECT EXISTS (
+                        SELECT FROM information_schema.tables
+                        WHERE table_name = %s
+                    )
+                """),
+                (table_name,)
+            )
+            table_exists = cursor.fetchone()[0]
+
+            def column_type(col, dtype):
+                if col in declared:
+                    return column_types[declared[col]]
+                if dtype == 'int64':
+                    return 'INTEGER'
+                elif dtype == 'float64':
+                    return 'FLOAT'
+                return 'TEXT'  # Default for strings, dates, etc.
+
+            if not table_exists:
+                # Generate CREATE TABLE statement from DataFrame
+                columns = []
+                for col, dtype in df.dtypes.items():
+                    columns.append(sql.SQL("{} {}").format(
+                        sql.Identifier(col),
+                        sql.SQL(column_type(col, dtype))
+                    ))
+
+                # Create the table
                 cursor.execute(
-                    sql.SQL("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables
-                            WHERE table_name = %s
-                        )
-                    """),
+                    sql.SQL("CREATE TABLE {} ({})").format(
+                        sql.Identifier(table_name),
+                        sql.SQL(", ").join(columns)
+                    )
+                )
+                conn.commit()
+                print(f"Table {table_name} created.")
+            else:
+                # Columns added to a source since the table was created (e.g. the earthquake id / time)
+                cursor.execute(
+                    sql.SQL("SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s"),
                     (table_name,)
                 )
-                table_exists = cursor.fetchone()[0]
-
-                if not table_exists:
-                    # Generate CREATE TABLE statement from DataFrame
-                    columns = []
-                    for col, dtype in df.dtypes.items():
-                        if dtype == 'int64':
-                            col_type = 'INTEGER'
-                        elif dtype == 'float64':
-                            col_type = 'FLOAT'
-                        else:
-                            col_type = 'TEXT'  # Default for strings, dates, etc.
-                        columns.append(sql.SQL("{} {}").format(
-                            sql.Identifier(col),
-                            sql.SQL(col_type)
-                        ))
+                existing_columns = dict(cursor.fetchall())
+                for col, dtype in df.dtypes.items():
+                    if col not in existing_columns:
+                        cursor.execute(
+                            sql.SQL("ALTER TABLE {} ADD COLUMN {} {}").format(
+                                sql.Identifier(table_name),
+                                sql.Identifier(col),
+                                sql.SQL(column_type(col, dtype))
+                            )
+                        )
+                        print(f"Column {col} added to {table_name}.")
+                conn.commit()
 
-                    # Create the table
+                if truncate_if_exists:
+                    # Delete all rows (faster than DELETE FROM)
                     cursor.execute(
-                        sql.SQL("CREATE TABLE {} ({})").format(
-                            sql.Identifier(table_name),
-                            sql.SQL(", ").join(columns)
+                        sql.SQL("TRUNCATE TABLE {}").format(
+                            sql.Identifier(table_name)
                         )
                     )
                     conn.commit()
-                    print(f"Table {table_name} created.")
-                else:
-                    if truncate_if_exists:
-                        # Delete all rows (faster than DELETE FROM)
-                        cursor.execute(
-                            sql.SQL("TRUNCATE TABLE {}").format(
-                                sql.Identifier(table_name)
+                    print(f"All rows in {table_name} truncated.")
+
+                    # Tables created before the schemas were declared, converted while empty
+                    information_schema_types = {'INTEGER': 'integer', 'DOUBLE PRECISION': 'double precision', 'TEXT': 'text',
+                                                'DATE': 'date', 'TIMESTAMPTZ': 'timestamp with time zone'}
+                    for col, data_type in existing_columns.items():
+                        if col in declared and information_schema_types[column_types[declared[col]]] != data_type:
+                            cursor.execute(
+                                sql.SQL("ALTER TABLE {} ALTER COLUMN {} TYPE {} USING {}::{}").format(
+                                    sql.Identifier(table_name),
+                                    sql.Identifier(col),
+                                    sql.SQL(column_types[declared[col]]),
+                                    sql.Identifier(col),
+                                    sql.SQL(column_types[declared[col]])
+                                )
                             )
+                            print(f"Column {col} of {table_name} converted to {column_types[declared[col]]}.")
+                    conn.commit()
+                else:
+                    print(f"Table {table_name} already exists (no truncation).")
+
+            if dataset:
+                for suffix, method, expression in table_schemas[dataset]['indexes']:
+                    cursor.execute(
+                        sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING {} ({})").format(
+                            sql.Identifier(f"{table_name}_{suffix}_idx"),
+                            sql.Identifier(table_name),
+                            sql.SQL(method),
+                            sql.SQL(expression)
                         )
-                        conn.commit()
-                        print(f"All rows in {table_name} truncated.")
-                    else:
-                        print(f"Table {table_name} already exists (no truncation).")
+                    )
+                conn.commit()
 
-                cursor.close()
+            cursor.close()
 
-            def insert_rows(hook, table_name, df):
-                """Insert DataFrame rows into PostgreSQL table."""
-                conn = hook.get_conn()
-                cursor = conn.cursor()
+        def insert_rows(hook, table_name, df):
+            """Insert DataFrame rows into PostgreSQL table."""
+            conn = hook.get_conn()
+            cursor = conn.cursor()
 
-                # Generate column names and placeholders
-                columns = df.columns.tolist()
-                placeholders = [sql.Placeholder()] * len(columns)
+            # Generate column names
+            columns = df.columns.tolist()
 
-                # Build INSERT query
-                query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
-                    sql.Identifier(table_name),
-                    sql.SQL(", ").join(map(sql.Identifier, columns)),
-                    sql.SQL(", ").join(placeholders)
-                )
+            # Build INSERT query, execute_values fills VALUES with pages of row tuples
+            query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+                sql.Identifier(table_name),
+                sql.SQL(", ").join(map(sql.Identifier, columns))
+            )
 
-                # Insert rows
-                for _, row in df.iterrows():
-                    cursor.execute(query, row.tolist())
+            # Missing values of every dtype (NaN, pd.NA, NaT) are sent as NULL
+            values = df.astype(object).where(df.notna(), None)
+
+            # Insert rows, one statement per page instead of one per row
+            with instrument("get_data.insert_rows", rows_in=len(df), table=table_name) as metrics:
+                execute_values(cursor, query, list(values.itertuples(index=False, name=None)),
+                               page_size=1000)
                 conn.commit()
-                print(f"Inserted {len(df)} rows into {table_name}.")
+                metrics['rows_out'] = len(df)
+            print(f"Inserted {len(df)} rows into {table_name}.")
+
+            cursor.close()
 
+        def daily_report_dates(history_dir):
+            """Report days held by the daily report history, oldest first."""
+            if not os.path.isdir(history_dir):
+                return []
+            return sorted(name.split('=', 1)[1] for name in os.listdir(history_dir) if name.startswith('date='))
+
+        def load_report_history(hook, reports, history_dir):
+            """
+            Stores parsed daily reports in the date-partitioned history: one Parquet partition per
+            report day (history_dir/date=YYYY-MM-DD/{erupting,unrest,alerts}.parquet) and the
+            erupting/unrest/alerts_volcanoes_history tables, bulk loaded by insert_rows (execute_values).
+
+            A fetched day with nothing reported still gets its (empty) partition, so it counts as
+            present. The partitions are only written once the tables are loaded, a day whose
+            load failed is fetched again by the next backfill. Days loaded again replace their rows.
+
+            Args:
+                hook (PostgresHook): volcanic_etl connection
+                reports (dict): {date_str: (erupting_df, unrest_df, alerts_df)}, any frame may be None
+                history_dir (str): history root
+
+            Returns:
+                dict: {'erupting' | 'unrest' | 'alerts': rows of all the days with their date}
+            """
+            tables = {'erupting': [], 'unrest': [], 'alerts': []}
+            partitions = {}
+            for date_str, (erupting_df, unrest_df, alerts_df) in sorted(reports.items()):
+                partitions[date_str] = {}
+                if alerts_df is not None and not alerts_df.empty:
+                    alerts_df = alerts_df.drop(columns=['date'], errors='ignore')
+                for name, df in [('erupting', erupting_df), ('unrest', unrest_df), ('alerts', alerts_df)]:
+                    if df is None or df.empty:
+                        continue
+                    if name != 'alerts' and alerts_df is not None and not alerts_df.empty:
+                        df = df.merge(alerts_df, on="Name", how="left")
+                    partitions[date_str][name] = df
+                    tables[name].append(df.assign(date=date_str))
+
+            loaded = {}
+            for name, frames in tables.items():
+                if not frames:
+                    continue
+                df = pd.concat(frames, ignore_index=True)
+                typed = coerce_table(df, name)
+                table_name = f'{name}_volcanoes_history'
+                ensure_table_exists(hook, table_name, typed, truncate_if_exists=False, dataset=name)
+                conn = hook.get_conn()
+                cursor = conn.cursor()
+                cursor.execute(
+                    sql.SQL("DELETE FROM {} WHERE date = ANY(%s::date[])").format(sql.Identifier(table_name)),
+                    (sorted(df['date'].unique().tolist()),)
+                )
+                conn.commit()
                 cursor.close()
+                insert_rows(hook, table_name, typed)
+                loaded[name] = df
+
+            # Written aside and renamed, a partition is either complete or absent
+            for date_str, frames in partitions.items():
+                partition = os.path.join(history_dir, f"date={date_str}")
+                tmp_partition = os.path.join(history_dir, f".date={date_str}.tmp")
+                shutil.rmtree(tmp_partition, ignore_errors=True)
+                os.makedirs(tmp_partition)
+                for name, df in frames.items():
+                    write_table(df, os.path.join(tmp_partition, f"{name}.parquet"))
+                shutil.rmtree(partition, ignore_errors=True)
+                os.replace(tmp_partition, partition)
+            print(f"✅ daily report history: {len(reports)} days stored in {history_dir}")
+            return loaded
+
+        def rate_limiter(requests_per_second):
+            """
+            Spaces the calls of the returned wait function 1 / requests_per_second apart, across threads.
 
+            Args:
+                requests_per_second (float): request-rate cap
+
+            Returns:
+                callable: blocks the calling thread until its request slot
+            """
+            lock = threading.Lock()
+            next_slot = [time.monotonic()]
+
+            def wait():
+                with lock:
+                    slot = max(next_slot[0], time.monotonic())
+                    next_slot[0] = slot + 1 / requests_per_second
+                time.sleep(max(0.0, slot - time.monotonic()))
+            return wait
+
+        def backfill_daily_reports(start_date, end_date, history_dir, max_workers=4, requests_per_second=1.0):
+            """
+            Fetches the daily reports of a date range missing from the history and loads them in one go.
+
+            Up to max_workers pages are downloaded at once, their start times capped at
+            requests_per_second. Pages are parsed with the daily scrapers as they arrive. Days
+            that could not be downloaded or parsed stay missing, so the next backfill over the
+            range retries them.
+
+            Args:
+                start_date (str): first day 'YYYY-MM-DD', included
+                end_date (str): last day 'YYYY-MM-DD', included
+                history_dir (str): daily report history root
+                max_workers (int): concurrent downloads
+                requests_per_second (float): request-rate cap on volcano.si.edu
+
+            Returns:
+                dict: output of load_report_history, empty when no day was missing
+            """
+            dates = pd.date_range(start_date, end_date, freq='D').strftime('%Y-%m-%d').tolist()
+            present = set(daily_report_dates(history_dir))
+            missing = [date_str for date_str in dates if date_str not in present]
+            print(f"Backfill {start_date} to {end_date}: {len(dates) - len(missing)} days already present, "
+                  f"{len(missing)} to fetch")
+            if not missing:
+                return {}
+
+            wait_for_slot = rate_limiter(requests_per_second)
+            session = requests.Session()
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+
+            def fetch(date_str):
+                wait_for_slot()
+                return fetch_daily_report(date_str, session)
+
+            reports, failed = {}, []
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(fetch, date_str): date_str for date_str in missing}
+                for future in as_completed(futures):
+                    date_str = futures[future]
+                    try:
+                        html = future.result()
+                    except requests.exceptions.RequestException as e:
+                        print(f"❌ Error fetching the report of {date_str}: {e}")
+                        failed.append(date_str)
+                        continue
+                    erupting_df, unrest_df = scrape_volcanic_db(date_str, html)
+                    if erupting_df is None and unrest_df is None:
+                        failed.append(date_str)
+                        continue
+                    reports[date_str] = (erupting_df, unrest_df, scrape_volcano_reports_alerts(date_str, html))
+            session.close()
+
+            if failed:
+                print(f"⚠️ {len(failed)} days not loaded, left for the next backfill: {', '.join(sorted(failed))}")
+            if not reports:
+                return {}
+            return load_report_history(PostgresHook(postgres_conn_id="volcanic_etl"), reports, history_dir)
+
+        def get_data(erupting_df = None, unrest_df = None, alerts_df = None, volcanoes_db = None, eruptions_db = None, earthquakes_db = None):
             date_obj = datetime.now()
             date_obj = date_obj - timedelta(days=1)
             #date_str = "2025-11-24"
@@ -388,8 +870,9 @@ def process_data_smithsonian():
                 os.makedirs(os.path.dirname(path), exist_ok=True)
 
             if volcanoes_db is not None and not volcanoes_db.empty:
+                volcanoes_db = coerce_table(volcanoes_db, 'catalog')
                 volcanoes_db.to_csv(data_paths["volcanoes_db"], index=False)
-                ensure_table_exists(postgres_hook, 'volcanoes_db', volcanoes_db)
+                ensure_table_exists(postgres_hook, 'volcanoes_db', volcanoes_db, dataset='catalog')
                 insert_rows(postgres_hook, 'volcanoes_db', volcanoes_db)
                 print(f"✅ volcanoes_db saved to {data_paths["volcanoes_db"]} ({len(volcanoes_db)} entries)")
             else:
@@ -398,10 +881,11 @@ def process_data_smithsonian():
             if erupting_df is not None and not erupting_df.empty:
                 erupting_df = erupting_df.merge(alerts_df, on="Name", how="left")
                 erupting_df["date"] = date_str
+                erupting_df = coerce_table(erupting_df, 'erupting')
                 erupting_df.to_csv(data_paths["erupting"], index=False)
-                ensure_table_exists(postgres_hook, f'erupting_volcanoes_{date_str.replace("-", "")}', erupting_df)
+                ensure_table_exists(postgres_hook, f'erupting_volcanoes_{date_str.replace("-", "")}', erupting_df, dataset='erupting')
                 insert_rows(postgres_hook, f'erupting_volcanoes_{date_str.replace("-", "")}', erupting_df)
-                ensure_table_exists(postgres_hook, f'erupting_volcanoes_latest', erupting_df)
+                ensure_table_exists(postgres_hook, f'erupting_volcanoes_latest', erupting_df, dataset='erupting')
                 insert_rows(postgres_hook, f'erupting_volcanoes_latest', erupting_df)
                 params = erupting_df['Name'].dropna().unique().tolist()
                 if params:
@@ -418,9 +902,10 @@ def process_data_smithsonian():
                     query = "SELECT * FROM volcanoes_db"
                     filter_erupting_df = pd.read_sql(query, postgres_hook.get_conn())
                 filter_erupting_df["date"] = date_str
-                ensure_table_exists(postgres_hook, f'filtered_erupting_volcanoes_{date_str.replace("-", "")}', filter_erupting_df)
+                filter_erupting_df = coerce_table(filter_erupting_df, 'catalog')
+                ensure_table_exists(postgres_hook, f'filtered_erupting_volcanoes_{date_str.replace("-", "")}', filter_erupting_df, dataset='catalog')
                 insert_rows(postgres_hook, f'filtered_erupting_volcanoes_{date_str.replace("-", "")}', filter_erupting_df)
-                ensure_table_exists(postgres_hook, f'filtered_erupting_volcanoes_latest', filter_erupting_df)
+                ensure_table_exists(postgres_hook, f'filtered_erupting_volcanoes_latest', filter_erupting_df, dataset='catalog')
                 insert_rows(postgres_hook, f'filtered_erupting_volcanoes_latest', filter_erupting_df)
 
                 print(f"✅ erupting_volcanoes saved to {data_paths["erupting"]} ({len(erupting_df)} entries)")
@@ -430,10 +915,11 @@ def process_data_smithsonian():
             if unrest_df is not None and not unrest_df.empty:
                 unrest_df = unrest_df.merge(alerts_df, on="Name", how="left")
                 unrest_df["date"] = date_str
+                unrest_df = coerce_table(unrest_df, 'unrest')
                 unrest_df.to_csv(data_paths["unrest"], index=False)
-                ensure_table_exists(postgres_hook, f'unrest_volcanoes_{date_str.replace("-", "")}', unrest_df)
+                ensure_table_exists(postgres_hook, f'unrest_volcanoes_{date_str.replace("-", "")}', unrest_df, dataset='unrest')
                 insert_rows(postgres_hook, f'unrest_volcanoes_{date_str.replace("-", "")}', unrest_df)
-                ensure_table_exists(postgres_hook, f'unrest_volcanoes_latest', unrest_df)
+                ensure_table_exists(postgres_hook, f'unrest_volcanoes_latest', unrest_df, dataset='unrest')
                 insert_rows(postgres_hook, f'unrest_volcanoes_latest', unrest_df)
                 print(f"✅ unrest_volcanoes saved to {data_paths["unrest"]} ({len(unrest_df)} entries)")
                 params = unrest_df['Name'].dropna().unique().tolist()
@@ -451,9 +937,10 @@ def process_data_smithsonian():
                     query = "SELECT * FROM volcanoes_db"
                     filter_unrest_df = pd.read_sql(query, postgres_hook.get_conn())
                 filter_unrest_df["date"] = date_str
-                ensure_table_exists(postgres_hook, f'filtered_unrest_volcanoes_{date_str.replace("-", "")}', filter_unrest_df)
+                filter_unrest_df = coerce_table(filter_unrest_df, 'catalog')
+                ensure_table_exists(postgres_hook, f'filtered_unrest_volcanoes_{date_str.replace("-", "")}', filter_unrest_df, dataset='catalog')
                 insert_rows(postgres_hook, f'filtered_unrest_volcanoes_{date_str.replace("-", "")}', filter_unrest_df)
-                ensure_table_exists(postgres_hook, f'filtered_unrest_volcanoes_latest', filter_unrest_df)
+                ensure_table_exists(postgres_hook, f'filtered_unrest_volcanoes_latest', filter_unrest_df, dataset='catalog')
                 insert_rows(postgres_hook, f'filtered_unrest_volcanoes_latest', filter_unrest_df)
             else:
                 print(f"⚠️ No data available for unrest_volcanoes")
@@ -461,9 +948,10 @@ def process_data_smithsonian():
             if alerts_df is not None and not alerts_df.empty:
                 alerts_df.to_csv(data_paths["alerts"], index=False)
                 alerts_df["date"] = date_str
-                ensure_table_exists(postgres_hook, f'alerts_volcanoes_{date_str.replace("-", "")}', alerts_df)
+                alerts_df = coerce_table(alerts_df, 'alerts')
+                ensure_table_exists(postgres_hook, f'alerts_volcanoes_{date_str.replace("-", "")}', alerts_df, dataset='alerts')
                 insert_rows(postgres_hook, f'alerts_volcanoes_{date_str.replace("-", "")}', alerts_df)
-                ensure_table_exists(postgres_hook, f'alerts_volcanoes_latest', alerts_df)
+                ensure_table_exists(postgres_hook, f'alerts_volcanoes_latest', alerts_df, dataset='alerts')
                 insert_rows(postgres_hook, f'alerts_volcanoes_latest', alerts_df)
                 print(f"✅ alerts_df saved to {data_paths["alerts"]} ({len(alerts_df)} entries)")
             else:
@@ -471,523 +959,2194 @@ def process_data_smithsonian():
 
 
             if eruptions_db is not None and not eruptions_db.empty:
+                eruptions_db = coerce_table(eruptions_db, 'eruptions')
                 eruptions_db.to_csv(data_paths["historical_eruptions_db"], index=False)
-                ensure_table_exists(postgres_hook, f'historical_eruptions_db', eruptions_db)
+                ensure_table_exists(postgres_hook, f'historical_eruptions_db', eruptions_db, dataset='eruptions')
                 insert_rows(postgres_hook, f'historical_eruptions_db', eruptions_db)
                 print(f"✅ eruptions_db saved to {data_paths["historical_eruptions_db"]} ({len(eruptions_db)} entries)")
             else:
                 print(f"⚠️ No data available for eruption_db")
 
             if earthquakes_db is not None and not earthquakes_db.empty:
+                # date is the day of each event (scrape_earthquake_data), not the day of the run
+                earthquakes_db = coerce_table(earthquakes_db, 'earthquakes')
                 earthquakes_db.to_csv(data_paths["earthquakes_db"], index=False)
-                earthquakes_db["date"] = date_str
-                ensure_table_exists(postgres_hook, f'earthquakes_db_{date_str.replace("-", "")}', earthquakes_db)
+                ensure_table_exists(postgres_hook, f'earthquakes_db_{date_str.replace("-", "")}', earthquakes_db, dataset='earthquakes')
                 insert_rows(postgres_hook, f'earthquakes_db_{date_str.replace("-", "")}', earthquakes_db)
-                ensure_table_exists(postgres_hook, f'earthquakes_db_latest', earthquakes_db)
+                ensure_table_exists(postgres_hook, f'earthquakes_db_latest', earthquakes_db, dataset='earthquakes')
                 insert_rows(postgres_hook, f'earthquakes_db_latest', earthquakes_db)
                 print(f"✅ earthquakes_db saved to {data_paths["earthquakes_db"]} ({len(earthquakes_db)} entries)")
             else:
                 print(f"⚠️ No data available for earthquakes_db")
 
 
-        erupting_df, unrest_df = scrape_volcanic_db()
-
-        alerts_df = scrape_volcano_reports_alerts()
-
-        volcanoes_db = download_wfs_points_to_csv(
-            wfs_url="https://webservices.volcano.si.edu/geoserver/ows",
-            typename="GVP-VOTW:Smithsonian_VOTW_Holocene_Volcanoes",
-        )
+        daily_reports_dir = '/home/gillet/Bureau/Volcanic_ETL/data/daily_reports'
+
+        # Backfill mode: fills the days of BACKFILL_START_DATE..BACKFILL_END_DATE missing from the history
+        backfill_start = Variable.get("BACKFILL_START_DATE", default_var="")
+        if backfill_start:
+            backfill_end = Variable.get("BACKFILL_END_DATE",
+                                        default_var=(datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"))
+            with instrument("extract.backfill_daily_reports", start=backfill_start, end=backfill_end) as metrics:
+                backfilled = backfill_daily_reports(
+                    backfill_start, backfill_end, daily_reports_dir,
+                    max_workers=int(Variable.get("BACKFILL_WORKERS", default_var="4")),
+                    requests_per_second=float(Variable.get("BACKFILL_REQUESTS_PER_SECOND", default_var="1")))
+                metrics['rows_out'] = sum(len(df) for df in backfilled.values())
+
+            if 'alerts' in backfilled:
+                # The backfilled days fill the gaps of the alert history runs
+                alert_history_path = transform_data_paths["alert_history"]
+                alert_history = pd.read_parquet(alert_history_path) if os.path.exists(alert_history_path) else None
+                alert_history = update_alert_history(alert_history, backfilled['alerts'])
+                write_table(alert_history, alert_history_path, row_group_size=128)
+                print(f"✅ alert history: {len(alert_history)} runs after the backfill")
+
+        report_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        erupting_df, unrest_df = scrape_volcanic_db(report_date)
+
+        alerts_df = scrape_volcano_reports_alerts(report_date)
+
+        if erupting_df is not None or unrest_df is not None:
+            # A failed scrape leaves the day missing, for the next backfill
+            load_report_history(PostgresHook(postgres_conn_id="volcanic_etl"),
+                                {report_date: (erupting_df, unrest_df, alerts_df)}, daily_reports_dir)
+
+        with instrument("extract.download_wfs", typename="GVP-VOTW:Smithsonian_VOTW_Holocene_Volcanoes") as metrics:
+            volcanoes_db = download_wfs_points_to_csv(
+                wfs_url="https://webservices.volcano.si.edu/geoserver/ows",
+                typename="GVP-VOTW:Smithsonian_VOTW_Holocene_Volcanoes",
+            )
+            metrics['rows_out'] = count_rows(volcanoes_db)
 
-        eruptions_db = download_wfs_points_to_csv(
-            wfs_url="https://webservices.volcano.si.edu/geoserver/ows",
-            typename="GVP-VOTW:Smithsonian_VOTW_Holocene_Eruptions",
-        )
+        with instrument("extract.download_wfs", typename="GVP-VOTW:Smithsonian_VOTW_Holocene_Eruptions") as metrics:
+            eruptions_db = download_wfs_points_to_csv(
+                wfs_url="https://webservices.volcano.si.edu/geoserver/ows",
+                typename="GVP-VOTW:Smithsonian_VOTW_Holocene_Eruptions",
+            )
+            metrics['rows_out'] = count_rows(eruptions_db)
 
         earthquakes_db = scrape_earthquake_data()
 
-        earthquakes_db["date"] = "2025-11-24"
-        #earthquakes_db["date"] = datetime.today().date()
-
         get_data(erupting_df, unrest_df, alerts_df, volcanoes_db, eruptions_db, earthquakes_db)
 
-    @task
-    def transform_data_smithsonian():
-
-        def query_database():
-            postgres_hook = PostgresHook(postgres_conn_id="volcanic_etl")
-            query_erupting_unrest = """
-                    SELECT
-                        *,
-                        'erupting'::text AS source,
-                        30::int AS buffer_km,
-                        ST_Transform(
-                            ST_Buffer(
-                                ST_Transform(
-                                    ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326),
-                                    3857
-                                ),
-                                30000
+    def read_sql_chunks(hook, query, chunksize, cursor_name, geom_col=None):
+        """
+        Reads a query in chunks through a named (server-side) cursor. PostgreSQL keeps the
+        result and sends chunksize rows per fetch, where pd.read_sql first pulls the whole
+        result into the client.
+
+        Args:
+            hook (PostgresHook): volcanic_etl connection
+            query (str): SELECT statement, without a trailing semicolon (it is wrapped in DECLARE)
+            chunksize (int): rows per chunk
+            cursor_name (str): name of the server-side cursor
+            geom_col (str): PostGIS geometry column decoded into a GeoDataFrame in EPSG:4326 (default: none)
+
+        Yields:
+            pd.DataFrame | gpd.GeoDataFrame: chunks of at most chunksize rows, in query order
+        """
+        conn = hook.get_conn()
+        try:
+            with conn.cursor(name=cursor_name) as cursor:
+                cursor.itersize = chunksize
+                cursor.execute(query)
+                while True:
+                    rows = cursor.fetchmany(chunksize)
+                    if not rows:
+                        break
+                    chunk = pd.DataFrame.from_records(rows, columns=[column[0] for column in cursor.description])
+                    if geom_col:
+                        # Geometries arrive as hex EWKB, like in gpd.read_postgis
+                        chunk[geom_col] = gpd.GeoSeries.from_wkb(chunk[geom_col], crs="EPSG:4326")
+                        chunk = gpd.GeoDataFrame(chunk, geometry=geom_col, crs="EPSG:4326")
+                    yield chunk
+        finally:
+            conn.close()
+
+    def query_database(data_paths, chunksize=50000, export_csv=False):
+        """
+        Loads the transform inputs from the volcanic_etl PostGIS database.
+
+        The large tables (volcano catalog details, MOESM1, GVP eruptions, population at risk
+        and population profiles) are streamed from server-side cursors straight to their app
+        files, so the task holds one chunk of them at a time. Only the columns the transform
+        still needs come back for those tables.
+
+        Args:
+            data_paths (dict): transform_data_paths
+            chunksize (int): rows per fetch of the streamed tables
+            export_csv (bool): also write the CSV / GPKG side outputs of the streamed tables
+
+        Returns:
+            tuple: (erupting_unrest, alerts, volcano core, MOESM1 keys and fatalities, GVP keys and
+                start years, population at risk cells, total_affected, risk_by_volcano,
+                earthquakes, None as the population profiles are already written)
+        """
+        postgres_hook = PostgresHook(postgres_conn_id="volcanic_etl")
+        query_erupting_unrest = """
+                SELECT
+                    *,
+                    'erupting'::text AS source,
+                    30::int AS buffer_km,
+                    ST_Transform(
+                        ST_Buffer(
+                            ST_Transform(
+                                ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326),
+                                3857
                             ),
-                            4326
-                        ) AS geom_buffer
-                    FROM filtered_erupting_volcanoes_latest
-
-                    UNION ALL
-
-                    SELECT
-                        *,
-                        'unrest'::text AS source,
-                        30::int AS buffer_km,
-                        ST_Transform(
-                            ST_Buffer(
-                                ST_Transform(ST_SetSRID(ST_MakePoint(v.x_coordinate, v.y_coordinate), 4326), 3857),
-                                30000
-                            ),
-                            4326
-                        ) AS buffer_geom
-                    FROM filtered_unrest_volcanoes_latest v
-            """
-            print("Loading erupting volcanoes with buffers...")
+                            30000
+                        ),
+                        4326
+                    ) AS geom_buffer
+                FROM filtered_erupting_volcanoes_latest
+
+                UNION ALL
+
+                SELECT
+                    *,
+                    'unrest'::text AS source,
+                    30::int AS buffer_km,
+                    ST_Transform(
+                        ST_Buffer(
+                            ST_Transform(ST_SetSRID(ST_MakePoint(v.x_coordinate, v.y_coordinate), 4326), 3857),
+                            30000
+                        ),
+                        4326
+                    ) AS buffer_geom
+                FROM filtered_unrest_volcanoes_latest v
+        """
+        print("Loading erupting volcanoes with buffers...")
+        with instrument("query_database.erupting_unrest") as metrics:
             result_erupting_unrest = gpd.read_postgis(
                 query_erupting_unrest,
                 postgres_hook.get_conn(),
                 geom_col='geom_buffer'
             )
-            print(f"Successfully loaded {len(result_erupting_unrest)} erupting volcanoes with buffers")
-
-            query_population_at_risk = """
-                    WITH volcano_buffers AS (
-                      SELECT
-                          *,
-                          'erupting'::text AS source,
-                          30::int AS buffer_km,
-                          ST_Transform(
-                            ST_Buffer(
-                              ST_Transform(ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326), 3857),
-                              30000
-                            ),
-                            4326
-                          ) AS buffer_geom
-                      FROM filtered_erupting_volcanoes_latest 
-
-                      UNION 
-
-                      SELECT
-                          *,
-                          'unrest'::text AS source,
-                          30::int AS buffer_km,
-                          ST_Transform(
-                            ST_Buffer(
-                              ST_Transform(ST_SetSRID(ST_MakePoint(v.x_coordinate, v.y_coordinate), 4326), 3857),
-                              30000
-                            ),
-                            4326
-                          ) AS buffer_geom
-                      FROM filtered_unrest_volcanoes_latest v
-                    )
-                    SELECT p.*, vb.id AS volcano_id, vb.source, vb.buffer_km
-                    FROM population_centroid p
-                    JOIN volcano_buffers vb
-                      ON ST_Intersects(p.geom, vb.buffer_geom);
-                """
-            print("Finding population centroids within volcano buffers...")
-            population_at_risk = gpd.read_postgis(
-                query_population_at_risk,
-                postgres_hook.get_conn(),
-                geom_col='geom'  # Assuming population_centroid has x/y coordinates
-            )
-            print(f"Found {len(population_at_risk)} population centroids at risk")
-
-            query_alert = """
-                SELECT *
-                FROM alerts_volcanoes_latest
-            """
-            print("Loading alerts volcanoes...")
-            result_alert = pd.read_sql(query_alert, postgres_hook.get_conn())
-            print(f"Successfully loaded {len(result_alert)} unrest volcanoes")
-
-            query_db = """
-                SELECT *
-                FROM volcanoes_db
-            """
-            print("Loading main volcanoes database...")
-            result_db = pd.read_sql(query_db, postgres_hook.get_conn())
-            print(f"Successfully loaded {len(result_db)} volcanoes from main database")
-
-            query_historical = """
-                SELECT *
-                FROM "MOESM1"
-            """
-            print("Loading historical data (MOESM1)...")
-            historical_db = pd.read_sql(query_historical, postgres_hook.get_conn())
-            print(f"Successfully loaded {len(historical_db)} records from MOESM1")
-
-            query_historical_gvp = """
-                SELECT *
-                FROM "historical_eruptions_db"
+            metrics['rows_out'] = len(result_erupting_unrest)
+        print(f"Successfully loaded {len(result_erupting_unrest)} erupting volcanoes with buffers")
+
+        query_population_at_risk = """
+                WITH volcano_buffers AS (
+                  SELECT
+                      *,
+                      'erupting'::text AS source,
+                      30::int AS buffer_km,
+                      ST_Transform(
+                        ST_Buffer(
+                          ST_Transform(ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326), 3857),
+                          30000
+                        ),
+                        4326
+                      ) AS buffer_geom
+                  FROM filtered_erupting_volcanoes_latest 
+
+                  UNION 
+
+                  SELECT
+                      *,
+                      'unrest'::text AS source,
+                      30::int AS buffer_km,
+                      ST_Transform(
+                        ST_Buffer(
+                          ST_Transform(ST_SetSRID(ST_MakePoint(v.x_coordinate, v.y_coordinate), 4326), 3857),
+                          30000
+                        ),
+                        4326
+                      ) AS buffer_geom
+                  FROM filtered_unrest_volcanoes_latest v
+                )
+                SELECT p.*, vb.id AS volcano_id, vb.source, vb.buffer_km
+                FROM population_centroid p
+                JOIN volcano_buffers vb
+                  ON ST_Intersects(p.geom, vb.buffer_geom)
+                ORDER BY vb.id, vb.source, p.gid
             """
-            print("Loading historical eruptions (GVP)...")
-            historical_db_GVP = pd.read_sql(query_historical_gvp, postgres_hook.get_conn())
-            print(f"Successfully loaded {len(historical_db_GVP)} records from historical_eruptions_db")
-
-            query_earthquakes = """
-                SELECT *
-                FROM "earthquakes_db_latest"
+        print("Finding population centroids within volcano buffers...")
+        with instrument("query_database.population_at_risk") as metrics:
+            # The partitions of the spatial analysis only need the cells, their population and volcano
+            population_at_risk_rows, population_at_risk = write_table_chunks(
+                read_sql_chunks(postgres_hook, query_population_at_risk, chunksize, "population_at_risk", geom_col='geom'),
+                data_paths["population_at_risk"], export_csv, keep_columns=['gid', 'pop', 'volcano_id', 'geom'])
+            metrics['rows_out'] = population_at_risk_rows
+        print(f"Found {population_at_risk_rows} population centroids at risk")
+
+        query_population_profiles = """
+                WITH active_volcanoes AS (
+                  SELECT "Volcano_Number", x_coordinate, y_coordinate,
+                         ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326) AS geom
+                  FROM filtered_erupting_volcanoes_latest
+
+                  UNION
+
+                  SELECT "Volcano_Number", x_coordinate, y_coordinate,
+                         ST_SetSRID(ST_MakePoint(x_coordinate, y_coordinate), 4326) AS geom
+                  FROM filtered_unrest_volcanoes_latest
+                )
+                SELECT
+                    d.volcano_number,
+                    ROUND(d.distance_km::numeric, 3)::float8 AS distance_km,
+                    ROUND(SUM(d.pop) OVER (PARTITION BY d.volcano_number ORDER BY d.distance_km, d.gid
+                                           ROWS UNBOUNDED PRECEDING))::bigint AS cumulative_pop
+                FROM (
+                  SELECT
+                      av."Volcano_Number" AS volcano_number,
+                      p.gid,
+                      COALESCE(p.pop, 0) AS pop,
+                      ST_Distance(p.geom::geography, av.geom::geography) / 1000.0 AS distance_km
+                  FROM population_centroid p
+                  JOIN active_volcanoes av
+                    ON p.geom && ST_Expand(av.geom, 1.0 / GREATEST(COS(RADIANS(av.y_coordinate)), 0.01), 1.0)
+                   AND ST_DWithin(p.geom::geography, av.geom::geography, 100000)
+                ) d
+                ORDER BY d.volcano_number, d.distance_km, d.gid
             """
-            print("Loading earthquakes data ...")
+        print("Streaming population centroids within 100 km to the distance profiles...")
+        with instrument("query_database.population_profiles") as metrics:
+            # Running totals are computed by the window function, same output as build_population_profiles
+            population_profiles_rows, _ = write_table_chunks(
+                read_sql_chunks(postgres_hook, query_population_profiles, chunksize, "population_profiles"),
+                data_paths["population_profiles"], export_csv)
+            metrics['rows_out'] = population_profiles_rows
+        print(f"Successfully wrote {population_profiles_rows} population centroids within 100 km")
+
+        query_alert = """
+            SELECT *
+            FROM alerts_volcanoes_latest
+        """
+        print("Loading alerts volcanoes...")
+        with instrument("query_database.alerts") as metrics:
+            result_alert = pd.read_sql(query_alert, postgres_hook.get_conn())
+            metrics['rows_out'] = len(result_alert)
+        print(f"Successfully loaded {len(result_alert)} unrest volcanoes")
+
+        query_db = """
+            SELECT *
+            FROM volcanoes_db
+            ORDER BY "Volcano_Number"
+        """
+        print("Loading main volcanoes database...")
+        volcano_cores = []
+
+        def volcano_details_chunks():
+            # The core columns stay in memory for the map tables, the details go to their file
+            for chunk in read_sql_chunks(postgres_hook, query_db, chunksize, "volcanoes_db"):
+                volcanoes_core, volcano_details = split_volcano_catalog(chunk)
+                volcano_cores.append(volcanoes_core)
+                yield volcano_details
+
+        with instrument("query_database.volcanoes_db") as metrics:
+            volcanoes_db_rows, _ = write_table_chunks(volcano_details_chunks(), data_paths["volcano_details"],
+                                                      export_csv, row_group_size=128)
+            result_db = pd.concat(volcano_cores, ignore_index=True) if volcano_cores else None
+            metrics['rows_out'] = volcanoes_db_rows
+        print(f"Successfully loaded {volcanoes_db_rows} volcanoes from main database")
+
+        # Whole-row text as the last sort key, so the rows of a volcano keep the same order on every run
+        query_historical = """
+            SELECT *
+            FROM "MOESM1" t
+            ORDER BY t."(GVP) Volcano number", t::text
+        """
+        print("Loading historical data (MOESM1)...")
+        # MOESM1 is loaded outside this DAG, its declared columns are typed here chunk by chunk
+        with instrument("query_database.historical_db") as metrics:
+            historical_db_rows, historical_db = write_table_chunks(
+                (coerce_table(chunk, 'MOESM1')
+                 for chunk in read_sql_chunks(postgres_hook, query_historical, chunksize, "moesm1")),
+                data_paths["historical_db"], export_csv, keep_columns=['(GVP) Volcano number', 'Number of fatalities'])
+            metrics['rows_out'] = historical_db_rows
+        print(f"Successfully loaded {historical_db_rows} records from MOESM1")
+
+        query_historical_gvp = """
+            SELECT *
+            FROM "historical_eruptions_db"
+            ORDER BY "Volcano_Number", "Eruption_Number"
+        """
+        print("Loading historical eruptions (GVP)...")
+        with instrument("query_database.historical_db_GVP") as metrics:
+            historical_db_GVP_rows, historical_db_GVP = write_table_chunks(
+                read_sql_chunks(postgres_hook, query_historical_gvp, chunksize, "historical_eruptions_db"),
+                data_paths["historical_db_GVP"], export_csv, keep_columns=['Volcano_Number', 'StartDateYear'])
+            metrics['rows_out'] = historical_db_GVP_rows
+        print(f"Successfully loaded {historical_db_GVP_rows} records from historical_eruptions_db")
+
+        query_earthquakes = """
+            SELECT *
+            FROM "earthquakes_db_latest"
+        """
+        print("Loading earthquakes data ...")
+        with instrument("query_database.earthquakes_db") as metrics:
             earthquakes_db = pd.read_sql(query_earthquakes, postgres_hook.get_conn())
-            print(f"Successfully loaded {len(earthquakes_db)} records")
-
-            if len(population_at_risk) > 0:
-                print("\n=== Population at Risk Analysis ===")
-                print(f"Total population centers at risk: {len(population_at_risk)}")
-
-                if 'pop' in population_at_risk.columns:
-                    total_affected = population_at_risk['pop'].sum()
-                    print(f"Total population at risk: {total_affected:,}")
-
-                    print("\nTop 5 most affected population centers:")
-                    print(population_at_risk.nlargest(5, 'pop')[['pop', 'gid']])
-
-                if 'volcano_id' in population_at_risk.columns:
-                    print("\nPopulation at risk by volcano:")
-                    risk_by_volcano = population_at_risk.groupby('volcano_id').size().reset_index(name='centers_affected')
-                    print(risk_by_volcano)
-
-                return result_erupting_unrest, result_alert, result_db, historical_db, historical_db_GVP, population_at_risk, total_affected, risk_by_volcano, earthquakes_db
-
-        def request_osm(spatial_boundingbox, list_tags):
-            try:
-                results_quering = ox.features_from_bbox(
-                    bbox=spatial_boundingbox,
-                    tags=list_tags
-                )
-                if results_quering is None:
-                    print("Warning: No data returned (None)")
-                else:
-                    return results_quering
-
-            except Exception as e:
-                print(f"Warning: Could not load data from OSM- {str(e)}")
-
-        def linestring_to_coords(geom):
-            if geom.geom_type == "LineString":
-                return {"path": [[x, y] for x, y in geom.coords]}
-            elif geom.geom_type == "MultiLineString":
-                return {"path": [[[x, y] for x, y in line.coords] for line in geom.geoms]}
+            metrics['rows_out'] = len(earthquakes_db)
+        print(f"Successfully loaded {len(earthquakes_db)} records")
+
+        if population_at_risk is None:
+            # No centroid in the buffers: empty partitions, zero affected and an empty risk table
+            population_at_risk = gpd.GeoDataFrame(
+                {'gid': pd.Series(dtype='Int32'), 'pop': pd.Series(dtype='int64'), 'volcano_id': pd.Series(dtype='category')},
+                geometry=gpd.GeoSeries([], crs="EPSG:4326"), crs="EPSG:4326").rename_geometry('geom')
+        total_affected, risk_by_volcano = summarize_population_at_risk(population_at_risk)
+
+        return result_erupting_unrest, result_alert, result_db, historical_db, historical_db_GVP, population_at_risk, total_affected, risk_by_volcano, earthquakes_db, None
+
+    def query_local_files(data_dir):
+        """
+        PostGIS-free equivalent of query_database reading GeoParquet snapshots of the tables.
+
+        Each table is expected as <table_name>.parquet in data_dir (population_centroid as
+        GeoParquet with a 'geom' point column). Buffers are computed with vectorized shapely
+        operations in EPSG:3857 like the SQL version, and the population intersect is an
+        STRtree query instead of ST_Intersects.
+
+        Args:
+            data_dir (str): Directory holding the GeoParquet files
+
+        Returns:
+            tuple: same outputs as query_database
+        """
+        def read_table(table_name):
+            with instrument("query_local_files.read_table", table=table_name) as metrics:
+                table = pd.read_parquet(os.path.join(data_dir, f"{table_name}.parquet"))
+                metrics['rows_out'] = len(table)
+            return table
+
+        print("Loading erupting volcanoes with buffers...")
+        volcano_frames = []
+        for source in ['erupting', 'unrest']:
+            volcanoes = read_table(f"filtered_{source}_volcanoes_latest")
+            volcanoes['source'] = source
+            volcanoes['buffer_km'] = 30
+            volcano_frames.append(volcanoes)
+        volcanoes = pd.concat(volcano_frames, ignore_index=True)
+        centers = gpd.GeoSeries(
+            shapely.points(volcanoes['x_coordinate'].to_numpy(float), volcanoes['y_coordinate'].to_numpy(float)),
+            crs="EPSG:4326"
+        )
+        buffers = gpd.GeoSeries(
+            shapely.buffer(centers.to_crs("EPSG:3857").values, 30000, quad_segs=8),
+            crs="EPSG:3857"
+        ).to_crs("EPSG:4326")
+        result_erupting_unrest = gpd.GeoDataFrame(volcanoes, geometry=buffers.values, crs="EPSG:4326")
+        result_erupting_unrest = result_erupting_unrest.rename_geometry('geom_buffer')
+        print(f"Successfully loaded {len(result_erupting_unrest)} erupting volcanoes with buffers")
+
+        print("Finding population centroids within volcano buffers...")
+        population_centroid = gpd.read_parquet(os.path.join(data_dir, "population_centroid.parquet"))
+        population_centroid = population_centroid.set_geometry('geom')
+        population_tree = shapely.STRtree(population_centroid.geometry.values)
+        # UNION in the SQL version drops duplicated (volcano, source) rows
+        volcano_buffers = result_erupting_unrest.drop_duplicates(subset=['id', 'source'])
+        volcano_idx, pop_idx = population_tree.query(volcano_buffers.geometry.values, predicate='intersects')
+        population_at_risk = population_centroid.iloc[pop_idx].reset_index(drop=True)
+        population_at_risk['volcano_id'] = volcano_buffers['id'].to_numpy()[volcano_idx]
+        population_at_risk['source'] = volcano_buffers['source'].to_numpy()[volcano_idx]
+        population_at_risk['buffer_km'] = volcano_buffers['buffer_km'].to_numpy()[volcano_idx]
+        print(f"Found {len(population_at_risk)} population centroids at risk")
+
+        print("Loading population centroids within 100 km for distance profiles...")
+        active_volcanoes = volcanoes.drop_duplicates(subset=['Volcano_Number', 'x_coordinate', 'y_coordinate'])
+        lon = active_volcanoes['x_coordinate'].to_numpy(float)
+        lat = active_volcanoes['y_coordinate'].to_numpy(float)
+        # Same prefilter as the SQL ST_Expand: 1 degree of latitude, widened in longitude
+        dx = 1.0 / np.maximum(np.cos(np.radians(lat)), 0.01)
+        envelopes = shapely.box(lon - dx, lat - 1.0, lon + dx, lat + 1.0)
+        volcano_idx, pop_idx = population_tree.query(envelopes, predicate='intersects')
+        pop_points = population_centroid.geometry.values[pop_idx]
+        distance_km = haversine_km(lon[volcano_idx], lat[volcano_idx], shapely.get_x(pop_points), shapely.get_y(pop_points))
+        within = distance_km <= 100
+        population_profiles = pd.DataFrame({
+            'volcano_number': active_volcanoes['Volcano_Number'].to_numpy()[volcano_idx[within]],
+            'pop': population_centroid['pop'].to_numpy()[pop_idx[within]],
+            'distance_km': distance_km[within],
+        })
+        print(f"Successfully loaded {len(population_profiles)} population centroids within 100 km")
+
+        print("Loading alerts volcanoes...")
+        result_alert = read_table("alerts_volcanoes_latest")
+        print(f"Successfully loaded {len(result_alert)} unrest volcanoes")
+
+        print("Loading main volcanoes database...")
+        result_db = read_table("volcanoes_db")
+        print(f"Successfully loaded {len(result_db)} volcanoes from main database")
+
+        print("Loading historical data (MOESM1)...")
+        historical_db = read_table("MOESM1")
+        print(f"Successfully loaded {len(historical_db)} records from MOESM1")
+
+        print("Loading historical eruptions (GVP)...")
+        historical_db_GVP = read_table("historical_eruptions_db")
+        print(f"Successfully loaded {len(historical_db_GVP)} records from historical_eruptions_db")
+
+        print("Loading earthquakes data ...")
+        earthquakes_db = read_table("earthquakes_db_latest")
+        print(f"Successfully loaded {len(earthquakes_db)} records")
+
+        total_affected, risk_by_volcano = summarize_population_at_risk(population_at_risk)
+
+        return result_erupting_unrest, result_alert, result_db, historical_db, historical_db_GVP, population_at_risk, total_affected, risk_by_volcano, earthquakes_db, population_profiles
+
+    def haversine_km(lon1, lat1, lon2, lat2):
+        lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+    def unit_vectors(lon, lat):
+        """Points on the unit sphere, a chord between two of them grows with their great-circle distance."""
+        lon, lat = np.radians(lon), np.radians(lat)
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    def seismicity_near_volcanoes(volcanoes_core, earthquakes, radii_km=(10, 30, 100), recent_days=1):
+        """
+        Relates the archived earthquakes to the Holocene volcanoes within each radius.
+
+        The volcano / earthquake pairs closer than the largest radius come out of one
+        batch query between two KD-trees of unit-sphere coordinates (a great-circle radius
+        is a chord radius on the sphere), their exact distances from haversine_km.
+
+        The recent window is the last recent_days archived days, the baseline the archived
+        days before it; rates are events per day.
+
+        Args:
+            volcanoes_core (pd.DataFrame): Holocene catalog core (Volcano_Number, Volcano_Name, Longitude, Latitude)
+            earthquakes (pd.DataFrame): archived events (x_coordinate, y_coordinate, magnitude, depth, date)
+            radii_km (tuple): radii around every volcano
+            recent_days (int): days of the recent window
+
+        Returns:
+            pd.DataFrame: one row per volcano with earthquakes within radius_km, columns
+                ['Volcano_Number', 'Volcano_Name', 'radius_km', 'n_recent', 'n_baseline', 'recent_rate',
+                 'baseline_rate', 'rate_change', 'max_magnitude', 'depth_p10', 'depth_median', 'depth_p90']
+        """
+        columns = ['Volcano_Number', 'Volcano_Name', 'radius_km', 'n_recent', 'n_baseline', 'recent_rate',
+                   'baseline_rate', 'rate_change', 'max_magnitude', 'depth_p10', 'depth_median', 'depth_p90']
+        days = sorted(earthquakes['date'].unique())
+        if not days or volcanoes_core.empty:
+            return pd.DataFrame(columns=columns)
+        recent_dates, baseline_dates = days[-recent_days:], days[:-recent_days]
+
+        volcano_lon = volcanoes_core['Longitude'].to_numpy(float)
+        volcano_lat = volcanoes_core['Latitude'].to_numpy(float)
+        earthquake_lon = earthquakes['x_coordinate'].to_numpy(float)
+        earthquake_lat = earthquakes['y_coordinate'].to_numpy(float)
+        max_chord = 2 * np.sin(max(radii_km) / (2 * 6371.0088))
+        pairs = cKDTree(unit_vectors(volcano_lon, volcano_lat)).sparse_distance_matrix(
+            cKDTree(unit_vectors(earthquake_lon, earthquake_lat)), max_chord, output_type='ndarray')
+        volcano_idx, earthquake_idx = pairs['i'], pairs['j']
+
+        pairs = pd.DataFrame({
+            'Volcano_Number': volcanoes_core['Volcano_Number'].to_numpy()[volcano_idx],
+            'distance_km': haversine_km(volcano_lon[volcano_idx], volcano_lat[volcano_idx],
+                                        earthquake_lon[earthquake_idx], earthquake_lat[earthquake_idx]),
+            'magnitude': earthquakes['magnitude'].to_numpy(float)[earthquake_idx],
+            'depth': earthquakes['depth'].to_numpy(float)[earthquake_idx],
+            'recent': earthquakes['date'].isin(recent_dates).to_numpy()[earthquake_idx],
+        })
+
+        seismicity = []
+        for radius_km in radii_km:
+            within = pairs[pairs['distance_km'] <= radius_km]
+            if within.empty:
+                continue
+            counts = within.groupby('Volcano_Number')['recent'].agg(n_recent='sum', n_events='size')
+            recent = within[within['recent']].groupby('Volcano_Number').agg(
+                max_magnitude=('magnitude', 'max'),
+                depth_p10=('depth', lambda depth: depth.quantile(0.1)),
+                depth_median=('depth', 'median'),
+                depth_p90=('depth', lambda depth: depth.quantile(0.9)))
+            seismicity.append(counts.join(recent).reset_index().assign(radius_km=radius_km))
+        if not seismicity:
+            return pd.DataFrame(columns=columns)
+
+        seismicity = pd.concat(seismicity, ignore_index=True)
+        seismicity['n_recent'] = seismicity['n_recent'].astype('int64')
+        seismicity['n_baseline'] = seismicity.pop('n_events') - seismicity['n_recent']
+        seismicity['recent_rate'] = seismicity['n_recent'] / len(recent_dates)
+        seismicity['baseline_rate'] = seismicity['n_baseline'] / len(baseline_dates) if baseline_dates else np.nan
+        # No change can be measured against an empty baseline
+        seismicity['rate_change'] = seismicity['recent_rate'] / seismicity['baseline_rate'].where(seismicity['baseline_rate'] > 0)
+        seismicity = seismicity.merge(volcanoes_core[['Volcano_Number', 'Volcano_Name']], on='Volcano_Number', how='left')
+        return stable_rows(seismicity, ['radius_km', 'Volcano_Number'])[columns]
+
+    def detect_earthquake_swarms(earthquakes, volcanoes_core, eps_km=10, eps_hours=24, min_events=5):
+        """
+        Finds earthquake swarms with DBSCAN in (lon, lat, time) space.
+
+        Events are points of a 4-D space: their unit-sphere position scaled to km (chord
+        ~ great-circle distance at these scales) and their time scaled so that eps_hours
+        weighs like eps_km. Two events are neighbours within eps_km in that space, the
+        neighbour pairs come from a single cKDTree query and the clusters are the connected
+        components of the core events (at least min_events neighbours, itself included),
+        border events joining the cluster of one of their core neighbours.
+
+        Args:
+            earthquakes (pd.DataFrame): archived events (x_coordinate, y_coordinate, magnitude, depth, time, date)
+            volcanoes_core (pd.DataFrame): Holocene catalog core, for the nearest volcano
+            eps_km (float): neighbourhood radius
+            eps_hours (float): time span equivalent to eps_km
+            min_events (int): events in the neighbourhood of a core event
+
+        Returns:
+            gpd.GeoDataFrame: one row per swarm with its convex hull (EPSG:4326) and the columns
+                ['swarm_id', 'n_events', 'start', 'end', 'duration_hours', 'magnitude_min', 'magnitude_max',
+                 'depth_median', 'Longitude', 'Latitude', 'Volcano_Number', 'Volcano_Name', 'volcano_distance_km']
+        """
+        columns = ['swarm_id', 'n_events', 'start', 'end', 'duration_hours', 'magnitude_min', 'magnitude_max',
+                   'depth_median', 'Longitude', 'Latitude', 'Volcano_Number', 'Volcano_Name', 'volcano_distance_km']
+        no_swarm = gpd.GeoDataFrame(columns=columns + ['geometry'], geometry='geometry', crs="EPSG:4326")
+        if len(earthquakes) < min_events:
+            return no_swarm
+
+        # Events archived without their time (before the id / time were extracted) count at noon of their day
+        event_time = pd.to_datetime(earthquakes['time'], utc=True).fillna(
+            pd.to_datetime(earthquakes['date'], utc=True) + pd.Timedelta(hours=12))
+        hours = (event_time - event_time.min()).dt.total_seconds().to_numpy() / 3600
+        lon = earthquakes['x_coordinate'].to_numpy(float)
+        lat = earthquakes['y_coordinate'].to_numpy(float)
+        points = np.column_stack([unit_vectors(lon, lat) * 6371.0088, hours * eps_km / eps_hours])
+
+        pairs = cKDTree(points).query_pairs(eps_km, output_type='ndarray')
+        n_events = len(points)
+        neighbours = 1 + np.bincount(pairs.ravel(), minlength=n_events)
+        core = neighbours >= min_events
+        core_pairs = pairs[core[pairs[:, 0]] & core[pairs[:, 1]]]
+        adjacency = csr_array((np.ones(len(core_pairs)), (core_pairs[:, 0], core_pairs[:, 1])), shape=(n_events, n_events))
+        _, component = connected_components(adjacency, directed=False)
+
+        labels = np.full(n_events, -1)
+        labels[core] = component[core]
+        # Border events: not core, within eps of a core event
+        border_pairs = np.concatenate([pairs, pairs[:, ::-1]])
+        border_pairs = border_pairs[~core[border_pairs[:, 0]] & core[border_pairs[:, 1]]]
+        labels[border_pairs[:, 0]] = component[border_pairs[:, 1]]
+        if (labels < 0).all():
+            return no_swarm
+
+        xyz = unit_vectors(lon, lat)
+        events = pd.DataFrame({'label': labels, 'lon': lon, 'lat': lat, 'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2],
+                               'time': event_time, 'magnitude': earthquakes['magnitude'].to_numpy(float),
+                               'depth': earthquakes['depth'].to_numpy(float)})
+        events = events[events['label'] >= 0]
+        swarms = events.groupby('label').agg(
+            n_events=('time', 'size'), start=('time', 'min'), end=('time', 'max'),
+            magnitude_min=('magnitude', 'min'), magnitude_max=('magnitude', 'max'),
+            depth_median=('depth', 'median'), x=('x', 'mean'), y=('y', 'mean'), z=('z', 'mean'))
+        # Centroid from the mean unit vector: averaging the longitudes breaks on the antimeridian (Fiji, Aleutians)
+        swarms['Longitude'] = np.degrees(np.arctan2(swarms['y'], swarms['x']))
+        swarms['Latitude'] = np.degrees(np.arctan2(swarms['z'], np.hypot(swarms['x'], swarms['y'])))
+        swarms = swarms.drop(columns=['x', 'y', 'z'])
+        swarms['duration_hours'] = (swarms['end'] - swarms['start']).dt.total_seconds() / 3600
+
+        def swarm_hull(swarm):
+            # Longitudes unwrapped around the centroid, the hull of a swarm on the antimeridian may pass 180
+            center = swarms.loc[swarm.name, 'Longitude']
+            swarm_lon = swarm['lon'] - 360 * np.round((swarm['lon'] - center) / 360)
+            # Widened by ~1 km so swarms on a line or a single spot stay visible
+            return shapely.MultiPoint(np.column_stack([swarm_lon, swarm['lat']])).convex_hull.buffer(0.01)
+
+        hulls = events.groupby('label').apply(swarm_hull, include_groups=False)
+
+        distance, nearest = cKDTree(unit_vectors(volcanoes_core['Longitude'].to_numpy(float),
+                                                 volcanoes_core['Latitude'].to_numpy(float))).query(
+            unit_vectors(swarms['Longitude'].to_numpy(), swarms['Latitude'].to_numpy()), k=1)
+        swarms['Volcano_Number'] = volcanoes_core['Volcano_Number'].to_numpy()[nearest]
+        swarms['Volcano_Name'] = volcanoes_core['Volcano_Name'].to_numpy()[nearest]
+        swarms['volcano_distance_km'] = 2 * 6371.0088 * np.arcsin(np.minimum(distance / 2, 1))
+
+        swarms = stable_rows(swarms.assign(geometry=hulls).reset_index(drop=True), ['start', 'Longitude'])
+        swarms['swarm_id'] = np.arange(len(swarms)) + 1
+        return gpd.GeoDataFrame(swarms[columns + ['geometry']], geometry='geometry', crs="EPSG:4326")
+
+    def summarize_population_at_risk(population_at_risk):
+        total_affected = None
+        risk_by_volcano = None
+        print("\n=== Population at Risk Analysis ===")
+        print(f"Total population centers at risk: {len(population_at_risk)}")
+
+        if 'pop' in population_at_risk.columns:
+            total_affected = population_at_risk['pop'].sum()
+            print(f"Total population at risk: {total_affected:,}")
+
+            print("\nTop 5 most affected population centers:")
+            print(population_at_risk.nlargest(5, 'pop')[['pop', 'gid']])
+
+        if 'volcano_id' in population_at_risk.columns:
+            print("\nPopulation at risk by volcano:")
+            risk_by_volcano = population_at_risk.groupby('volcano_id', observed=True).size().reset_index(name='centers_affected')
+            print(risk_by_volcano)
+
+        return total_affected, risk_by_volcano
+
+    def request_osm(spatial_boundingbox, list_tags):
+        try:
+            results_quering = ox.features_from_bbox(
+                bbox=spatial_boundingbox,
+                tags=list_tags
+            )
+            if results_quering is None:
+                print("Warning: No data returned (None)")
             else:
-                return None
-
-        def convert_pop_dataframe(spdf):
-            try:
-                if 'geom' in spdf.columns:
-                    spdf['geom'] = spdf['geom'].apply(
-                        lambda x: wkb.loads(x, hex=True) if x else None)
-                    pop_df = gpd.GeoDataFrame(spdf, geometry='geom', crs="EPSG:4326")  # Adjust CRS as needed
-                    return pop_df
-                else:
-                    print("Warning: No data returned (None)")
-
-            except Exception as e:
-                print(f"Warning: Could not load pop data - {str(e)}")
-
-        def spatial_analysis(volcano, pop_db):
-
-            geodataframe = gpd.GeoDataFrame(volcano, geometry='geom_buffer', crs="EPSG:4326")
-
-            bbox = geodataframe.total_bounds  # [minx, miny, maxx, maxy]
-
-            tags_emergency_service = {
-                'amenity': [
-                    'fire_station',
-                    'police',
-                    'hospital',
-                    'ambulance_station',
-                ]
-            }
-
-            tags_essential_service = {
-                'amenity': [
-                    'supermarket', 'fuel', 'chemist',
-                    'shelter',
-                    'Pharmacy', 'dentist', 'doctors', 'embassy', 'townhall', 'courthouse', 'veterinary'
-                ]
-            }
-
-            tags_amenity = {
-                'amenity': [
-                    'kindergarten', 'school', 'library', 'college', 'university', 'prison', 'social_facility',
-                    'nursing_home',
-                ]
+                return results_quering
+
+        except Exception as e:
+            print(f"Warning: Could not load data from OSM- {str(e)}")
+
+    def linestring_to_coords(geom):
+        if geom.geom_type == "LineString":
+            return {"path": [[x, y] for x, y in geom.coords]}
+        elif geom.geom_type == "MultiLineString":
+            return {"path": [[[x, y] for x, y in line.coords] for line in geom.geoms]}
+        else:
+            return None
+
+    def convert_pop_dataframe(spdf):
+        try:
+            if 'geom' in spdf.columns:
+                spdf['geom'] = spdf['geom'].apply(
+                    lambda x: wkb.loads(x, hex=True) if x else None)
+                pop_df = gpd.GeoDataFrame(spdf, geometry='geom', crs="EPSG:4326")  # Adjust CRS as needed
+                return pop_df
+            else:
+                print("Warning: No data returned (None)")
+
+        except Exception as e:
+            print(f"Warning: Could not load pop data - {str(e)}")
+
+    def build_population_profiles(population_by_distance):
+        """
+        Sorts population centroids by distance to their volcano and adds the running total.
+
+        The page answers "population within R km" with a binary search on
+        distance_km and reads cumulative_pop at the returned position.
+
+        Args:
+            population_by_distance (pd.DataFrame): volcano_number, pop and distance_km columns
+
+        Returns:
+            pd.DataFrame with columns ['volcano_number', 'distance_km', 'cumulative_pop']
+        """
+        profiles = population_by_distance[['volcano_number', 'distance_km', 'pop']].copy()
+        profiles['pop'] = pd.to_numeric(profiles['pop'], errors='coerce').fillna(0)
+        profiles = profiles.sort_values(['volcano_number', 'distance_km'], kind='mergesort')
+        profiles['cumulative_pop'] = profiles.groupby('volcano_number')['pop'].cumsum().round().astype('int64')
+        profiles['distance_km'] = profiles['distance_km'].round(3)
+        print(f"Built population profiles for {profiles['volcano_number'].nunique()} volcanoes ({len(profiles)} cells)")
+        return profiles[['volcano_number', 'distance_km', 'cumulative_pop']]
+
+    def partition_population(pop_db):
+        """
+        Splits the population at risk by volcano once, before the per-volcano loop.
+
+        Each partition keeps its centroids projected to the volcano's UTM zone with a
+        KD-tree over them, so nearest lookups from road nodes only touch the cells of
+        that volcano.
+
+        Args:
+            pop_db (gpd.GeoDataFrame): population_at_risk with a 'volcano_id' column
+
+        Returns:
+            dict: volcano_id -> {'crs': projected CRS, 'tree': cKDTree, 'pop': population per cell, 'gid': cell ids}
+        """
+        partitions = {}
+        for volcano_id, pop_volcano in pop_db.groupby('volcano_id', observed=True):
+            pop_volcano = pop_volcano.to_crs(pop_volcano.estimate_utm_crs())
+            partitions[volcano_id] = {
+                'crs': pop_volcano.crs,
+                'tree': cKDTree(np.column_stack([pop_volcano.geometry.x, pop_volcano.geometry.y])),
+                'pop': pd.to_numeric(pop_volcano['pop'], errors='coerce').to_numpy(),
+                'gid': pop_volcano['gid'].to_numpy(),
             }
-
-            tags_roads = {
-                'highway': [
-                    'motorway', 'motorway link', 'trunk', 'trunk link', 'primary', 'primary link', 'secondary',
-                    'secondary link', 'tertiary', 'tertiary link',
-                    'unclassified', 'residential', 'living street', 'service', 'road', 'unknown'
-                ]
+        print(f"Partitioned population at risk for {len(partitions)} volcanoes")
+        return partitions
+
+    def select_assembly_points(nodes, alpha=0.5, beta=0.5, top_k=20, min_separation_m=2000):
+        """
+        Picks the K best road nodes as assembly points, at least min_separation_m apart.
+
+        Nodes are ranked by alpha * betweenness_norm + beta * pop_norm and taken greedily;
+        every pick suppresses the candidates inside its separation radius, found with a
+        KD-tree ball query on projected coordinates.
+
+        Args:
+            nodes (gpd.GeoDataFrame): scored nodes returned by spatial_analysis
+            alpha (float): weight of the road connectivity (betweenness) term
+            beta (float): weight of the population term
+            top_k (int): maximum number of points per volcano
+            min_separation_m (float): minimum distance between two selected points
+
+        Returns:
+            pd.DataFrame with columns ['rank', 'score', 'pop', 'betweenness_centrality', 'lng', 'lat']
+        """
+        candidates = nodes.copy()
+        candidates['score'] = (
+                alpha * candidates['betweenness_norm'].fillna(0) +
+                beta * candidates['pop_norm'].fillna(0)
+        )
+        candidates = candidates.sort_values('score', ascending=False, kind='mergesort')
+        projected = candidates.to_crs(candidates.estimate_utm_crs())
+        tree = cKDTree(np.column_stack([projected.geometry.x, projected.geometry.y]))
+
+        suppressed = np.zeros(len(candidates), dtype=bool)
+        selected = []
+        for position in range(len(candidates)):
+            if suppressed[position]:
+                continue
+            selected.append(position)
+            if len(selected) == top_k:
+                break
+            suppressed[tree.query_ball_point(tree.data[position], r=min_separation_m)] = True
+
+        assembly_points = candidates.iloc[selected]
+        return pd.DataFrame({
+            'rank': np.arange(1, len(selected) + 1),
+            'score': assembly_points['score'].round(4).to_numpy(),
+            'pop': assembly_points['pop'].to_numpy(),
+            'betweenness_centrality': assembly_points['betweenness_centrality'].to_numpy(),
+            'lng': assembly_points.geometry.x.to_numpy(),
+            'lat': assembly_points.geometry.y.to_numpy(),
+        })
+
+    def graph_to_csr(graph_proj):
+        """
+        Converts a projected OSMnx graph into compact arrays, once per volcano.
+
+        Parallel edges keep their shortest length. Node i of the CSR matrix is
+        node_ids[i], located at (x[i], y[i]) in the graph CRS.
+
+        Args:
+            graph_proj (nx.MultiDiGraph): projected drive network
+
+        Returns:
+            dict: {'node_ids', 'x', 'y', 'adjacency' (scipy.sparse.csr_array of lengths in m),
+                   'travel_time' (same sparsity, seconds), 'crs'}
+        """
+        node_ids = np.fromiter(graph_proj.nodes, dtype=np.int64, count=graph_proj.number_of_nodes())
+        node_data = graph_proj.nodes
+        x = np.array([node_data[node]['x'] for node in node_ids], dtype=np.float64)
+        y = np.array([node_data[node]['y'] for node in node_ids], dtype=np.float64)
+
+        edges = pd.DataFrame(
+            [(u, v, data.get('length'), data.get('travel_time')) for u, v, data in graph_proj.edges(data=True)],
+            columns=['u', 'v', 'length', 'travel_time']
+        )
+        edges = edges.groupby(['u', 'v'], as_index=False)[['length', 'travel_time']].min()
+        node_index = pd.Index(node_ids)
+        edge_index = (node_index.get_indexer(edges['u']), node_index.get_indexer(edges['v']))
+
+        def edge_matrix(weights):
+            # csgraph drops explicit zeros, keep zero-weight edges as tiny weights
+            return csr_array((weights.fillna(0).clip(lower=1e-3).to_numpy(dtype=np.float64), edge_index),
+                             shape=(len(node_ids), len(node_ids)))
+
+        return {'node_ids': node_ids, 'x': x, 'y': y,
+                'adjacency': edge_matrix(edges['length']),
+                'travel_time': edge_matrix(edges['travel_time']),
+                'crs': pyproj.CRS.from_user_input(graph_proj.graph['crs']).to_wkt()}
+
+    def csr_graph_nbytes(csr_graph):
+        adjacency = csr_graph['adjacency']
+        return (adjacency.data.nbytes + adjacency.indices.nbytes + adjacency.indptr.nbytes +
+                csr_graph['travel_time'].data.nbytes +
+                csr_graph['node_ids'].nbytes + csr_graph['x'].nbytes + csr_graph['y'].nbytes)
+
+    def save_csr_graph(csr_graph, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        adjacency = csr_graph['adjacency']
+        np.savez_compressed(path, node_ids=csr_graph['node_ids'], x=csr_graph['x'], y=csr_graph['y'],
+                            data=adjacency.data, indices=adjacency.indices, indptr=adjacency.indptr,
+                            travel_time=csr_graph['travel_time'].data, crs=np.array(csr_graph['crs']))
+
+    def load_csr_graph(path):
+        with np.load(path) as stored:
+            n = len(stored['node_ids'])
+            return {
+                'node_ids': stored['node_ids'],
+                'x': stored['x'],
+                'y': stored['y'],
+                'adjacency': csr_array((stored['data'], stored['indices'], stored['indptr']), shape=(n, n)),
+                'travel_time': csr_array((stored['travel_time'], stored['indices'], stored['indptr']), shape=(n, n)),
+                'crs': str(stored['crs']),
             }
 
-            warnings.filterwarnings("ignore", message="Geometry is in a geographic CRS.*")
-
-            print('+++ emergency_service')
+    def csr_betweenness_centrality(csr_graph, batch_size=128):
+        """
+        Length-weighted betweenness centrality computed on the CSR arrays.
+
+        Shortest-path trees come from scipy's Dijkstra for a batch of sources at a time;
+        each node's dependency is the size of its subtree, accumulated level by level with
+        numpy. Ties between equally long paths are resolved arbitrarily, which is exact for
+        real-valued road lengths. Normalized like nx.betweenness_centrality on a directed graph.
+
+        Args:
+            csr_graph (dict): graph from graph_to_csr
+            batch_size (int): sources per Dijkstra call, bounds memory to batch_size x nodes
+
+        Returns:
+            np.ndarray: betweenness per node, in CSR order
+        """
+        adjacency = csr_graph['adjacency']
+        n = adjacency.shape[0]
+        betweenness = np.zeros(n)
+        if n <= 2:
+            return betweenness
+        for start in range(0, n, batch_size):
+            sources = np.arange(start, min(start + batch_size, n))
+            batch = len(sources)
+            _, predecessors = dijkstra(adjacency, directed=True, indices=sources, return_predecessors=True)
+            reached = predecessors >= 0
+            reached[np.arange(batch), sources] = True
+            # Flat parent pointers, roots (sources and unreachable nodes) point to themselves
+            flat = np.arange(batch * n).reshape(batch, n)
+            parent = np.where(predecessors >= 0, predecessors + (np.arange(batch) * n)[:, None], flat).ravel()
+            # Hop depth by pointer jumping, log2(depth) passes instead of one per level
+            depth = (parent != flat.ravel()).astype(np.int64)
+            ancestor = parent.copy()
+            while True:
+                next_ancestor = ancestor[ancestor]
+                if np.array_equal(next_ancestor, ancestor):
+                    break
+                depth += depth[ancestor]
+                ancestor = next_ancestor
+            # Subtree sizes, accumulated from the deepest level up to the sources
+            subtree = reached.ravel().astype(np.float64)
+            order = np.argsort(-depth, kind='stable')
+            for level in np.split(order, np.flatnonzero(np.diff(depth[order])) + 1):
+                if depth[level[0]] == 0:
+                    break
+                np.add.at(subtree, parent[level], subtree[level])
+            dependency = (subtree - 1).reshape(batch, n)
+            dependency[~reached] = 0
+            dependency[np.arange(batch), sources] = 0
+            betweenness += dependency.sum(axis=0)
+        return betweenness / ((n - 1) * (n - 2))
+
+    def evacuation_routing(csr_graph, nodes_proj, volcano_buffer, emergency_service, pop_partition):
+        """
+        Network distance from every population cell to safety, from one multi-source Dijkstra.
+
+        Sources are the road nodes outside the hazard buffer plus the nodes closest to
+        hospitals. The sweep runs on the transposed adjacency so that distances follow the
+        direction of travel from the cell to the nearest exit. Each cell is snapped to its
+        closest road node and the snapping distance is added to the network distance.
+
+        Args:
+            csr_graph (dict): projected drive network from graph_to_csr
+            nodes_proj (gpd.GeoDataFrame): graph nodes in CSR order, in the graph CRS
+            volcano_buffer (gpd.GeoDataFrame): hazard buffer of the volcano
+            emergency_service (gpd.GeoDataFrame): OSM emergency services, may be None
+            pop_partition (dict): population partition from partition_population
+
+        Returns:
+            pd.DataFrame with columns ['gid', 'pop', 'evacuation_distance_m'], NaN when no exit is reachable
+        """
+        nodes = nodes_proj.to_crs(pop_partition['crs'])
+        node_tree = cKDTree(np.column_stack([nodes.geometry.x, nodes.geometry.y]))
+
+        hazard_zone = volcano_buffer.to_crs(pop_partition['crs']).geometry.union_all()
+        sources = set(np.flatnonzero(~nodes.geometry.within(hazard_zone).to_numpy()))
+        if isinstance(emergency_service, gpd.GeoDataFrame) and 'amenity' in emergency_service.columns:
+            hospitals = emergency_service[emergency_service['amenity'] == 'hospital'].to_crs(pop_partition['crs'])
+            if len(hospitals) > 0:
+                _, hospital_nodes = node_tree.query(np.column_stack([hospitals.geometry.x, hospitals.geometry.y]))
+                sources.update(hospital_nodes)
+        print(f'+++      {len(sources)} safe nodes ({len(nodes)} nodes)')
+
+        if sources:
+            distance_to_safety = dijkstra(csr_graph['adjacency'].T, directed=True,
+                                          indices=sorted(sources), min_only=True)
+        else:
+            distance_to_safety = np.full(len(nodes), np.inf)
+        distance_to_safety[np.isinf(distance_to_safety)] = np.nan
+
+        snap_distances, nearest_nodes = node_tree.query(pop_partition['tree'].data)
+        return pd.DataFrame({
+            'gid': pop_partition['gid'],
+            'pop': pop_partition['pop'],
+            'evacuation_distance_m': (snap_distances + distance_to_safety[nearest_nodes]).round(1),
+        })
+
+    def hospital_isochrones(csr_graph, nodes_proj, emergency_service, pop_partition, minutes=(5, 10, 20)):
+        """
+        Drive-time isochrones from all hospitals and ambulance stations, in one sweep.
+
+        A single multi-source Dijkstra over the travel_time matrix gives every road node
+        its time from the closest facility. Each band is drawn as the union of 500 m
+        buffers around the nodes it reaches, and population cells count as covered when
+        their nearest road node is.
+
+        Args:
+            csr_graph (dict): projected drive network from graph_to_csr
+            nodes_proj (gpd.GeoDataFrame): graph nodes in CSR order, in the graph CRS
+            emergency_service (gpd.GeoDataFrame): OSM emergency services, may be None
+            pop_partition (dict): population partition from partition_population
+            minutes (tuple): upper bound of each band, in minutes
+
+        Returns:
+            tuple: (gpd.GeoDataFrame of band polygons in EPSG:4326, pd.DataFrame of covered population per band),
+                   or None when there is no facility
+        """
+        if not isinstance(emergency_service, gpd.GeoDataFrame) or 'amenity' not in emergency_service.columns:
+            return None
+        facilities = emergency_service[emergency_service['amenity'].isin(['hospital', 'ambulance_station'])]
+        if len(facilities) == 0:
+            return None
+
+        node_xy = np.column_stack([csr_graph['x'], csr_graph['y']])
+        facilities = facilities.to_crs(nodes_proj.crs)
+        _, facility_nodes = cKDTree(node_xy).query(np.column_stack([facilities.geometry.x, facilities.geometry.y]))
+        travel_time = dijkstra(csr_graph['travel_time'], directed=True, indices=np.unique(facility_nodes),
+                               min_only=True)
+
+        nodes_pop_crs = nodes_proj.to_crs(pop_partition['crs'])
+        _, cell_nodes = cKDTree(np.column_stack([nodes_pop_crs.geometry.x, nodes_pop_crs.geometry.y])
+                                ).query(pop_partition['tree'].data)
+        cell_time = travel_time[cell_nodes]
+        total_pop = np.nansum(pop_partition['pop'])
+
+        bands = []
+        coverage = []
+        for band in sorted(minutes):
+            reached = travel_time <= band * 60
+            if reached.any():
+                area = shapely.union_all(shapely.buffer(shapely.points(node_xy[reached]), 500, quad_segs=4))
+                bands.append({'minutes': band, 'geometry': shapely.simplify(area, 100)})
+            covered_pop = np.nansum(pop_partition['pop'][cell_time <= band * 60])
+            coverage.append({
+                'minutes': band,
+                'pop_covered': int(covered_pop),
+                'pop_share': round(covered_pop / total_pop, 4) if total_pop > 0 else np.nan,
+            })
+        print(f'+++      isochrones from {len(facilities)} facilities')
+
+        if bands:
+            isochrones = gpd.GeoDataFrame(bands, geometry='geometry', crs=nodes_proj.crs).to_crs("EPSG:4326")
+            isochrones = isochrones.explode(index_parts=False).reset_index(drop=True)
+        else:
+            isochrones = gpd.GeoDataFrame({'minutes': []}, geometry=[], crs="EPSG:4326")
+        return isochrones, pd.DataFrame(coverage)
+
+    def summarize_evacuation(evacuation):
+        distances = evacuation['evacuation_distance_m']
+        reachable = evacuation[distances.notna()]
+        return {
+            'cells': len(evacuation),
+            'unreachable_pop': evacuation.loc[distances.isna(), 'pop'].sum(),
+            'p50_m': distances.quantile(0.5),
+            'p90_m': distances.quantile(0.9),
+            'p95_m': distances.quantile(0.95),
+            'max_m': distances.max(),
+            'pop_weighted_mean_m': (
+                (reachable['evacuation_distance_m'] * reachable['pop']).sum() / reachable['pop'].sum()
+                if reachable['pop'].sum() > 0 else np.nan
+            ),
+        }
+
+    def volcano_fingerprint(volcan, pop_partition, settings):
+        """
+        Hash of everything the per-volcano spatial analysis depends on.
+
+        Coordinates, buffer size and status come from the volcano row, the population
+        partition is summarized by its cell count and total, and settings carries the
+        OSM cache version and analysis parameters.
+
+        Args:
+            volcan (pd.Series): row of result_erupting_unrest
+            pop_partition (dict): population partition from partition_population, may be None
+            settings (dict): JSON-serializable run settings
+
+        Returns:
+            str: sha256 hex digest
+        """
+        inputs = {
+            'x_coordinate': round(float(volcan['x_coordinate']), 6),
+            'y_coordinate': round(float(volcan['y_coordinate']), 6),
+            'buffer_km': int(volcan['buffer_km']),
+            'source': volcan['source'],
+            'population_cells': 0 if pop_partition is None else len(pop_partition['gid']),
+            'population_total': 0 if pop_partition is None else float(np.nansum(pop_partition['pop'])),
+            **settings,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def load_manifest(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(manifest, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)  # never leave a half-written manifest behind
+
+    def stable_rows(df, keys):
+        """Sorts on the given key columns so an unchanged table is written with the same bytes."""
+        keys = [key for key in keys if key in df.columns]
+        if not keys:
+            return df
+        return df.sort_values(keys, kind='mergesort').reset_index(drop=True)
+
+    def write_gpkg(gdf, path):
+        """
+        Writes a GeoPackage that is byte-identical when its content is unchanged.
+
+        The file is recreated instead of overwritten (SQLite keeps change counters and freed
+        pages across writes) and the last_change timestamp GDAL stores in gpkg_contents is pinned.
+
+        Args:
+            gdf (gpd.GeoDataFrame): layer to write
+            path (str): output .gpkg path
+        """
+        os.environ["OGR_CURRENT_DATE"] = "2000-01-01T00:00:00.000Z"
+        if os.path.exists(path):
+            os.remove(path)
+        gdf.to_file(path, driver='GPKG')
+
+    def write_table(df, path, export_csv=False, row_group_size=None, categories=()):
+        """
+        Writes an app dataset as Parquet with zstd compression and dictionary-encoded strings.
+
+        The Arrow schema is built explicitly: object columns are stored as strings (mixed
+        str / number columns included), then the columns get the lean dtypes of dtype_policy,
+        kept in the pandas metadata for the readers. GeoDataFrames are written as GeoParquet.
+        With export_csv, a CSV (GPKG for layers) is written next to the Parquet file.
+
+        Args:
+            df (pd.DataFrame | gpd.GeoDataFrame): dataset
+            path (str): output .parquet path
+            export_csv (bool): also write the CSV / GPKG side output
+            row_group_size (int): rows per row group, small groups let readers filtering on
+                a sorted key skip most of the file (default: one group per 1M rows)
+            categories (list): other categorical columns of this dataset (see lean_dtypes)
+        """
+        string_columns = [column for column, dtype in df.dtypes.items()
+                          if dtype == object and not (isinstance(df, gpd.GeoDataFrame) and column == df.geometry.name)]
+        df = df.copy()
+        for column in string_columns:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        df = lean_dtypes(df, categories)
+        string_columns = [column for column, dtype in df.dtypes.items() if isinstance(dtype, pd.StringDtype)]
+        dictionary_columns = string_columns + [column for column, dtype in df.dtypes.items()
+                                               if isinstance(dtype, pd.CategoricalDtype)]
+
+        if isinstance(df, gpd.GeoDataFrame):
+            df.to_parquet(path, index=False, compression='zstd', use_dictionary=dictionary_columns,
+                          row_group_size=row_group_size)
+        else:
+            schema = pa.schema([
+                pa.field(column, pa.string()) if column in string_columns
+                else pa.Schema.from_pandas(df[[column]], preserve_index=False).field(column)
+                for column in df.columns
+            ])
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            pq.write_table(table, path, compression='zstd', use_dictionary=dictionary_columns,
+                           row_group_size=row_group_size)
+
+        if export_csv:
+            if isinstance(df, gpd.GeoDataFrame):
+                write_gpkg(df, f"{os.path.splitext(path)[0]}.gpkg")
+            else:
+                df.to_csv(f"{os.path.splitext(path)[0]}.csv", index=False)
+
+    def write_table_chunks(chunks, path, export_csv=False, row_group_size=None, keep_columns=None):
+        """
+        Streams an app dataset to Parquet one chunk at a time, the chunks of read_sql_chunks
+        never being concatenated.
+
+        Chunks are converted like write_table (object columns as strings, lean dtypes, zstd,
+        dictionary encoded strings) and GeoDataFrames are written as GeoParquet WKB. The
+        schema is taken from the first chunk and the next chunks are cast to it.
+
+        Args:
+            chunks (iterable): DataFrames / GeoDataFrames with the same columns, in file order
+            path (str): output .parquet path
+            export_csv (bool): also append every chunk to the CSV / GPKG side output
+            row_group_size (int): rows per row group (default: one group per chunk)
+            keep_columns (list): columns of every chunk returned to the caller, with their lean
+                dtypes (default: none)
+
+        Returns:
+            tuple: (rows written, the keep_columns of all the chunks or None)
+        """
+        writer = None
+        schema = None
+        string_columns = []
+        dictionary_columns = []
+        kept = []
+        rows = 0
+        try:
+            for chunk in chunks:
+                chunk = lean_dtypes(chunk)
+                if keep_columns:
+                    kept.append(chunk[keep_columns])
+                if export_csv:
+                    if isinstance(chunk, gpd.GeoDataFrame):
+                        if writer is None:
+                            write_gpkg(chunk, f"{os.path.splitext(path)[0]}.gpkg")
+                        else:
+                            chunk.to_file(f"{os.path.splitext(path)[0]}.gpkg", driver='GPKG', mode='a')
+                    else:
+                        chunk.to_csv(f"{os.path.splitext(path)[0]}.csv", index=False,
+                                     mode='w' if writer is None else 'a', header=writer is None)
+                geometry_column = chunk.geometry.name if isinstance(chunk, gpd.GeoDataFrame) else None
+                crs = chunk.crs if geometry_column else None
+                if geometry_column:
+                    chunk = pd.DataFrame(chunk.to_wkb())
+                if writer is None:
+                    string_columns = [column for column, dtype in chunk.dtypes.items()
+                                      if (dtype == object or isinstance(dtype, pd.StringDtype)) and column != geometry_column]
+                    dictionary_columns = string_columns + [column for column, dtype in chunk.dtypes.items()
+                                                           if isinstance(dtype, pd.CategoricalDtype)]
+                chunk = chunk.copy()
+                for column in string_columns:
+                    chunk[column] = chunk[column].where(chunk[column].isna(), chunk[column].astype(str))
+
+                if writer is None:
+                    # With the pandas metadata of the first chunk, the readers get the lean dtypes back
+                    schema = pa.schema([
+                        pa.field(column, pa.string()) if column in string_columns
+                        else pa.field(column, pa.binary()) if column == geometry_column
+                        # Fixed index width, the chunks' own dictionaries may outgrow the first one's int8 indices
+                        else pa.field(column, pa.dictionary(pa.int32(), pa.string())) if column in dictionary_columns
+                        else pa.Schema.from_pandas(chunk[[column]], preserve_index=False).field(column)
+                        for column in chunk.columns
+                    ], metadata=pa.Schema.from_pandas(chunk, preserve_index=False).metadata)
+                    if geometry_column:
+                        # GeoParquet 1.0 metadata, the geometry types are left open ([]) as they are not known upfront
+                        schema = schema.with_metadata({**schema.metadata, b'geo': json.dumps({
+                            'version': '1.0.0', 'primary_column': geometry_column,
+                            'columns': {geometry_column: {'encoding': 'WKB', 'geometry_types': [],
+                                                          'crs': crs.to_json_dict() if crs else None}},
+                        }).encode()})
+                    writer = pq.ParquetWriter(path, schema, compression='zstd', use_dictionary=dictionary_columns)
+                writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False).cast(schema),
+                                   row_group_size=row_group_size)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if not kept:
+            return rows, None
+        # Chunks with different categories are concatenated as strings, categorized again here
+        return rows, lean_dtypes(pd.concat(kept, ignore_index=True))
+
+    def memory_report(paths):
+        """
+        In-memory size of the app datasets as the pages load them (lean dtypes), against the
+        same frames with the default object / float64 / int64 dtypes.
+
+        Args:
+            paths (list): app .parquet files, the missing ones are skipped
+
+        Returns:
+            pd.DataFrame: one row per dataset ['dataset', 'rows', 'default_mb', 'lean_mb', 'saved_pct']
+        """
+        report = []
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            dataset = os.path.splitext(os.path.basename(path))[0]
+            with instrument("memory_report", dataset=dataset) as metrics:
+                lean = pd.read_parquet(path)
+                default = pd.DataFrame({
+                    column: values.astype(object) if isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype))
+                    else values.astype('float64') if values.dtype == 'float32'
+                    else values.astype('float64' if values.hasnans else 'int64') if values.dtype == 'Int32'
+                    else values
+                    for column, values in lean.items()
+                })
+                default_mb = default.memory_usage(deep=True).sum() / 1e6
+                lean_mb = lean.memory_usage(deep=True).sum() / 1e6
+                metrics.update(rows_out=len(lean), default_mb=round(default_mb, 3), lean_mb=round(lean_mb, 3))
+            report.append({'dataset': dataset, 'rows': len(lean), 'default_mb': round(default_mb, 3),
+                           'lean_mb': round(lean_mb, 3),
+                           'saved_pct': round(100 * (1 - lean_mb / default_mb), 1) if default_mb else 0.0})
+        return pd.DataFrame(report, columns=['dataset', 'rows', 'default_mb', 'lean_mb', 'saved_pct'])
+
+    def update_earthquake_archive(earthquakes_db, archive_dir, retention_days):
+        """
+        Appends a fetch of the USGS feed to the earthquake archive, a Parquet dataset with one
+        partition per event day (archive_dir/date=YYYY-MM-DD/earthquakes.parquet).
+
+        Events are deduplicated on the USGS event id, a new fetch replacing the archived
+        version (USGS revises magnitudes and locations). Days older than retention_days before
+        the newest archived day are removed, so reruns on the same data keep the same files.
+
+        Args:
+            earthquakes_db (pd.DataFrame): fetched events, with their id, time and date
+            archive_dir (str): archive root
+            retention_days (int): number of days kept
+
+        Returns:
+            list: archived days, oldest first
+        """
+        earthquakes = earthquakes_db.copy()
+        if 'id' not in earthquakes.columns:
+            # Tables extracted before the event id was kept: it ends the event page url
+            earthquakes['id'] = earthquakes['infos'].str.rsplit('/', n=1).str[-1]
+        earthquakes['time'] = pd.to_datetime(earthquakes.get('time', pd.Series(pd.NaT, index=earthquakes.index)),
+                                             utc=True).astype('datetime64[ms, UTC]')
+        if 'date' not in earthquakes.columns:
+            earthquakes['date'] = earthquakes['time'].dt.strftime('%Y-%m-%d')
+
+        for date, events in earthquakes.groupby('date'):
+            path = os.path.join(archive_dir, f"date={date}", "earthquakes.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            events = events.drop(columns=['date'])
+            if os.path.exists(path):
+                events = pd.concat([pd.read_parquet(path), events], ignore_index=True)
+            events = stable_rows(events.drop_duplicates('id', keep='last'), ['time', 'id'])
+            write_table(events, path)
+            print(f"✅ earthquake archive {date}: {len(events)} events")
+
+        dates = earthquake_archive_dates(archive_dir)
+        if dates:
+            oldest_kept = (pd.Timestamp(dates[-1]) - pd.Timedelta(days=retention_days - 1)).strftime('%Y-%m-%d')
+            for date in [date for date in dates if date < oldest_kept]:
+                shutil.rmtree(os.path.join(archive_dir, f"date={date}"))
+                print(f"+++ earthquake archive {date} removed (retention {retention_days} days)")
+            dates = [date for date in dates if date >= oldest_kept]
+        return dates
+
+    def earthquake_archive_dates(archive_dir):
+        """Days held by the earthquake archive, oldest first."""
+        if not os.path.isdir(archive_dir):
+            return []
+        return sorted(name.split('=', 1)[1] for name in os.listdir(archive_dir) if name.startswith('date='))
+
+    def read_earthquake_archive(archive_dir, start=None, end=None, columns=None):
+        """
+        Reads the archived earthquakes of a day range, only the partitions of those days are opened.
+
+        Args:
+            archive_dir (str): archive root
+            start (str): first day 'YYYY-MM-DD', included (default: oldest archived day)
+            end (str): last day 'YYYY-MM-DD', included (default: newest archived day)
+            columns (list): columns to read (default: all)
+
+        Returns:
+            pd.DataFrame: events with their date column, sorted on time
+        """
+        dates = [date for date in earthquake_archive_dates(archive_dir)
+                 if (start is None or date >= start) and (end is None or date <= end)]
+        events = [pd.read_parquet(os.path.join(archive_dir, f"date={date}", "earthquakes.parquet"),
+                                  columns=columns).assign(date=date) for date in dates]
+        if not events:
+            return pd.DataFrame(columns=(columns or []) + ['date'])
+        return pd.concat(events, ignore_index=True)
+
+    def alert_severity(level):
+        """
+        Rank of an alert level on a common 1-4 scale, the observatories publishing numbered
+        levels, colours (aviation code) or USGS words.
+
+        Args:
+            level (str): observatory or aviation alert level as scraped
+
+        Returns:
+            float: rank, NaN when the level is unknown (e.g. "unavailable or not collected")
+        """
+        if not isinstance(level, str):
+            return np.nan
+        text = level.lower()
+        number = regex.search(r"\b([1-5])\b", text)
+        if number:
+            return float(number.group(1))
+        for rank, words in [(4, ('red', 'warning', 'awas')), (3, ('orange', 'watch', 'siaga')),
+                            (2, ('yellow', 'advisory', 'waspada')), (1, ('green', 'normal'))]:
+            if any(word in text for word in words):
+                return float(rank)
+        return np.nan
+
+    def update_alert_history(history, alerts):
+        """
+        Merges a day of alert levels into the run-length alert history.
+
+        A run is a volcano holding the same observatory and aviation levels on consecutive
+        days, so an unchanged day only moves the end_date of the current run. Days already
+        in the history are overwritten by the new observations, so reruns and backfilled
+        days land in the right run.
+
+        Args:
+            history (pd.DataFrame | None): runs ['Name', 'observatory_level', 'aviation_level', 'start_date', 'end_date']
+            alerts (pd.DataFrame): alerts_volcanoes_latest (Name, observatory_level, aviation_level, date)
+
+        Returns:
+            pd.DataFrame: runs sorted on Name and start_date, dates as 'YYYY-MM-DD'
+        """
+        level_columns = ['observatory_level', 'aviation_level']
+        days = []
+        if history is not None and not history.empty:
+            history = history.reset_index(drop=True)
+            start = pd.to_datetime(history['start_date'])
+            length = (pd.to_datetime(history['end_date']) - start).dt.days + 1
+            expanded = history.loc[history.index.repeat(length), ['Name'] + level_columns]
+            expanded['date'] = start.loc[expanded.index] + pd.to_timedelta(expanded.groupby(level=0).cumcount(), unit='D')
+            days.append(expanded)
+        days.append(alerts[['Name'] + level_columns].assign(date=pd.to_datetime(alerts['date'])))
+        days = (pd.concat(days, ignore_index=True)
+                .drop_duplicates(['Name', 'date'], keep='last')
+                .sort_values(['Name', 'date'], kind='mergesort'))
+
+        # Categorical levels (lean history file) compared as plain values
+        levels = days[level_columns].astype(object).fillna('')
+        new_run = ((days['Name'] != days['Name'].shift()) |
+                   (days['date'].diff() != pd.Timedelta(days=1)) |
+                   (levels != levels.shift()).any(axis=1))
+        runs = days.assign(run=new_run.cumsum()).groupby('run').agg(
+            Name=('Name', 'first'), observatory_level=('observatory_level', 'first'),
+            aviation_level=('aviation_level', 'first'), start_date=('date', 'min'), end_date=('date', 'max'))
+        runs['start_date'] = runs['start_date'].dt.strftime('%Y-%m-%d')
+        runs['end_date'] = runs['end_date'].dt.strftime('%Y-%m-%d')
+        return runs.reset_index(drop=True)
+
+    def alert_changes(history, date):
+        """
+        Alert level changes of a day against each volcano's previous observation.
+
+        Args:
+            history (pd.DataFrame): output of update_alert_history
+            date (str): day 'YYYY-MM-DD'
+
+        Returns:
+            pd.DataFrame: one row per volcano whose levels changed, with the columns
+                ['Name', 'date', 'change', 'previous_observatory_level', 'observatory_level',
+                 'previous_aviation_level', 'aviation_level'], change being escalation,
+                de-escalation, changed (levels not comparable), new, reported again or no longer reported
+        """
+        previous_day = (pd.Timestamp(date) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        started = history[history['start_date'] == date]
+        before = (history[history['end_date'] < date]
+                  .sort_values('end_date', kind='mergesort')
+                  .drop_duplicates('Name', keep='last')
+                  .set_index('Name'))
+        changes = started.join(before[['observatory_level', 'aviation_level']], on='Name', rsuffix='_previous')
+        changes = changes.rename(columns={'observatory_level_previous': 'previous_observatory_level',
+                                          'aviation_level_previous': 'previous_aviation_level'})
+
+        def change_type(row):
+            if row['Name'] not in before.index:
+                return 'new'
+            if all(str(row[level]) == str(row[f'previous_{level}']) for level in ['observatory_level', 'aviation_level']):
+                # Back in the report after a gap, on the same levels
+                return 'reported again'
+            for level in ['observatory_level', 'aviation_level']:
+                current, previous = alert_severity(row[level]), alert_severity(row[f'previous_{level}'])
+                if not np.isnan(current) and not np.isnan(previous) and current != previous:
+                    return 'escalation' if current > previous else 'de-escalation'
+            return 'changed'
+
+        changes['change'] = changes.apply(change_type, axis=1) if not changes.empty else pd.Series(dtype=str)
+        # Volcanoes reported the day before and missing from this day's report
+        covering = history[(history['start_date'] <= date) & (history['end_date'] >= date)]['Name']
+        ended = history[(history['end_date'] == previous_day) & ~history['Name'].isin(covering)]
+        ended = ended.rename(columns={'observatory_level': 'previous_observatory_level',
+                                      'aviation_level': 'previous_aviation_level'}).assign(change='no longer reported')
+
+        changes = pd.concat([changes, ended], ignore_index=True).assign(date=date)
+        return stable_rows(changes, ['Name'])[['Name', 'date', 'change', 'previous_observatory_level', 'observatory_level',
+                                               'previous_aviation_level', 'aviation_level']]
+
+    def split_volcano_catalog(volcanoes_db):
+        """
+        Splits the Holocene catalog into the columns every page needs to place and label a
+        volcano, and the long text / photo columns only shown for one selected volcano.
+
+        Args:
+            volcanoes_db (pd.DataFrame): volcanoes_db table
+
+        Returns:
+            tuple: (geo core, details), both sorted on Volcano_Number
+        """
+        volcanoes_db = stable_rows(volcanoes_db, ['Volcano_Number'])
+        core_columns = [column for column in ['id', 'Volcano_Number', 'Volcano_Name', 'Longitude', 'Latitude',
+                                              'Primary_Volcano_Type', 'Country', 'Region', 'Subregion',
+                                              'Last_Eruption_Year', 'Elevation']
+                        if column in volcanoes_db.columns]
+        detail_columns = ['Volcano_Number'] + [column for column in volcanoes_db.columns
+                                               if column not in core_columns]
+        return volcanoes_db[core_columns], volcanoes_db[detail_columns]
+
+    def group_offsets(keys, prefix):
+        """
+        Offsets of every key in a table sorted on that key, the rows of one key are
+        table.iloc[offset:offset + count].
+
+        Args:
+            keys (pd.Series): sorted key column
+            prefix (str): prefix of the offset / count column names
+
+        Returns:
+            pd.DataFrame: columns ['Volcano_Number', f'{prefix}_offset', f'{prefix}_count']
+        """
+        values, offsets, counts = np.unique(keys.to_numpy(), return_index=True, return_counts=True)
+        return pd.DataFrame({'Volcano_Number': values, f'{prefix}_offset': offsets, f'{prefix}_count': counts})
+
+    def build_eruption_index(historical_db_GVP, historical_db):
+        """
+        Precomputes what the Holocene page shows for one volcano, so it slices and reads
+        aggregates instead of masking the eruption tables and grouping on every rerun.
+
+        Both tables must already be sorted on their volcano number (GVP eruptions on
+        Volcano_Number, fatal incidents on "(GVP) Volcano number").
+
+        Args:
+            historical_db_GVP (pd.DataFrame): GVP eruptions, sorted
+            historical_db (pd.DataFrame): volcanic fatalities database (MOESM1), sorted
+
+        Returns:
+            tuple: (index, decades)
+                - index: one row per volcano with the gvp / fatal / decade offsets and counts,
+                  fatal_incidents and fatalities
+                - decades: eruptions per decade since 1950, sorted on Volcano_Number then Decade
+        """
+        recent = historical_db_GVP.loc[historical_db_GVP['StartDateYear'] >= 1950, ['Volcano_Number', 'StartDateYear']]
+        decades = (recent.assign(Decade=(recent['StartDateYear'] // 10) * 10)
+                   .groupby(['Volcano_Number', 'Decade']).size()
+                   .reset_index(name='eruption_count'))
+
+        fatal_keys = historical_db['(GVP) Volcano number'].rename('Volcano_Number')
+        fatalities = (pd.DataFrame({'Volcano_Number': fatal_keys,
+                                    'fatalities': pd.to_numeric(historical_db['Number of fatalities'], errors='coerce')})
+                      .groupby('Volcano_Number')
+                      .agg(fatal_incidents=('fatalities', 'size'), fatalities=('fatalities', 'sum'))
+                      .reset_index())
+
+        index = None
+        for offsets in [group_offsets(historical_db_GVP['Volcano_Number'], 'gvp'),
+                        group_offsets(fatal_keys, 'fatal'),
+                        group_offsets(decades['Volcano_Number'], 'decade'),
+                        fatalities]:
+            index = offsets if index is None else index.merge(offsets, on='Volcano_Number', how='outer')
+        # Volcanoes missing from a table get an empty slice
+        index = index.fillna(0)
+        return index.astype({column: 'int64' for column in index.columns}), decades
+
+    def build_map_clusters(volcanoes_core, erupting_unrest, earthquakes_db, cell_sizes=(20, 5, 1)):
+        """
+        Grid clusters of the volcanoes and earthquakes for every level of detail of the map,
+        so the page sends a bounded number of records whatever the size of the catalogs.
+
+        Points are binned on a lon/lat grid of cell_size degrees and every cluster is drawn
+        at the mean position of its members. Earthquake clusters are kept per day, the map
+        merges the cells of the days in its date range.
+
+        Args:
+            volcanoes_core (pd.DataFrame): Holocene catalog core (Volcano_Number, Longitude, Latitude)
+            erupting_unrest (pd.DataFrame): active volcanoes with their source (erupting / unrest)
+            earthquakes_db (pd.DataFrame): earthquakes (x_coordinate, y_coordinate, magnitude, date)
+            cell_sizes (tuple): grid cell size in degrees of every level, coarsest first
+
+        Returns:
+            pd.DataFrame: one row per level / layer / day / cell with the columns
+                ['level', 'cell_size', 'layer', 'date', 'cell_x', 'cell_y', 'Longitude', 'Latitude',
+                 'count', 'n_erupting', 'n_unrest', 'status', 'max_magnitude']
+        """
+        status_rank = {'dormant': 0, 'unrest': 1, 'erupting': 2}
+        active = erupting_unrest[['Volcano_Number', 'Longitude', 'Latitude', 'source']].rename(columns={'source': 'status'})
+        # A volcano listed as both erupting and unrest keeps the worst status
+        active = (active.assign(rank=active['status'].map(status_rank))
+                  .sort_values('rank', ascending=False, kind='mergesort')
+                  .drop_duplicates('Volcano_Number'))
+        volcanoes = pd.concat([
+            volcanoes_core.loc[~volcanoes_core['Volcano_Number'].isin(active['Volcano_Number']),
+                               ['Volcano_Number', 'Longitude', 'Latitude']].assign(status='dormant', rank=0),
+            active,
+        ], ignore_index=True)
+        earthquakes = pd.DataFrame({'Longitude': earthquakes_db['x_coordinate'],
+                                    'Latitude': earthquakes_db['y_coordinate'],
+                                    'magnitude': earthquakes_db['magnitude'],
+                                    'date': earthquakes_db['date']})
+
+        clusters = []
+        for level, cell_size in enumerate(cell_sizes):
+            for layer, points in [('volcano', volcanoes), ('earthquake', earthquakes)]:
+                if points.empty:
+                    continue
+                cells = points.assign(cell_x=np.floor(points['Longitude'] / cell_size).astype('int64'),
+                                      cell_y=np.floor(points['Latitude'] / cell_size).astype('int64'))
+                if layer == 'volcano':
+                    grouped = cells.assign(date=None).groupby(['date', 'cell_x', 'cell_y'], dropna=False).agg(
+                        Longitude=('Longitude', 'mean'), Latitude=('Latitude', 'mean'), count=('status', 'size'),
+                        n_erupting=('status', lambda status: int((status == 'erupting').sum())),
+                        n_unrest=('status', lambda status: int((status == 'unrest').sum())),
+                        rank=('rank', 'max'))
+                    grouped['status'] = grouped['rank'].map({rank: status for status, rank in status_rank.items()})
+                    grouped['max_magnitude'] = np.nan
+                else:
+                    grouped = cells.groupby(['date', 'cell_x', 'cell_y']).agg(
+                        Longitude=('Longitude', 'mean'), Latitude=('Latitude', 'mean'), count=('magnitude', 'size'),
+                        max_magnitude=('magnitude', 'max'))
+                    grouped[['n_erupting', 'n_unrest']] = 0
+                    grouped['status'] = None
+                clusters.append(grouped.reset_index().assign(level=level, cell_size=cell_size, layer=layer))
+
+        columns = ['level', 'cell_size', 'layer', 'date', 'cell_x', 'cell_y', 'Longitude', 'Latitude', 'count',
+                   'n_erupting', 'n_unrest', 'status', 'max_magnitude']
+        if not clusters:
+            return pd.DataFrame(columns=columns)
+        return stable_rows(pd.concat(clusters, ignore_index=True), ['level', 'layer', 'date', 'cell_x', 'cell_y'])[columns]
+
+    def spatial_analysis(volcano, pop_partition, graph_path, isochrone_minutes=(5, 10, 20)):
+
+        geodataframe = gpd.GeoDataFrame(volcano, geometry='geom_buffer', crs="EPSG:4326")
+        volcano_name = geodataframe['Volcano_Name'].iloc[0]
+
+        bbox = geodataframe.total_bounds  # [minx, miny, maxx, maxy]
+
+        tags_emergency_service = {
+            'amenity': [
+                'fire_station',
+                'police',
+                'hospital',
+                'ambulance_station',
+            ]
+        }
+
+        tags_essential_service = {
+            'amenity': [
+                'supermarket', 'fuel', 'chemist',
+                'shelter',
+                'Pharmacy', 'dentist', 'doctors', 'embassy', 'townhall', 'courthouse', 'veterinary'
+            ]
+        }
+
+        tags_amenity = {
+            'amenity': [
+                'kindergarten', 'school', 'library', 'college', 'university', 'prison', 'social_facility',
+                'nursing_home',
+            ]
+        }
+
+        tags_roads = {
+            'highway': [
+                'motorway', 'motorway link', 'trunk', 'trunk link', 'primary', 'primary link', 'secondary',
+                'secondary link', 'tertiary', 'tertiary link',
+                'unclassified', 'residential', 'living street', 'service', 'road', 'unknown'
+            ]
+        }
+
+        warnings.filterwarnings("ignore", message="Geometry is in a geographic CRS.*")
+
+        print('+++ emergency_service')
+        with instrument("spatial_analysis.osm_fetch", layer="emergency_service", volcano=volcano_name) as metrics:
             emergency_service = request_osm(bbox, tags_emergency_service)
-            if isinstance(emergency_service, gpd.GeoDataFrame):
-                emergency_service = emergency_service.to_crs("EPSG:4326")
-                emergency_service.geometry = emergency_service.geometry.centroid
+            metrics['rows_out'] = count_rows(emergency_service)
+        if isinstance(emergency_service, gpd.GeoDataFrame):
+            emergency_service = emergency_service.to_crs("EPSG:4326")
+            emergency_service.geometry = emergency_service.geometry.centroid
 
-            print('+++ essential_service')
+        print('+++ essential_service')
+        with instrument("spatial_analysis.osm_fetch", layer="essential_service", volcano=volcano_name) as metrics:
             essential_service = request_osm(bbox, tags_essential_service)
-            if isinstance(essential_service, gpd.GeoDataFrame):
-                essential_service = essential_service.to_crs("EPSG:4326")
-                essential_service.geometry = essential_service.geometry.centroid
+            metrics['rows_out'] = count_rows(essential_service)
+        if isinstance(essential_service, gpd.GeoDataFrame):
+            essential_service = essential_service.to_crs("EPSG:4326")
+            essential_service.geometry = essential_service.geometry.centroid
 
-            print('+++ amenity')
+        print('+++ amenity')
+        with instrument("spatial_analysis.osm_fetch", layer="amenity", volcano=volcano_name) as metrics:
             amenity = request_osm(bbox, tags_amenity)
-            if isinstance(amenity, gpd.GeoDataFrame):
-                amenity = amenity.to_crs("EPSG:4326")
-                amenity.geometry = amenity.geometry.centroid
+            metrics['rows_out'] = count_rows(amenity)
+        if isinstance(amenity, gpd.GeoDataFrame):
+            amenity = amenity.to_crs("EPSG:4326")
+            amenity.geometry = amenity.geometry.centroid
 
-            print('+++ roads')
+        print('+++ roads')
+        with instrument("spatial_analysis.osm_fetch", layer="roads", volcano=volcano_name) as metrics:
             roads = request_osm(bbox, tags_roads)
-            if isinstance(roads, gpd.GeoDataFrame):
-                roads = roads.to_crs("EPSG:4326")
-
-            print('+++ graph')
-            print('+++      download graph')
-            custom_filter = '["highway"~"motorway|trunk|primary|secondary|tertiary"]'
+            metrics['rows_out'] = count_rows(roads)
+        if isinstance(roads, gpd.GeoDataFrame):
+            roads = roads.to_crs("EPSG:4326")
+
+        print('+++ graph')
+        print('+++      download graph')
+        custom_filter = '["highway"~"motorway|trunk|primary|secondary|tertiary"]'
+        with instrument("spatial_analysis.graph_download", volcano=volcano_name) as metrics:
             graph = ox.graph_from_bbox(bbox, network_type="drive", custom_filter=custom_filter)
-            if graph and len(graph.nodes()) > 0:
-                graph_proj = ox.project_graph(graph)
-                nodes_proj, edges_proj = ox.graph_to_gdfs(graph_proj, nodes=True, edges=True)
-                print(f'+++      betweenness_centrality - {len(nodes_proj)} nodes')
-                betweenness_centrality = nx.betweenness_centrality(graph_proj)
-                nodes_proj['betweenness_centrality'] = nodes_proj.index.map(betweenness_centrality)
-                nodes_proj = nodes_proj.to_crs(pop_db.crs)
-                print('+++      population join')
-                population_clipped = gpd.clip(pop_db, bbox)
-                nodes_proj = gpd.sjoin_nearest(nodes_proj, population_clipped, distance_col="distances",
-                                               lsuffix="left", rsuffix="right", exclusive=True)
-                nodes_proj = nodes_proj[['betweenness_centrality', 'pop', 'distances', 'geometry']]
-
-                print('+++      score')
-                nodes_proj['pop_norm'] = (
-                        (nodes_proj['pop'] - nodes_proj['pop'].min()) /
-                        (nodes_proj['pop'].max() - nodes_proj['pop'].min())
-                )
-
-                nodes_proj['betweenness_norm'] = (
-                        (nodes_proj['betweenness_centrality'] - nodes_proj['betweenness_centrality'].min()) /
-                        (nodes_proj['betweenness_centrality'].max() - nodes_proj['betweenness_centrality'].min())
-                )
-
-                nodes_proj['score'] = (
-                        0.5 * nodes_proj['pop_norm'] +
-                        0.5 * nodes_proj['betweenness_norm']
-                )
-
-            return roads, emergency_service, amenity, essential_service, nodes_proj
-
-        result_erupting_unrest, result_alerts, result_db, historical_db, historical_db_GVP, population_at_risk, total_affected, risk_by_volcano, earthquakes_db = query_database()
-
-        if result_erupting_unrest is not None:
-            data_paths = {
-                "erupting_unrest": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/erupting_unrest_volcanoes_latest.csv',
-                "roads": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/osm_highways_features.pkl',
-                "emergency": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_emergency_services.gpkg',
-                "amenities": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_amenities.gpkg',
-                "essential_services": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_essential_services.gpkg',
-                "all_nodes": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_nodes.gpkg',
-                "alerts_volcanoes_latest": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/alerts_volcanoes_latest.csv',
-                "volcanoes_db": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/volcanoes_db.csv',
-                "historical_db": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/historical_db.csv',
-                "historical_db_GVP": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/historical_db_GVP.csv',
-                "population_at_risk": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/population_at_risk.csv',
-                "total_affected": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/total_affected.csv',
-                "risk_by_volcano": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/risk_by_volcano.csv',
-                "earthquakes_db": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/earthquakes_db.csv'
+            metrics['rows_out'] = len(graph.nodes())
+        nodes_proj = None
+        evacuation = None
+        graph_stats = None
+        accessibility = None
+        if pop_partition is None:
+            print('+++      no population at risk, skipping node scores')
+        elif graph and len(graph.nodes()) > 0:
+            with instrument("spatial_analysis.graph_to_csr", rows_in=len(graph.nodes()), volcano=volcano_name) as metrics:
+                graph_proj = ox.add_edge_travel_times(ox.add_edge_speeds(ox.project_graph(graph)))
+                csr_graph = graph_to_csr(graph_proj)
+                metrics['rows_out'] = csr_graph['adjacency'].nnz
+            del graph_proj
+            del graph
+            save_csr_graph(csr_graph, graph_path)
+            n_components, component_labels = connected_components(csr_graph['adjacency'], directed=True,
+                                                                  connection='strong')
+            graph_stats = {
+                'nodes': len(csr_graph['node_ids']),
+                'edges': csr_graph['adjacency'].nnz,
+                'csr_bytes': csr_graph_nbytes(csr_graph),
+                'strong_components': n_components,
+                'largest_component_share': np.bincount(component_labels).max() / len(component_labels),
             }
+            print(f"+++      csr graph - {graph_stats['nodes']} nodes, {graph_stats['edges']} edges, "
+                  f"{graph_stats['csr_bytes'] / 1e6:.2f} MB, {n_components} strongly connected components")
+            nodes_proj = gpd.GeoDataFrame(
+                index=pd.Index(csr_graph['node_ids'], name='osmid'),
+                geometry=gpd.points_from_xy(csr_graph['x'], csr_graph['y']),
+                crs=csr_graph['crs']
+            )
+            print(f'+++      betweenness_centrality - {len(nodes_proj)} nodes')
+            with instrument("spatial_analysis.centrality", rows_in=len(nodes_proj), volcano=volcano_name) as metrics:
+                nodes_proj['betweenness_centrality'] = csr_betweenness_centrality(csr_graph)
+                metrics['rows_out'] = len(nodes_proj)
+            print('+++      evacuation routing')
+            with instrument("spatial_analysis.evacuation_routing", rows_in=len(pop_partition['gid']), volcano=volcano_name) as metrics:
+                evacuation = evacuation_routing(csr_graph, nodes_proj, geodataframe, emergency_service, pop_partition)
+                metrics['rows_out'] = count_rows(evacuation)
+            print('+++      hospital accessibility')
+            with instrument("spatial_analysis.hospital_isochrones", rows_in=len(pop_partition['gid']), volcano=volcano_name) as metrics:
+                accessibility = hospital_isochrones(csr_graph, nodes_proj, emergency_service, pop_partition,
+                                                    minutes=isochrone_minutes)
+                metrics['rows_out'] = None if accessibility is None else len(accessibility[0])
+            print('+++      population join')
+            with instrument("spatial_analysis.population_join", rows_in=len(nodes_proj), volcano=volcano_name) as metrics:
+                nodes_proj = nodes_proj.to_crs(pop_partition['crs'])
+                node_coords = np.column_stack([nodes_proj.geometry.x, nodes_proj.geometry.y])
+                distances, nearest = pop_partition['tree'].query(node_coords, k=1)
+                nodes_proj['pop'] = pop_partition['pop'][nearest]
+                nodes_proj['distances'] = distances
+                metrics['rows_out'] = len(nodes_proj)
+            nodes_proj = nodes_proj[['betweenness_centrality', 'pop', 'distances', 'geometry']].to_crs("EPSG:4326")
+
+            print('+++      score')
+            nodes_proj['pop_norm'] = (
+                    (nodes_proj['pop'] - nodes_proj['pop'].min()) /
+                    (nodes_proj['pop'].max() - nodes_proj['pop'].min())
+            )
 
-            test_df = result_erupting_unrest.drop(columns=['geom_buffer'])
-            test_path = '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/erupting_unrest.csv'
-
-            try:
-                test_df.to_csv(test_path, index=False, encoding='utf-8')
-                print("✅ UTF-8 save successful for test data")
-            except Exception as e:
-                print(f"❌ UTF-8 save failed: {e}")
-                # Try latin1
-                test_df.to_csv(test_path, index=False, encoding='latin1')
-                print("⚠️ Saved with latin1 instead")
-
-            # Try reading back
-            try:
-                pd.read_csv(test_path, encoding='utf-8')
-                print("✅ UTF-8 read successful")
-            except Exception as e:
-                print(f"❌ UTF-8 read failed: {e}")
-                pd.read_csv(test_path, encoding='latin1')
+            nodes_proj['betweenness_norm'] = (
+                    (nodes_proj['betweenness_centrality'] - nodes_proj['betweenness_centrality'].min()) /
+                    (nodes_proj['betweenness_centrality'].max() - nodes_proj['betweenness_centrality'].min())
+            )
 
-            all_roads = []
-            all_emergency_services = []
-            all_amenities = []
-            all_essential_services = []
-            all_nodes = []
+            nodes_proj['score'] = (
+                    0.5 * nodes_proj['pop_norm'] +
+                    0.5 * nodes_proj['betweenness_norm']
+            )
 
-            for idx, volcan in result_erupting_unrest.iterrows():
-                try:
-                    print(f"Processing volcano: {volcan['Volcano_Name']} ({idx + 1}/{len(result_erupting_unrest)})")
-
-                    roads, emergency_services, amenities, essential_services, nodes = spatial_analysis(volcano=volcan.to_frame().T, pop_db = population_at_risk)
-
-                    if isinstance(roads, gpd.GeoDataFrame):
-                        roads['volcano_name'] = volcan['Volcano_Name']
-                        roads['id'] = volcan['id']
-                        roads['region'] = volcan['Region']
-                        all_roads.append(roads)
-
-                    if isinstance(emergency_services, gpd.GeoDataFrame):
-                        emergency_services['volcano_name'] = volcan['Volcano_Name']
-                        emergency_services['id'] = volcan['id']
-                        emergency_services['region'] = volcan['Region']
-                        all_emergency_services.append(emergency_services)
-
-                    if isinstance(amenities, gpd.GeoDataFrame):
-                        amenities['volcano_name'] = volcan['Volcano_Name']
-                        amenities['id'] = volcan['id']
-                        amenities['region'] = volcan['Region']
-                        all_amenities.append(amenities)
-
-                    if isinstance(essential_services, gpd.GeoDataFrame):
-                        essential_services['volcano_name'] = volcan['Volcano_Name']
-                        essential_services['id'] = volcan['id']
-                        essential_services['region'] = volcan['Region']
-                        all_essential_services.append(essential_services)
-
-                    if isinstance(nodes, gpd.GeoDataFrame):
-                        nodes['volcano_name'] = volcan['Volcano_Name']
-                        nodes['id'] = volcan['id']
-                        nodes['region'] = volcan['Region']
-                        all_nodes.append(nodes)
-
-                    print(f"Completed processing for {volcan['Volcano_Name']}")
-
-                except Exception as e:
-                    print(f"Error processing {volcan['Volcano_Name']}: {str(e)}")
-                    continue
+        return roads, emergency_service, amenity, essential_service, nodes_proj, evacuation, graph_stats, accessibility
+
+    transform_data_paths = {
+        "erupting_unrest": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/erupting_unrest.parquet',
+        "roads": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/osm_highways_features.pkl',
+        "emergency": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_emergency_services.parquet',
+        "amenities": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_amenities.parquet',
+        "essential_services": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_essential_services.parquet',
+        "all_nodes": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/all_nodes.parquet',
+        "assembly_points": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/assembly_points.parquet',
+        "evacuation_cells": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/evacuation_cells.parquet',
+        "evacuation_summary": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/evacuation_summary.parquet',
+        "isochrones": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/hospital_isochrones.parquet',
+        "accessibility": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/hospital_accessibility.parquet',
+        "graphs": '/home/gillet/Bureau/Volcanic_ETL/data/graphs',
+        "volcano_inputs": '/home/gillet/Bureau/Volcanic_ETL/data/volcano_inputs',
+        "volcano_artifacts": '/home/gillet/Bureau/Volcanic_ETL/data/volcano_artifacts',
+        "checkpoints": '/home/gillet/Bureau/Volcanic_ETL/data/checkpoints',
+        "alerts_volcanoes_latest": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/alerts_volcanoes_latest.parquet',
+        "alert_history": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/alert_history.parquet',
+        "alert_changes": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/alert_changes.parquet',
+        "volcanoes_core": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/volcanoes_core.parquet',
+        "volcano_details": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/volcano_details.parquet',
+        "historical_db": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/historical_db.parquet',
+        "historical_db_GVP": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/historical_db_GVP.parquet',
+        "eruption_index": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/eruption_index.parquet',
+        "eruption_decades": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/eruption_decades.parquet',
+        "population_at_risk": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/population_at_risk.parquet',
+        "total_affected": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/total_affected.parquet',
+        "risk_by_volcano": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/risk_by_volcano.parquet',
+        "earthquakes_archive": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/earthquakes_archive',
+        "map_clusters": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/map_clusters.parquet',
+        "volcano_seismicity": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/volcano_seismicity.parquet',
+        "earthquake_swarms": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/earthquake_swarms.parquet',
+        "population_profiles": '/home/gillet/Bureau/Volcanic_ETL/ETL/app/data/population_profiles.parquet'
+    }
 
-                if len(all_roads) != 0:
-
-                    final_roads = gpd.GeoDataFrame(pd.concat(all_roads, ignore_index=True))
-
-                    osm_highway_colors = {
-                        "motorway": [255, 0, 0],  # Red (unchanged)
-                        "trunk": [255, 128, 0],  # Orange
-                        "primary": [255, 255, 0],  # Yellow
-                        "secondary": [128, 255, 0],  # Light green
-                        "tertiary": [200, 200, 200, 128],  # Light gray with transparency (RGBA)
-                        "unclassified": [255, 255, 255],  # White
-                        "residential": [220, 220, 220],  # Light gray
-                        "service": [192, 192, 192],  # Darker gray
-                        "path": [0, 128, 0],  # Dark green
-                        "footway": [128, 0, 128],  # Purple
-                        "cycleway": [0, 128, 128],  # Teal
-                        "bridleway": [128, 0, 0],  # Dark red
-                        "steps": [0, 0, 128],  # Navy
-                    }
-
-                    highway_widths = {
-                        "motorway": 8,
-                        "trunk": 7,
-                        "primary": 6,
-                        "secondary": 5,
-                        "tertiary": 4,
-                    }
-
-                    final_roads["color"] = final_roads["highway"].apply(
-                        lambda x: osm_highway_colors.get(x, [128, 128, 128])  # Default: gray
-                    )
+    @task
+    def list_active_volcanoes():
+        """
+        Loads the transform inputs, writes the tables that do not depend on the per-volcano
+        spatial analysis and stores one input file per active volcano for the mapped task.
+
+        Returns:
+            list: paths of the per-volcano input files
+        """
+        data_paths = transform_data_paths
+
+        # "postgis" queries the volcanic_etl connection, "local" reads GeoParquet snapshots (laptop / CI runs)
+        transform_backend = Variable.get("TRANSFORM_BACKEND", default_var="postgis")
+        # Parquet is the app format, CSV / GPKG copies are optional side outputs
+        export_csv = Variable.get("EXPORT_CSV", default_var="false").lower() == "true"
+
+        if transform_backend == "local":
+            local_data_dir = Variable.get("LOCAL_DATA_DIR", default_var="/home/gillet/Bureau/Volcanic_ETL/data/local")
+            print(f"Running transform on local GeoParquet files from {local_data_dir}")
+            result_erupting_unrest, result_alerts, result_db, historical_db, historical_db_GVP, population_at_risk, total_affected, risk_by_volcano, earthquakes_db, population_profiles = query_local_files(local_data_dir)
+        else:
+            # The large tables are streamed to their app files, the frames returned for them only hold the columns used below
+            query_chunksize = int(Variable.get("QUERY_CHUNKSIZE", default_var="50000"))
+            result_erupting_unrest, result_alerts, result_db, historical_db, historical_db_GVP, population_at_risk, total_affected, risk_by_volcano, earthquakes_db, population_profiles = query_database(data_paths, query_chunksize, export_csv)
+        streamed = transform_backend != "local"
+
+        if result_erupting_unrest is None:
+            return []
+        result_erupting_unrest = stable_rows(result_erupting_unrest, ['source', 'Volcano_Number'])
+
+        write_table(pd.DataFrame(result_erupting_unrest.drop(columns=['geom_buffer'])), data_paths["erupting_unrest"], export_csv)
+        print(f"✅ erupting_unrest saved to {data_paths['erupting_unrest']}")
+
+        if result_alerts is not None:
+            write_table(stable_rows(result_alerts, ['Name']), data_paths["alerts_volcanoes_latest"], export_csv)
+
+            # The history file is the store: read, merge the day, rewrite
+            alert_history = None
+            if os.path.exists(data_paths["alert_history"]):
+                alert_history = pd.read_parquet(data_paths["alert_history"])
+            alert_history = update_alert_history(alert_history, result_alerts)
+            # Sorted on Name in small row groups, the risk page reads one volcano's runs with a filter
+            write_table(alert_history, data_paths["alert_history"], export_csv, row_group_size=128)
+            alert_date = result_alerts['date'].max()
+            changes = alert_changes(alert_history, alert_date)
+            write_table(changes, data_paths["alert_changes"], export_csv)
+            print(f"✅ alert history: {len(alert_history)} runs, {alert_date}: "
+                  f"{(changes['change'] == 'escalation').sum()} escalations, "
+                  f"{(changes['change'] == 'de-escalation').sum()} de-escalations")
+
+        if result_db is not None:
+            # The pages load the core at startup and read one volcano's details at a time,
+            # the details are filtered on Volcano_Number so their row groups are kept small
+            volcanoes_core, volcano_details = split_volcano_catalog(result_db)
+            write_table(volcanoes_core, data_paths["volcanoes_core"], export_csv)
+            if not streamed:
+                write_table(volcano_details, data_paths["volcano_details"], export_csv, row_group_size=128)
+
+        if historical_db is not None and not streamed:
+            historical_db = stable_rows(coerce_table(historical_db, 'MOESM1'), ['(GVP) Volcano number'])
+            write_table(historical_db, data_paths["historical_db"], export_csv)
+
+        if historical_db_GVP is not None and not streamed:
+            historical_db_GVP = stable_rows(historical_db_GVP, ['Volcano_Number', 'Eruption_Number'])
+            write_table(historical_db_GVP, data_paths["historical_db_GVP"], export_csv)
+
+        if historical_db is not None and historical_db_GVP is not None:
+            # The Holocene page slices both tables with these offsets, they must be written sorted as above
+            eruption_index, eruption_decades = build_eruption_index(historical_db_GVP, historical_db)
+            write_table(eruption_index, data_paths["eruption_index"], export_csv)
+            write_table(eruption_decades, data_paths["eruption_decades"], export_csv)
+            print(f"✅ eruption index saved for {len(eruption_index)} volcanoes")
+
+        if population_at_risk is not None and not streamed:
+            write_table(stable_rows(population_at_risk, ['volcano_id', 'gid']), data_paths["population_at_risk"], export_csv)
+
+        if total_affected is not None:
+            write_table(pd.DataFrame({'total_affected': [total_affected]}), data_paths["total_affected"], export_csv)
+
+        if risk_by_volcano is not None:
+            write_table(risk_by_volcano, data_paths["risk_by_volcano"], export_csv)
+
+        if earthquakes_db is not None and not earthquakes_db.empty:
+            retention_days = int(Variable.get("EARTHQUAKE_RETENTION_DAYS", default_var="30"))
+            archived_days = update_earthquake_archive(earthquakes_db, data_paths["earthquakes_archive"], retention_days)
+            print(f"✅ earthquake archive holds {len(archived_days)} days ({archived_days[0]} to {archived_days[-1]})")
+
+        if result_db is not None:
+            map_clusters = build_map_clusters(volcanoes_core, result_erupting_unrest,
+                                              read_earthquake_archive(data_paths["earthquakes_archive"],
+                                                                      columns=['x_coordinate', 'y_coordinate', 'magnitude']))
+            write_table(map_clusters, data_paths["map_clusters"], export_csv)
+            print(f"✅ map clusters saved ({len(map_clusters)} clusters over {map_clusters['level'].nunique()} levels)")
+
+            radii_km = [float(radius) for radius in Variable.get("SEISMICITY_RADII_KM", default_var="10,30,100").split(",")]
+            recent_days = int(Variable.get("SEISMICITY_RECENT_DAYS", default_var="1"))
+            earthquakes = read_earthquake_archive(data_paths["earthquakes_archive"],
+                                                  columns=['x_coordinate', 'y_coordinate', 'magnitude', 'depth'])
+            with instrument("list_active_volcanoes.seismicity", rows_in=len(earthquakes)) as metrics:
+                volcano_seismicity = seismicity_near_volcanoes(volcanoes_core, earthquakes, radii_km, recent_days)
+                metrics['rows_out'] = len(volcano_seismicity)
+            write_table(volcano_seismicity, data_paths["volcano_seismicity"], export_csv)
+            print(f"✅ seismicity near volcanoes saved ({volcano_seismicity['Volcano_Number'].nunique()} volcanoes "
+                  f"with earthquakes within {max(radii_km):g} km)")
+
+            earthquakes = read_earthquake_archive(data_paths["earthquakes_archive"],
+                                                  columns=['x_coordinate', 'y_coordinate', 'magnitude', 'depth', 'time'])
+            with instrument("list_active_volcanoes.swarms", rows_in=len(earthquakes)) as metrics:
+                earthquake_swarms = detect_earthquake_swarms(
+                    earthquakes, volcanoes_core,
+                    eps_km=float(Variable.get("SWARM_EPS_KM", default_var="10")),
+                    eps_hours=float(Variable.get("SWARM_EPS_HOURS", default_var="24")),
+                    min_events=int(Variable.get("SWARM_MIN_EVENTS", default_var="5")))
+                metrics['rows_out'] = len(earthquake_swarms)
+            write_table(earthquake_swarms, data_paths["earthquake_swarms"], export_csv)
+            print(f"✅ {len(earthquake_swarms)} earthquake swarms saved")
+
+        if population_profiles is not None:
+            write_table(build_population_profiles(population_profiles), data_paths["population_profiles"], export_csv)
+
+        population_partitions = partition_population(population_at_risk)
+        # Checkpoints are grouped by the date of the DAG run, unchanged when a timed-out run is cleared
+        # and rerun. TRANSFORM_RUN_DATE is only a one-off override to resume the checkpoints of another
+        # date: Variables persist, so clear it afterwards or every later run skips the volcanoes done then.
+        run_date = (Variable.get("TRANSFORM_RUN_DATE", default_var="") or get_current_context().get("ds")
+                    or datetime.now().strftime("%Y-%m-%d"))
+        os.makedirs(data_paths["volcano_inputs"], exist_ok=True)
+        volcano_inputs = []
+        # A volcano listed as both erupting and unrest is analysed once, as erupting
+        for _, volcan in result_erupting_unrest.drop_duplicates(subset=['Volcano_Number']).iterrows():
+            input_path = os.path.join(data_paths["volcano_inputs"], f"{volcan['Volcano_Number']}.pkl")
+            pd.to_pickle({
+                'volcano': volcan.to_frame().T,
+                'pop_partition': population_partitions.get(volcan['id']),
+                'run_date': run_date,
+            }, input_path)
+            volcano_inputs.append(input_path)
+
+        print(f"Prepared {len(volcano_inputs)} active volcanoes for spatial analysis (run date {run_date})")
+        return volcano_inputs
+
+    @task(task_id="spatial_analysis", retries=2, retry_delay=timedelta(minutes=5),
+          map_index_template="{{ volcano_name }}")
+    def spatial_analysis_volcano(volcano_input_path):
+        """
+        Mapped over the active volcanoes: runs spatial_analysis for one volcano, or reuses its
+        previous outputs when the input fingerprint stored in its manifest is unchanged.
+
+        Every volcano writes a checkpoint for the run date as soon as it completes or fails.
+        TRANSFORM_MODE selects what happens to volcanoes already checkpointed:
+            "resume" (default): completed volcanoes are skipped, the others are (re)computed.
+                A completed checkpoint is only honoured for the same input fingerprint and
+                without FORCE_FULL_TRANSFORM
+            "repair": only failed volcanoes are recomputed, the others keep their last outputs
+            "full": checkpoints are ignored
+
+        Args:
+            volcano_input_path (str): file written by list_active_volcanoes
+
+        Returns:
+            dict: {'input': volcano_input_path, 'artifact': path of the pickled spatial_analysis outputs}
+        """
+        data_paths = transform_data_paths
+        volcano_input = pd.read_pickle(volcano_input_path)
+        volcan = volcano_input['volcano'].iloc[0]
+        get_current_context()["volcano_name"] = volcan['Volcano_Name']
+        print(f"Processing volcano: {volcan['Volcano_Name']}")
+
+        isochrone_minutes = tuple(int(m) for m in Variable.get("ISOCHRONE_MINUTES", default_var="5,10,20").split(","))
+        transform_settings = {
+            'osm_cache_version': Variable.get("OSM_CACHE_VERSION", default_var="1"),
+            'isochrone_minutes': list(isochrone_minutes),
+        }
+        force_full_transform = Variable.get("FORCE_FULL_TRANSFORM", default_var="false").lower() == "true"
+
+        transform_mode = Variable.get("TRANSFORM_MODE", default_var="resume")
+
+        volcano_key = str(volcan['Volcano_Number'])
+        fingerprint = volcano_fingerprint(volcan, volcano_input['pop_partition'], transform_settings)
+        artifact_path = os.path.join(data_paths["volcano_artifacts"], f"{volcano_key}.pkl")
+        manifest_path = os.path.join(data_paths["volcano_artifacts"], f"{volcano_key}.json")
+        checkpoint_path = os.path.join(data_paths["checkpoints"], volcano_input['run_date'], f"{volcano_key}.json")
+        previous = load_manifest(manifest_path)
+        checkpoint = load_manifest(checkpoint_path)
+
+        # A checkpoint only stands for the inputs it was computed from (status, buffer, population, settings)
+        if transform_mode in ("resume", "repair") and not force_full_transform and checkpoint.get('status') == 'done' \
+                and checkpoint.get('fingerprint') == fingerprint and os.path.exists(checkpoint['artifact']):
+            print(f"Already checkpointed on {checkpoint['updated']}, skipping")
+            return {'input': volcano_input_path, 'artifact': checkpoint['artifact']}
+
+        if transform_mode == "repair" and checkpoint.get('status') != 'failed':
+            if os.path.exists(previous.get('artifact', '')):
+                print(f"Not failed in run {volcano_input['run_date']}, keeping outputs from {previous['updated']}")
+                return {'input': volcano_input_path, 'artifact': previous['artifact']}
+            print(f"Not failed in run {volcano_input['run_date']} and no previous outputs, skipping")
+            return None
+
+        if (not force_full_transform and previous.get('fingerprint') == fingerprint
+                and os.path.exists(previous.get('artifact', ''))):
+            print(f"Inputs unchanged since {previous['updated']}, reusing {previous['artifact']}")
+            save_manifest({
+                'status': 'done',
+                'fingerprint': fingerprint,
+                'artifact': previous['artifact'],
+                'updated': datetime.now().isoformat(timespec='seconds'),
+            }, checkpoint_path)
+            return {'input': volcano_input_path, 'artifact': previous['artifact']}
+
+        try:
+            analysis_results = spatial_analysis(
+                volcano=volcano_input['volcano'],
+                pop_partition=volcano_input['pop_partition'],
+                graph_path=os.path.join(data_paths["graphs"], f"{volcano_key}.npz"),
+                isochrone_minutes=isochrone_minutes
+            )
+        except Exception as e:
+            print(f"❌ Spatial analysis failed for {volcan['Volcano_Name']}: {e}")
+            save_manifest({
+                'status': 'failed',
+                'error': repr(e),
+                'updated': datetime.now().isoformat(timespec='seconds'),
+            }, checkpoint_path)
+            raise
+        os.makedirs(data_paths["volcano_artifacts"], exist_ok=True)
+        pd.to_pickle(analysis_results, artifact_path)
+        save_manifest({
+            'fingerprint': fingerprint,
+            'artifact': artifact_path,
+            'graph': os.path.join(data_paths["graphs"], f"{volcano_key}.npz"),
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        }, manifest_path)
+        save_manifest({
+            'status': 'done',
+            'fingerprint': fingerprint,
+            'artifact': artifact_path,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        }, checkpoint_path)
+        print(f"Completed processing for {volcan['Volcano_Name']}")
+        return {'input': volcano_input_path, 'artifact': artifact_path}
+
+    @task(trigger_rule="all_done")
+    def assemble_transform_outputs(analysed_volcanoes, volcano_inputs):
+        """
+        Reduce step: gathers the per-volcano outputs of the mapped spatial_analysis task into
+        the app data files. Volcanoes whose mapped task failed are left out.
+
+        Args:
+            analysed_volcanoes (list): {'input', 'artifact'} paths returned by spatial_analysis
+            volcano_inputs (list): per-volcano input files of list_active_volcanoes, holding the run date
+        """
+        data_paths = transform_data_paths
+
+        all_roads = []
+        all_emergency_services = []
+        all_amenities = []
+        all_essential_services = []
+        all_nodes = []
+        all_assembly_points = []
+        all_evacuation_cells = []
+        all_evacuation_summaries = []
+        all_graph_stats = []
+        all_isochrones = []
+        all_accessibility = []
+
+        assembly_alpha = float(Variable.get("ASSEMBLY_ALPHA", default_var=0.5))
+        assembly_beta = float(Variable.get("ASSEMBLY_BETA", default_var=0.5))
+        assembly_top_k = int(Variable.get("ASSEMBLY_TOP_K", default_var=20))
+        assembly_min_separation_m = float(Variable.get("ASSEMBLY_MIN_SEPARATION_M", default_var=2000))
+        export_csv = Variable.get("EXPORT_CSV", default_var="false").lower() == "true"
+
+        analysed_volcanoes = [analysed for analysed in analysed_volcanoes if analysed is not None]
+        for analysed in analysed_volcanoes:
+            volcan = pd.read_pickle(analysed['input'])['volcano'].iloc[0]
+            roads, emergency_services, amenities, essential_services, nodes, evacuation, graph_stats, accessibility = pd.read_pickle(analysed['artifact'])
 
-                    final_roads["width"] = final_roads["highway"].apply(
-                        lambda x: highway_widths.get(x, 3)  # Default: gray
-                    )
+            if isinstance(roads, gpd.GeoDataFrame):
+                roads['volcano_name'] = volcan['Volcano_Name']
+                roads['id'] = volcan['id']
+                roads['region'] = volcan['Region']
+                all_roads.append(roads)
+
+            if isinstance(emergency_services, gpd.GeoDataFrame):
+                emergency_services['volcano_name'] = volcan['Volcano_Name']
+                emergency_services['id'] = volcan['id']
+                emergency_services['region'] = volcan['Region']
+                all_emergency_services.append(emergency_services)
+
+            if isinstance(amenities, gpd.GeoDataFrame):
+                amenities['volcano_name'] = volcan['Volcano_Name']
+                amenities['id'] = volcan['id']
+                amenities['region'] = volcan['Region']
+                all_amenities.append(amenities)
+
+            if isinstance(essential_services, gpd.GeoDataFrame):
+                essential_services['volcano_name'] = volcan['Volcano_Name']
+                essential_services['id'] = volcan['id']
+                essential_services['region'] = volcan['Region']
+                all_essential_services.append(essential_services)
+
+            if isinstance(nodes, gpd.GeoDataFrame):
+                nodes['volcano_name'] = volcan['Volcano_Name']
+                nodes['id'] = volcan['id']
+                nodes['region'] = volcan['Region']
+                all_nodes.append(nodes)
+
+                assembly_points = select_assembly_points(nodes, alpha=assembly_alpha, beta=assembly_beta,
+                                                         top_k=assembly_top_k,
+                                                         min_separation_m=assembly_min_separation_m)
+                assembly_points.insert(0, 'id', volcan['id'])
+                assembly_points.insert(1, 'volcano_name', volcan['Volcano_Name'])
+                assembly_points['alpha'] = assembly_alpha
+                assembly_points['beta'] = assembly_beta
+                all_assembly_points.append(assembly_points)
+
+            if accessibility is not None:
+                isochrones, coverage = accessibility
+                isochrones['id'] = volcan['id']
+                all_isochrones.append(isochrones)
+                coverage.insert(0, 'id', volcan['id'])
+                coverage.insert(1, 'volcano_name', volcan['Volcano_Name'])
+                all_accessibility.append(coverage)
+
+            if graph_stats is not None:
+                all_graph_stats.append({'volcano_name': volcan['Volcano_Name'], **graph_stats})
+
+            if isinstance(evacuation, pd.DataFrame):
+                evacuation.insert(0, 'volcano_id', volcan['id'])
+                all_evacuation_cells.append(evacuation)
+                all_evacuation_summaries.append({
+                    'volcano_id': volcan['id'],
+                    'volcano_name': volcan['Volcano_Name'],
+                    **summarize_evacuation(evacuation),
+                })
+
+        print(f"Assembled {len(analysed_volcanoes)} volcanoes")
+
+        # Run date pinned by list_active_volcanoes, a run crossing midnight reports on its own checkpoints
+        run_date = pd.read_pickle(volcano_inputs[0])['run_date'] if volcano_inputs else None
+        checkpoint_dir = os.path.join(data_paths["checkpoints"], run_date) if run_date else None
+        if checkpoint_dir and os.path.isdir(checkpoint_dir):
+            failed = [f[:-len(".json")] for f in sorted(os.listdir(checkpoint_dir))
+                      if f.endswith(".json") and load_manifest(os.path.join(checkpoint_dir, f)).get('status') == 'failed']
+            if failed:
+                print(f"⚠️ {len(failed)} volcanoes failed on {run_date} ({', '.join(failed)}), "
+                      f"rerun with TRANSFORM_MODE=repair to recompute only those")
+
+        if len(all_roads) != 0:
+
+            final_roads = gpd.GeoDataFrame(pd.concat(all_roads, ignore_index=True))
+
+            osm_highway_colors = {
+                "motorway": [255, 0, 0],  # Red (unchanged)
+                "trunk": [255, 128, 0],  # Orange
+                "primary": [255, 255, 0],  # Yellow
+                "secondary": [128, 255, 0],  # Light green
+                "tertiary": [200, 200, 200, 128],  # Light gray with transparency (RGBA)
+                "unclassified": [255, 255, 255],  # White
+                "residential": [220, 220, 220],  # Light gray
+                "service": [192, 192, 192],  # Darker gray
+                "path": [0, 128, 0],  # Dark green
+                "footway": [128, 0, 128],  # Purple
+                "cycleway": [0, 128, 128],  # Teal
+                "bridleway": [128, 0, 0],  # Dark red
+                "steps": [0, 0, 128],  # Navy
+            }
 
-                    features = []
-                    allowed_highways = {"motorway", "trunk", "primary", "secondary", "tertiary"}
-
-                    for _, row in final_roads.iterrows():
-                        coords = linestring_to_coords(row.geometry)
-                        if coords and row["highway"] in allowed_highways:  # Check if highway is allowed
-                            features.append({
-                                **coords,
-                                "color": row["color"],
-                                "width": row["width"],
-                                "highway_type": row["highway"],
-                                "name": row.get("name", ""),
-                                "id": row["id"],
-                                "volcano_name": row["volcano_name"],
-                            })
-
-                    with open(data_paths["roads"], "wb") as f:
-                        pickle.dump(features, f)
-
-                if len(all_emergency_services) != 0:
-                    final_emergency_services = gpd.GeoDataFrame(pd.concat(all_emergency_services, ignore_index=True))
-                    final_emergency_services[['geometry', 'id', 'amenity']].to_file(data_paths["emergency"], driver='GPKG')
-                if len(all_amenities) != 0:
-                    final_amenities = gpd.GeoDataFrame(pd.concat(all_amenities, ignore_index=True))
-                    final_amenities[['geometry', 'id', 'amenity']].to_file(data_paths["amenities"], driver='GPKG')
-                if len(all_essential_services) != 0:
-                    final_essential_services = gpd.GeoDataFrame(pd.concat(all_essential_services, ignore_index=True))
-                    final_essential_services[['geometry', 'id', 'amenity']].to_file(data_paths["essential_services"], driver='GPKG')
-                if len(all_nodes) != 0:
-                    final_nodes = gpd.GeoDataFrame(pd.concat(all_nodes, ignore_index=True))
-                    final_nodes[['geometry', 'id', 'score']].to_file(data_paths["all_nodes"], driver='GPKG')
-
-                print("All volcanoes processed successfully!")
-
-            if result_alerts is not None:
-                result_alerts.to_csv(data_paths["alerts_volcanoes_latest"], index=False)
-
-            if result_db is not None:
-                result_db.to_csv(data_paths["volcanoes_db"], index=False)
-
-            if historical_db is not None:
-                population_cols = [col for col in historical_db.columns if
-                                   col.strip().lower().startswith("population")]
-                for col in population_cols:
-                    historical_db[col] = (
-                        historical_db[col]
-                        .astype(str)  # Ensure string type for .str operations
-                        .str.replace(",", "", regex=False)  # Remove commas
-                        .str.strip()  # Remove whitespace
-                    )
-                    historical_db[col] = pd.to_numeric(historical_db[col], errors="coerce")
+            highway_widths = {
+                "motorway": 8,
+                "trunk": 7,
+                "primary": 6,
+                "secondary": 5,
+                "tertiary": 4,
+            }
 
-                    if historical_db[col].dropna().mod(1).eq(0).all():  # Check if all values are whole numbers
-                        historical_db[col] = historical_db[col].astype("Int64")
+            final_roads["color"] = final_roads["highway"].apply(
+                lambda x: osm_highway_colors.get(x, [128, 128, 128])  # Default: gray
+            )
 
-                historical_db.to_csv(data_paths["historical_db"], index=False)
+            final_roads["width"] = final_roads["highway"].apply(
+                lambda x: highway_widths.get(x, 3)  # Default: gray
+            )
 
-            if historical_db_GVP is not None:
-                historical_db_GVP.to_csv(data_paths["historical_db_GVP"], index=False)
+            features = []
+            allowed_highways = {"motorway", "trunk", "primary", "secondary", "tertiary"}
+
+            for _, row in final_roads.iterrows():
+                coords = linestring_to_coords(row.geometry)
+                if coords and row["highway"] in allowed_highways:  # Check if highway is allowed
+                    features.append({
+                        **coords,
+                        "color": row["color"],
+                        "width": row["width"],
+                        "highway_type": row["highway"],
+                        "name": row.get("name", ""),
+                        "id": row["id"],
+                        "volcano_name": row["volcano_name"],
+                    })
+
+            with open(data_paths["roads"], "wb") as f:
+                pickle.dump(features, f)
+
+        if len(all_emergency_services) != 0:
+            final_emergency_services = gpd.GeoDataFrame(pd.concat(all_emergency_services, ignore_index=True))
+            write_table(final_emergency_services[['geometry', 'id', 'amenity']], data_paths["emergency"], export_csv,
+                        categories=['id'])
+        if len(all_amenities) != 0:
+            final_amenities = gpd.GeoDataFrame(pd.concat(all_amenities, ignore_index=True))
+            write_table(final_amenities[['geometry', 'id', 'amenity']], data_paths["amenities"], export_csv, categories=['id'])
+        if len(all_essential_services) != 0:
+            final_essential_services = gpd.GeoDataFrame(pd.concat(all_essential_services, ignore_index=True))
+            write_table(final_essential_services[['geometry', 'id', 'amenity']], data_paths["essential_services"], export_csv,
+                        categories=['id'])
+        if len(all_nodes) != 0:
+            final_nodes = gpd.GeoDataFrame(pd.concat(all_nodes, ignore_index=True))
+            write_table(final_nodes[['geometry', 'id', 'score']], data_paths["all_nodes"], export_csv, categories=['id'])
+        if len(all_assembly_points) != 0:
+            write_table(pd.concat(all_assembly_points, ignore_index=True), data_paths["assembly_points"], export_csv,
+                        categories=['id', 'volcano_name'])
+        if len(all_evacuation_cells) != 0:
+            write_table(pd.concat(all_evacuation_cells, ignore_index=True), data_paths["evacuation_cells"], export_csv)
+            write_table(pd.DataFrame(all_evacuation_summaries), data_paths["evacuation_summary"], export_csv)
+        if len(all_isochrones) != 0:
+            final_isochrones = gpd.GeoDataFrame(pd.concat(all_isochrones, ignore_index=True), crs="EPSG:4326")
+            write_table(final_isochrones[['geometry', 'id', 'minutes']], data_paths["isochrones"], export_csv, categories=['id'])
+            write_table(pd.concat(all_accessibility, ignore_index=True), data_paths["accessibility"], export_csv,
+                        categories=['id', 'volcano_name'])
+
+        if len(all_graph_stats) != 0:
+            graph_stats_df = pd.DataFrame(all_graph_stats).sort_values('csr_bytes', ascending=False)
+            print("\n=== Largest road graphs (CSR memory footprint) ===")
+            print(graph_stats_df.head(5).to_string(index=False))
+
+        # Every Streamlit session holds several copies of these frames
+        report = memory_report([path for path in data_paths.values() if path.endswith('.parquet')])
+        if not report.empty:
+            print("\n=== App datasets in memory (default vs lean dtypes) ===")
+            print(report.to_string(index=False))
+            print(f"✅ {report['default_mb'].sum():.1f} MB -> {report['lean_mb'].sum():.1f} MB in memory")
 
-            if population_at_risk is not None:
-                population_at_risk.to_csv(data_paths["population_at_risk"], index=False)
+    @task
+    def load_data_smithsonian():
 
-            if total_affected is not None:
-                pd.DataFrame({'total_affected': [total_affected]}).to_csv(data_paths["total_affected"], index=False)
+        def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(chunk)
+            return digest.hexdigest()
 
-            if risk_by_volcano is not None:
-                risk_by_volcano.to_csv(data_paths["risk_by_volcano"], index=False)
+        def changed_data_files(repo_path: str, publish_dir: str, manifest_path: str) -> Tuple[dict, list]:
+            """
+            Compares the content hashes of the published files with the last published manifest.
 
-            if earthquakes_db is not None:
-                earthquakes_db.to_csv(data_paths["earthquakes_db"], index=False)
+            Args:
+                repo_path: Path to the local git repository
+                publish_dir: Directory holding the published data, relative to repo_path
+                manifest_path: Manifest of the last publication (relative path -> sha256)
 
-    @task
-    def load_data_smithsonian():
+            Returns:
+                Tuple of (current hashes: dict, paths to stage: list), removed files included
+            """
+            published = load_manifest(manifest_path).get('files', {})
+            current = {}
+            for root, dirs, files in os.walk(os.path.join(repo_path, publish_dir)):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if os.path.abspath(path) != os.path.abspath(manifest_path):
+                        current[os.path.relpath(path, repo_path)] = hash_file(path)
+            changed = [path for path, digest in current.items() if published.get(path) != digest]
+            removed = sorted(set(published) - set(current))
+            return current, changed + removed
 
         def git_push(
                 repo_path: str,
@@ -996,10 +3155,14 @@ def process_data_smithsonian():
                 remote: str = "origin",
                 git_username: Optional[str] = None,
                 git_email: Optional[str] = None,
-                github_token: Optional[str] = None
+                github_token: Optional[str] = None,
+                publish_dir: str = "ETL/app/data"
         ) -> Tuple[bool, str]:
             """
-            Push changes to a Git repository.
+            Publish the data files whose content changed since the last publication.
+
+            Only files whose sha256 differs from the manifest of the last publication are
+            staged, and nothing is committed or pushed when no file changed.
 
             Args:
                 repo_path: Path to the local git repository
@@ -1009,6 +3172,7 @@ def process_data_smithsonian():
                 git_username: Git username for configuration (optional)
                 git_email: Git email for configuration (optional)
                 github_token: GitHub personal access token for authentication (optional)
+                publish_dir: Directory holding the published data, relative to repo_path
 
             Returns:
                 Tuple of (success: bool, output: str)
@@ -1022,47 +3186,84 @@ def process_data_smithsonian():
                     subprocess.run(["git", "config", "user.name", git_username], check=True)
                     subprocess.run(["git", "config", "user.email", git_email], check=True)
 
-                # Add all changes
-                add_result = subprocess.run(["git", "add", "."], capture_output=True, text=True)
-                if add_result.returncode != 0:
-                    return False, f"Failed to add changes: {add_result.stderr}"
-
-                # Commit changes
-                commit_result = subprocess.run(
-                    ["git", "commit", "-m", commit_message],
-                    capture_output=True,
-                    text=True
-                )
-                if commit_result.returncode != 0:
-                    return False, f"Failed to commit changes: {commit_result.stderr}"
-
-                # Push changes
-                push_cmd = ["git", "push", remote, branch]
-                if github_token:
-                    # Use token for authentication
-                    remote_url = subprocess.run(
-                        ["git", "config", "--get", f"remote.{remote}.url"],
+                def push_branch():
+                    push_cmd = ["git", "push", remote, branch]
+                    if github_token:
+                        # Use token for authentication
+                        remote_url = subprocess.run(
+                            ["git", "config", "--get", f"remote.{remote}.url"],
+                            capture_output=True,
+                            text=True
+                        ).stdout.strip()
+
+                        if "https://" in remote_url:
+                            # For HTTPS URLs
+                            auth_url = remote_url.replace(
+                                "https://",
+                                f"https://{github_token}@"
+                            )
+                            push_cmd.extend(["--repo", auth_url])
+                        else:
+                            # For SSH URLs - this is more complex and might need ssh-agent setup
+                            pass
+
+                    push_result = subprocess.run(push_cmd, capture_output=True, text=True)
+                    if push_result.returncode != 0:
+                        return False, f"Failed to push changes: {push_result.stderr}"
+                    return True, f"Successfully pushed changes to {branch} branch"
+
+                def push_pending(message):
+                    # Commits of an earlier run whose push failed are pushed even without new data
+                    ahead = subprocess.run(["git", "rev-list", "--count", f"{remote}/{branch}..HEAD"],
+                                           capture_output=True, text=True)
+                    if ahead.returncode != 0 or int(ahead.stdout.strip() or 0) == 0:
+                        return True, message
+                    print(f"{ahead.stdout.strip()} local commits not pushed to {remote}/{branch} yet")
+                    return push_branch()
+
+                def commit_and_push(to_stage):
+                    for start in range(0, len(to_stage), 200):  # keep the command line short
+                        add_result = subprocess.run(["git", "add", "--all", "--", *to_stage[start:start + 200]],
+                                                    capture_output=True, text=True)
+                        if add_result.returncode != 0:
+                            return False, f"Failed to add changes: {add_result.stderr}"
+
+                    # Hashes can differ from the manifest while git already has the same bytes (first run)
+                    if subprocess.run(["git", "diff", "--cached", "--quiet"]).returncode == 0:
+                        return push_pending("No data changes to commit, nothing to push")
+
+                    # Commit changes
+                    commit_result = subprocess.run(
+                        ["git", "commit", "-m", commit_message],
                         capture_output=True,
                         text=True
-                    ).stdout.strip()
-
-                    if "https://" in remote_url:
-                        # For HTTPS URLs
-                        auth_url = remote_url.replace(
-                            "https://",
-                            f"https://{github_token}@"
-                        )
-                        push_cmd.extend(["--repo", auth_url])
-                    else:
-                        # For SSH URLs - this is more complex and might need ssh-agent setup
-                        pass
-
-                push_result = subprocess.run(push_cmd, capture_output=True, text=True)
-
-                if push_result.returncode != 0:
-                    return False, f"Failed to push changes: {push_result.stderr}"
-
-                return True, f"Successfully pushed changes to {branch} branch"
+                    )
+                    if commit_result.returncode != 0:
+                        return False, f"Failed to commit changes: {commit_result.stderr}"
+
+                    return push_branch()
+
+                # Stage only the files whose content changed since the last publication
+                manifest_path = os.path.join(repo_path, publish_dir, "publish_manifest.json")
+                current, changed = changed_data_files(repo_path, publish_dir, manifest_path)
+                if not changed:
+                    return push_pending("No data changes since the last publication, nothing to push")
+                print(f"{len(changed)} data files changed or removed: {', '.join(changed)}")
+
+                # The manifest is committed with the data. Until the push succeeds the previous one is
+                # put back, so the next run sees the same files as changed and publishes them again.
+                previous_manifest = load_manifest(manifest_path) if os.path.exists(manifest_path) else None
+                save_manifest({'files': current}, manifest_path)
+                success, output = False, "Publication interrupted"
+                try:
+                    success, output = commit_and_push(changed + [os.path.relpath(manifest_path, repo_path)])
+                finally:
+                    if not success:
+                        if previous_manifest is None:
+                            os.remove(manifest_path)
+                        else:
+                            save_manifest(previous_manifest, manifest_path)
+                return success, output
 
             except Exception as e:
                 return False, f"Error during git operations: {str(e)}"
@@ -1077,6 +3278,7 @@ def process_data_smithsonian():
             git_username = Variable.get("GIT_USERNAME")
             git_email = Variable.get("GIT_EMAIL")
             github_token = Variable.get("GITHUB_TOKEN")
+            publish_dir = Variable.get("GIT_PUBLISH_DIR", default_var="ETL/app/data")
 
             date_obj = datetime.now()
             date_obj = date_obj - timedelta(days=1)
@@ -1091,7 +3293,8 @@ def process_data_smithsonian():
                 branch=branch,
                 git_username=git_username,
                 git_email=git_email,
-                github_token=github_token
+                github_token=github_token,
+                publish_dir=publish_dir
             )
 
             if not success:
@@ -1102,6 +3305,9 @@ def process_data_smithsonian():
 
         push_to_git()
 
-    extract_data_smithsonian() >> transform_data_smithsonian() >> load_data_smithsonian()
+    volcano_inputs = list_active_volcanoes()
+    analysed_volcanoes = spatial_analysis_volcano.expand(volcano_input_path=volcano_inputs)
+    extract_data_smithsonian() >> volcano_inputs
+    assemble_transform_outputs(analysed_volcanoes, volcano_inputs) >> load_data_smithsonian()
 
 dag = process_data_smithsonian()
\ No newline at end of file
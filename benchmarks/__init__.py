@@ -0,0 +1,14 @@
+"""
+Offline benchmarks of the Volcanic ETL hot paths.
+
+The DAG functions are compiled out of ETL_volcanic_db.py and fed with synthetic volcano
+catalogs, population grids and road graphs (generators.py); Airflow, Postgres and the OSM
+downloads are replaced by the stand-ins of standins.py, so no network or database is used.
+
+    python -m benchmarks                       # quick sizes, all benchmarks
+    python -m benchmarks --only centrality --full
+    python -m benchmarks --full --save-baseline
+    python -m benchmarks --full --compare      # exits non-zero on a >20% slowdown
+
+Baselines are stored per machine in benchmarks/baselines/.
+"""
@@ -0,0 +1,250 @@
+import argparse
+import ast
+import contextlib
+import glob
+import io
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import osmnx
+
+from benchmarks import generators
+from benchmarks.harness import scaling_curve, save_baseline, compare_to_baseline
+from benchmarks.standins import StandInVariable, StandInPostgresHook, OfflineOSM, load_dag_functions
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_HELPERS = ['emit_metrics', 'count_rows', 'instrument', 'instrumented']
+
+SIZES = {
+    # name: (quick sizes, full sizes)
+    'centrality': ([100, 400, 1600], [400, 1600, 6400]),
+    'graph_to_csr': ([1000, 4000], [1000, 4000, 16000]),
+    'insert_rows': ([1000, 5000], [1000, 10000, 50000]),
+    'local_join': ([20000, 80000], [20000, 100000, 400000]),
+    'population_join': ([10000, 50000], [10000, 50000, 200000]),
+    'roads_serialization': ([5000, 20000], [5000, 20000, 80000]),
+    'spatial_analysis': ([400, 1600], [400, 1600, 6400]),
+    'page_population_at_risk': ([10000, 50000], [10000, 50000, 200000]),
+}
+
+
+def quiet(run):
+    """The DAG functions report progress with print, keep it out of the benchmark table."""
+    def wrapper(inputs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run(inputs)
+    return wrapper
+
+
+def projected_road_network(n_nodes):
+    return osmnx.add_edge_travel_times(osmnx.add_edge_speeds(osmnx.project_graph(generators.road_network(n_nodes))))
+
+
+def bench_centrality(sizes, repeat, workdir):
+    dag = load_dag_functions(['graph_to_csr', 'csr_betweenness_centrality'])
+    return scaling_curve('centrality', sizes,
+                         setup=lambda n: dag.graph_to_csr(projected_road_network(n)),
+                         run=dag.csr_betweenness_centrality, unit='nodes', repeat=repeat)
+
+
+def bench_graph_to_csr(sizes, repeat, workdir):
+    dag = load_dag_functions(['graph_to_csr'])
+    return scaling_curve('graph_to_csr', sizes, setup=projected_road_network,
+                         run=dag.graph_to_csr, unit='nodes', repeat=repeat)
+
+
+def bench_insert_rows(sizes, repeat, workdir):
+    dag = load_dag_functions(METRICS_HELPERS + ['insert_rows'])
+    return scaling_curve('insert_rows', sizes,
+                         setup=lambda n: generators.volcano_catalog(n),
+                         run=quiet(lambda df: dag.insert_rows(StandInPostgresHook(), 'volcanoes_db', df)),
+                         unit='rows', repeat=repeat)
+
+
+def write_local_snapshot(data_dir, n_cells, n_volcanoes=20):
+    """GeoParquet snapshot of every table query_local_files reads."""
+    os.makedirs(data_dir, exist_ok=True)
+    volcanoes = generators.volcano_catalog(n_volcanoes)
+    half = n_volcanoes // 2
+    volcanoes.iloc[:half].to_parquet(os.path.join(data_dir, "filtered_erupting_volcanoes_latest.parquet"))
+    volcanoes.iloc[half:].to_parquet(os.path.join(data_dir, "filtered_unrest_volcanoes_latest.parquet"))
+    generators.population_grid(volcanoes, n_cells // n_volcanoes).to_parquet(
+        os.path.join(data_dir, "population_centroid.parquet"))
+    volcanoes.to_parquet(os.path.join(data_dir, "volcanoes_db.parquet"))
+    volcanoes[['Volcano_Name']].rename(columns={'Volcano_Name': 'Name'}).assign(
+        observatory_level='Advisory', aviation_level='Yellow').to_parquet(
+        os.path.join(data_dir, "alerts_volcanoes_latest.parquet"))
+    volcanoes[['Volcano_Number', 'Volcano_Name']].to_parquet(os.path.join(data_dir, "MOESM1.parquet"))
+    volcanoes[['Volcano_Number', 'Volcano_Name']].to_parquet(os.path.join(data_dir, "historical_eruptions_db.parquet"))
+    # Same columns as the scrape_earthquake_data records
+    earthquakes = pd.DataFrame([{'id': f['id'], 'time': f['properties']['time'], 'magnitude': f['properties']['mag'],
+                                 'place': f['properties']['place'], 'infos': f['properties']['url'],
+                                 'y_coordinate': f['geometry']['coordinates'][1],
+                                 'x_coordinate': f['geometry']['coordinates'][0],
+                                 'depth': f['geometry']['coordinates'][2]}
+                                for f in generators.earthquake_feed(500)['features']])
+    earthquakes['time'] = pd.to_datetime(earthquakes['time'], unit='ms', utc=True)
+    earthquakes['date'] = earthquakes['time'].dt.strftime('%Y-%m-%d')
+    earthquakes.to_parquet(os.path.join(data_dir, "earthquakes_db_latest.parquet"))
+    return data_dir
+
+
+def bench_local_join(sizes, repeat, workdir):
+    dag = load_dag_functions(METRICS_HELPERS + ['haversine_km', 'summarize_population_at_risk', 'query_local_files'])
+    return scaling_curve('local_join', sizes,
+                         setup=lambda n: write_local_snapshot(os.path.join(workdir, f"local_{n}"), n),
+                         run=quiet(dag.query_local_files), unit='cells', repeat=repeat)
+
+
+def bench_population_join(sizes, repeat, workdir):
+    # Population partitioned once, like before the per-volcano loop; the curve follows the road nodes
+    dag = load_dag_functions(['partition_population'])
+    volcanoes = generators.volcano_catalog(1)
+    pop_partition = next(iter(quiet(dag.partition_population)(generators.population_at_risk(volcanoes, 20000)).values()))
+    rng = np.random.default_rng(0)
+
+    def run(node_coords):
+        # Same lookup as the population join block of spatial_analysis
+        distances, nearest = pop_partition['tree'].query(node_coords, k=1)
+        return pop_partition['pop'][nearest], distances
+
+    return scaling_curve('population_join', sizes,
+                         setup=lambda n: rng.uniform(pop_partition['tree'].mins, pop_partition['tree'].maxes, (n, 2)),
+                         run=run, unit='nodes', repeat=repeat)
+
+
+def serialize_roads(roads, linestring_to_coords):
+    # Same loop as the roads block of assemble_transform_outputs
+    features = []
+    for _, row in roads.iterrows():
+        coords = linestring_to_coords(row.geometry)
+        if coords:
+            features.append({**coords, "highway_type": row["highway"], "name": row.get("name", "")})
+    return pickle.dumps(features)
+
+
+def bench_roads_serialization(sizes, repeat, workdir):
+    dag = load_dag_functions(['linestring_to_coords'])
+    return scaling_curve('roads_serialization', sizes,
+                         setup=lambda n: generators.osm_features((110.2, -7.8, 110.7, -7.3), n,
+                                                                 {'highway': ['primary', 'secondary']}),
+                         run=lambda roads: serialize_roads(roads, dag.linestring_to_coords),
+                         unit='roads', repeat=repeat)
+
+
+def bench_spatial_analysis(sizes, repeat, workdir):
+    helpers = METRICS_HELPERS + ['request_osm', 'graph_to_csr', 'csr_graph_nbytes', 'save_csr_graph',
+                                 'csr_betweenness_centrality', 'evacuation_routing', 'hospital_isochrones',
+                                 'summarize_evacuation', 'partition_population']
+    volcano = generators.volcano_catalog(1).assign(x_coordinate=110.44, y_coordinate=-7.54)
+    volcano_buffer = gpd.GeoDataFrame(volcano, geometry=gpd.points_from_xy(volcano['x_coordinate'], volcano['y_coordinate']),
+                                      crs="EPSG:4326")
+    volcano_buffer = volcano_buffer.set_geometry(volcano_buffer.to_crs(volcano_buffer.estimate_utm_crs())
+                                                 .buffer(30000).to_crs("EPSG:4326")).rename_geometry('geom_buffer')
+    pop_partition = None
+
+    def setup(n):
+        nonlocal pop_partition
+        dag = load_dag_functions(helpers + ['spatial_analysis'], ox=OfflineOSM(graph_nodes=n, features_per_tag=100))
+        if pop_partition is None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                pop_partition = dag.partition_population(generators.population_at_risk(volcano, 2000))[volcano['id'][0]]
+        return dag
+
+    return scaling_curve('spatial_analysis', sizes, setup=setup,
+                         run=quiet(lambda dag: dag.spatial_analysis(volcano_buffer, pop_partition,
+                                                                     os.path.join(workdir, "graph.npz"))),
+                         unit='nodes', repeat=repeat, warmup=0)
+
+
+def bench_page_population_at_risk(sizes, repeat, workdir):
+    dag = load_dag_functions(['column_types', 'point_index', 'table_schemas', 'dtype_policy',
+                              'lean_dtypes', 'write_gpkg', 'write_table'])
+
+    def setup(n):
+        path = os.path.join(workdir, f"population_at_risk_{n}.parquet")
+        dag.write_table(generators.population_at_risk(generators.volcano_catalog(20), n // 20), path)
+        return path
+
+    # Same read as the Disaster Risk Management page
+    return scaling_curve('page_population_at_risk', sizes, setup=setup,
+                         run=lambda path: gpd.read_parquet(path, columns=['volcano_id', 'pop', 'geom']),
+                         unit='rows', repeat=repeat)
+
+
+def page_loads(repeat):
+    """
+    Times the top-level data reads of every Streamlit page against ETL/app/data, from the repo root
+    like `streamlit run` does.
+    """
+    pages = sorted(glob.glob(os.path.join(REPO_DIR, "ETL", "app", "*.py")) +
+                   glob.glob(os.path.join(REPO_DIR, "ETL", "app", "pages", "*.py")))
+    results = []
+    for page in pages:
+        with open(page, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        reads = [node for node in tree.body if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call)
+                 and isinstance(node.value.func, ast.Attribute) and node.value.func.attr in ('read_csv', 'read_file', 'read_parquet')]
+        if not reads:
+            continue
+        code = compile(ast.Module(body=reads, type_ignores=[]), page, 'exec')
+        name = f"page_load.{os.path.splitext(os.path.basename(page))[0].split('_', 1)[1]}"
+        with contextlib.chdir(REPO_DIR):
+            results.append(scaling_curve(name, [len(reads)], setup=lambda n: None,
+                                         run=lambda _: exec(code, {'pd': pd, 'gpd': gpd}),
+                                         unit='files', repeat=repeat))
+    return results
+
+
+BENCHMARKS = {
+    'centrality': bench_centrality,
+    'graph_to_csr': bench_graph_to_csr,
+    'insert_rows': bench_insert_rows,
+    'local_join': bench_local_join,
+    'population_join': bench_population_join,
+    'roads_serialization': bench_roads_serialization,
+    'spatial_analysis': bench_spatial_analysis,
+    'page_population_at_risk': bench_page_population_at_risk,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the Volcanic ETL hot paths")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS) + ['page_loads'],
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--full", action="store_true", help="larger sizes, for baselines")
+    parser.add_argument("--repeat", type=int, default=3, help="timed rounds per size")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--compare", action="store_true", help="compare with the stored baselines")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="volcanic_etl_bench_")
+    # instrument() metrics of the benchmarked functions land next to the synthetic inputs
+    StandInVariable.overrides['METRICS_DIR'] = os.path.join(workdir, "metrics")
+    print(f"Synthetic inputs and metrics in {workdir}")
+
+    results = []
+    for name in args.only or list(BENCHMARKS) + ['page_loads']:
+        print(f"\n=== {name} ===")
+        if name == 'page_loads':
+            results.extend(page_loads(args.repeat))
+        else:
+            quick_sizes, full_sizes = SIZES[name]
+            results.append(BENCHMARKS[name](full_sizes if args.full else quick_sizes, args.repeat, workdir))
+
+    regressions = []
+    for result in results:
+        if args.save_baseline:
+            save_baseline(result)
+        if args.compare:
+            regressions += [result['name'] for _ in compare_to_baseline(result)]
+    if regressions:
+        raise SystemExit(f"❌ Slower than baseline: {', '.join(sorted(set(regressions)))}")
+
+
+if __name__ == "__main__":
+    main()
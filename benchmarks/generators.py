@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import networkx as nx
+import pyproj
+import shapely
+
+
+def volcano_catalog(n_volcanoes, seed=0):
+    """
+    Synthetic stand-in for the filtered_*_volcanoes_latest / volcanoes_db tables.
+
+    Args:
+        n_volcanoes (int): number of volcanoes
+        seed (int): random seed
+
+    Returns:
+        pd.DataFrame with the columns the transform reads (id, Volcano_Number, Volcano_Name, Region,
+        x_coordinate, y_coordinate, ...)
+    """
+    rng = np.random.default_rng(seed)
+    volcano_numbers = 300000 + np.arange(n_volcanoes)
+    return pd.DataFrame({
+        'id': [f"Smithsonian_VOTW_Holocene_Volcanoes.fid--synthetic_{n}" for n in volcano_numbers],
+        'Volcano_Number': volcano_numbers,
+        'Volcano_Name': [f"Synthetic volcano {n}" for n in volcano_numbers],
+        'Primary_Volcano_Type': rng.choice(['Stratovolcano', 'Shield', 'Caldera', 'Volcanic field'], n_volcanoes),
+        'Country': 'Synthetic',
+        'Region': rng.choice(['Sunda-Banda Volcanic Regions', 'Japan, Taiwan, Marianas', 'Mexico and Central America'],
+                             n_volcanoes),
+        'Elevation': rng.integers(200, 5000, n_volcanoes),
+        'x_coordinate': rng.uniform(-170, 170, n_volcanoes),
+        'y_coordinate': rng.uniform(-60, 60, n_volcanoes),
+    })
+
+
+def population_grid(volcanoes, cells_per_volcano, radius_km=120, seed=0):
+    """
+    Population centroids scattered around each volcano, like the population_centroid table.
+
+    Cells are drawn uniformly in a disc of radius_km so that a share of them falls inside
+    the 30 km buffers and another inside the 100 km profiles.
+
+    Args:
+        volcanoes (pd.DataFrame): output of volcano_catalog
+        cells_per_volcano (int): centroids generated around every volcano
+        radius_km (float): radius of the disc
+        seed (int): random seed
+
+    Returns:
+        gpd.GeoDataFrame with columns ['gid', 'pop', 'geom'] in EPSG:4326
+    """
+    rng = np.random.default_rng(seed)
+    n_cells = len(volcanoes) * cells_per_volcano
+    lon0 = np.repeat(volcanoes['x_coordinate'].to_numpy(float), cells_per_volcano)
+    lat0 = np.repeat(volcanoes['y_coordinate'].to_numpy(float), cells_per_volcano)
+    distance_km = radius_km * np.sqrt(rng.uniform(0, 1, n_cells))
+    bearing = rng.uniform(0, 2 * np.pi, n_cells)
+    lat = lat0 + distance_km * np.cos(bearing) / 111.32
+    lon = lon0 + distance_km * np.sin(bearing) / (111.32 * np.cos(np.radians(lat0)))
+    return gpd.GeoDataFrame({
+        'gid': np.arange(n_cells, dtype=np.int64) + 1,
+        'pop': rng.lognormal(mean=3, sigma=1.5, size=n_cells).round().astype(np.int64),
+    }, geometry=gpd.GeoSeries(shapely.points(lon, lat), crs="EPSG:4326"), crs="EPSG:4326").rename_geometry('geom')
+
+
+def population_at_risk(volcanoes, cells_per_volcano, seed=0):
+    """
+    Population centroids inside the 30 km buffers, with the volcano_id column of query_database.
+
+    Args:
+        volcanoes (pd.DataFrame): output of volcano_catalog
+        cells_per_volcano (int): centroids per volcano
+        seed (int): random seed
+
+    Returns:
+        gpd.GeoDataFrame with columns ['gid', 'pop', 'volcano_id', 'source', 'buffer_km', 'geom']
+    """
+    pop = population_grid(volcanoes, cells_per_volcano, radius_km=30, seed=seed)
+    pop['volcano_id'] = np.repeat(volcanoes['id'].to_numpy(), cells_per_volcano)
+    pop['source'] = 'erupting'
+    pop['buffer_km'] = 30
+    return pop
+
+
+def road_network(n_nodes, center=(110.44, -7.54), spacing_m=250, drop_share=0.15, seed=0):
+    """
+    Road graph shaped like an OSMnx drive network: a jittered grid in EPSG:4326 with a share
+    of its streets removed, two directed edges per street, and length / highway attributes.
+
+    Args:
+        n_nodes (int): approximate number of intersections
+        center (tuple): (lon, lat) of the grid center
+        spacing_m (float): distance between neighbouring intersections
+        drop_share (float): share of streets removed, so the graph is not a perfect lattice
+        seed (int): random seed
+
+    Returns:
+        nx.MultiDiGraph with graph['crs'] = 'EPSG:4326', node attributes x / y and edge
+        attributes length (m) / highway / maxspeed (on part of the edges)
+    """
+    rng = np.random.default_rng(seed)
+    side = max(2, int(round(np.sqrt(n_nodes))))
+    grid = nx.grid_2d_graph(side, side)
+    streets = [edge for edge in grid.edges() if rng.uniform() >= drop_share]
+
+    utm = pyproj.CRS.from_dict({'proj': 'utm', 'zone': int((center[0] + 180) // 6) + 1, 'south': center[1] < 0})
+    to_utm = pyproj.Transformer.from_crs("EPSG:4326", utm, always_xy=True)
+    to_wgs84 = pyproj.Transformer.from_crs(utm, "EPSG:4326", always_xy=True)
+    cx, cy = to_utm.transform(*center)
+    ij = np.array(list(grid.nodes()))
+    x_m = cx + (ij[:, 0] - side / 2) * spacing_m + rng.normal(0, spacing_m / 10, len(ij))
+    y_m = cy + (ij[:, 1] - side / 2) * spacing_m + rng.normal(0, spacing_m / 10, len(ij))
+    lon, lat = to_wgs84.transform(x_m, y_m)
+    node_id = {node: 1_000_000 + k for k, node in enumerate(grid.nodes())}
+
+    graph = nx.MultiDiGraph(crs="EPSG:4326")
+    for node, k in node_id.items():
+        graph.add_node(k, x=float(lon[k - 1_000_000]), y=float(lat[k - 1_000_000]), street_count=4)
+    highways = rng.choice(['primary', 'secondary', 'tertiary', 'trunk'], len(streets), p=[0.2, 0.3, 0.45, 0.05])
+    maxspeeds = {'trunk': '90', 'primary': '70', 'secondary': '50', 'tertiary': '40'}
+    tagged = rng.uniform(size=len(streets)) < 0.6  # like OSM, part of the roads carry no maxspeed tag
+    for (a, b), highway, has_maxspeed in zip(streets, highways, tagged):
+        u, v = node_id[a], node_id[b]
+        length = float(np.hypot(x_m[u - 1_000_000] - x_m[v - 1_000_000], y_m[u - 1_000_000] - y_m[v - 1_000_000]))
+        attributes = {'length': length, 'highway': highway, 'oneway': False}
+        if has_maxspeed:
+            attributes['maxspeed'] = maxspeeds[highway]
+        graph.add_edge(u, v, **attributes)
+        graph.add_edge(v, u, **attributes)
+    return graph
+
+
+def osm_features(bbox, n_features, tags, seed=0):
+    """
+    Points or road lines inside bbox, shaped like ox.features_from_bbox results.
+
+    Args:
+        bbox (tuple): (minx, miny, maxx, maxy)
+        n_features (int): number of features
+        tags (dict): OSMnx tags, {'highway': [...]} returns LineStrings, anything else Points
+        seed (int): random seed
+
+    Returns:
+        gpd.GeoDataFrame in EPSG:4326 indexed like OSMnx (element, id)
+    """
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bbox
+    key, values = next(iter(tags.items()))
+    x = rng.uniform(minx, maxx, n_features)
+    y = rng.uniform(miny, maxy, n_features)
+    if key == 'highway':
+        geometry = shapely.linestrings(np.stack([
+            np.column_stack([x, y]),
+            np.column_stack([x + rng.normal(0, 0.01, n_features), y + rng.normal(0, 0.01, n_features)]),
+            np.column_stack([x + rng.normal(0, 0.02, n_features), y + rng.normal(0, 0.02, n_features)]),
+        ], axis=1))
+        element = 'way'
+    else:
+        geometry = shapely.points(x, y)
+        element = 'node'
+    index = pd.MultiIndex.from_arrays([[element] * n_features, np.arange(n_features) + 1], names=['element', 'id'])
+    return gpd.GeoDataFrame({
+        key: rng.choice(values, n_features),
+        'name': [f"Synthetic {key} {k}" for k in range(n_features)],
+    }, geometry=geometry, crs="EPSG:4326", index=index)
+
+
+def earthquake_feed(n_events, seed=0):
+    """
+    USGS all_day.geojson feed with n_events earthquakes.
+
+    Args:
+        n_events (int): number of events
+        seed (int): random seed
+
+    Returns:
+        dict: GeoJSON FeatureCollection as returned by response.json()
+    """
+    rng = np.random.default_rng(seed)
+    # Event times over the last day, in milliseconds since epoch like the USGS feed
+    now_ms = int(pd.Timestamp.now(tz='UTC').timestamp() * 1000)
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'id': f"synthetic{k}",
+            'properties': {
+                'mag': round(float(rng.uniform(-0.5, 7)), 2),
+                'place': f"{int(rng.integers(1, 80))} km N of Synthetic {k}",
+                'time': now_ms - int(rng.integers(0, 86_400_000)),
+                'url': f"https://earthquake.usgs.gov/earthquakes/eventpage/synthetic{k}",
+            },
+            'geometry': {'type': 'Point', 'coordinates': [float(rng.uniform(-180, 180)),
+                                                          float(rng.uniform(-70, 70)),
+                                                          float(rng.uniform(0, 300))]},
+        } for k in range(n_events)],
+    }
+
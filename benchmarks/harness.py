@@ -0,0 +1,101 @@
+import json
+import os
+import platform
+import statistics
+import time
+
+import numpy as np
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def measure(run, inputs, repeat=3, warmup=1):
+    """
+    Times run(inputs) like pytest-benchmark: warmup rounds first, then repeat timed rounds.
+
+    Args:
+        run (callable): function under test, called with the prepared inputs
+        inputs: value returned by the benchmark setup
+        repeat (int): timed rounds
+        warmup (int): untimed rounds
+
+    Returns:
+        dict: {'min_s', 'median_s', 'rounds'}
+    """
+    for _ in range(warmup):
+        run(inputs)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(inputs)
+        timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'rounds': repeat}
+
+
+def scaling_curve(name, sizes, setup, run, unit, repeat=3, warmup=1):
+    """
+    Runs one benchmark at every size and fits time ~ size ** exponent on the medians.
+
+    Args:
+        name (str): benchmark name, also the baseline file name
+        sizes (list): problem sizes, passed to setup
+        setup (callable): size -> inputs, not timed
+        run (callable): inputs -> None, timed
+        unit (str): what size counts (nodes, rows, cells...)
+        repeat (int): timed rounds per size
+        warmup (int): untimed rounds per size
+
+    Returns:
+        dict: {'name', 'unit', 'points': [{'size', 'min_s', 'median_s', 'throughput'}], 'exponent'}
+    """
+    points = []
+    for size in sizes:
+        inputs = setup(size)
+        timing = measure(run, inputs, repeat=repeat, warmup=warmup)
+        points.append({'size': size, **timing, 'throughput': size / timing['median_s']})
+        print(f"  {name:<24} {size:>10,} {unit:<8} median {timing['median_s'] * 1000:>10.1f} ms "
+              f"({size / timing['median_s']:>12,.0f} {unit}/s)")
+    exponent = None
+    if len(points) > 1:
+        exponent = float(np.polyfit(np.log([p['size'] for p in points]),
+                                    np.log([p['median_s'] for p in points]), 1)[0])
+        print(f"  {name:<24} scaling exponent {exponent:.2f}")
+    return {'name': name, 'unit': unit, 'points': points, 'exponent': exponent}
+
+
+def save_baseline(result):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{result['name']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({**result, 'machine': platform.node(), 'python': platform.python_version(),
+                   'saved': time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+    print(f"✅ Baseline saved to {path}")
+
+
+def compare_to_baseline(result, tolerance=1.2):
+    """
+    Compares the medians with the stored baseline of the same sizes.
+
+    Args:
+        result (dict): output of scaling_curve
+        tolerance (float): slowdown ratio above which a size is reported as a regression
+
+    Returns:
+        list: sizes slower than tolerance x baseline
+    """
+    path = os.path.join(BASELINE_DIR, f"{result['name']}.json")
+    if not os.path.exists(path):
+        print(f"⚠️ No baseline for {result['name']}, run with --save-baseline first")
+        return []
+    with open(path, encoding='utf-8') as f:
+        baseline = {p['size']: p for p in json.load(f)['points']}
+    regressions = []
+    for point in result['points']:
+        if point['size'] not in baseline:
+            continue
+        ratio = point['median_s'] / baseline[point['size']]['median_s']
+        flag = "❌" if ratio > tolerance else "✅"
+        print(f"  {flag} {result['name']:<24} {point['size']:>10,} {result['unit']:<8} {ratio:5.2f}x baseline")
+        if ratio > tolerance:
+            regressions.append(point['size'])
+    return regressions